@@ -13,6 +13,9 @@ static int parseAnalogPin(const char* s){
 }
 
 static bool g_listFirst = true;
+static bool g_binFrames = false;
+
+bool LineHandler_binaryFrames() { return g_binFrames; }
 
 static void printSensorItem(SensorPT100& s) {
   if (!g_listFirst) Serial.print(',');
@@ -163,6 +166,18 @@ static void handleLine(char* line, SensorManager& mgr){
       Serial.println(F("}"));
     }
 
+    else if (eq(cmd,"MODE")) {
+      int fmt = -1;   // 0 = json, 1 = bin
+      for (char* tok=strtok_r(nullptr," \t",&saveptr); tok; tok=strtok_r(nullptr," \t",&saveptr)) {
+        char *k,*v; if (!parseKeyVal(tok,k,v)) continue;
+        if (eq(k,"fmt")) fmt = eq(v,"bin") ? 1 : (eq(v,"json") ? 0 : -1);
+      }
+      if (fmt < 0) { Serial.println(F("{\"ok\":false,\"err\":\"bad_fmt\"}")); return; }
+      g_binFrames = fmt == 1;
+      // odpowiedzi na komendy zostają w JSON
+      Serial.println(g_binFrames ? F("{\"ok\":true,\"fmt\":\"bin\"}") : F("{\"ok\":true,\"fmt\":\"json\"}"));
+    }
+
     else if (eq(cmd,"LIST")) {
       Serial.print(F("{\"s\":["));
       g_listFirst = true;
@@ -4,6 +4,7 @@
 class SensorManager;
 
 void LineHandler_tick(SensorManager& mgr);
+bool LineHandler_binaryFrames();   // auto-raporty jako ramki binarne (MODE fmt=bin)
 
 #ifndef LH_BAUD
 #define LH_BAUD 9600
@@ -63,6 +63,25 @@ void SensorPT100::SendTempUSART() {
   Serial.println(F(" C"));
 }
 
+static uint8_t crc8(const uint8_t* p, uint8_t n) {
+  uint8_t crc = 0;
+  while (n--) {
+    crc ^= *p++;
+    for (uint8_t i = 0; i < 8; ++i)
+      crc = (crc & 0x80) ? (uint8_t)((crc << 1) ^ 0x07) : (uint8_t)(crc << 1);
+  }
+  return crc;
+}
+
+void SensorPT100::SendTempFrame(float t) {
+  uint8_t f[PT_FRAME_SIZE];
+  f[0] = PT_FRAME_SYNC;
+  f[1] = ID;
+  memcpy(f + 2, &t, 4);            // AVR: float IEEE 754, little-endian
+  f[6] = crc8(f + 1, 5);
+  Serial.write(f, PT_FRAME_SIZE);
+}
+
 void SensorPT100::reset() {
   *this = SensorPT100(); 
 }
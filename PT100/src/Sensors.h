@@ -1,6 +1,11 @@
 #pragma once
 #include <Arduino.h>
 
+// Binarna ramka auto-raportu (MODE fmt=bin):
+// [0xA5][id][float32 T, little-endian][CRC-8 (poly 0x07) z id + T] = 7 bajtów
+#define PT_FRAME_SYNC 0xA5
+#define PT_FRAME_SIZE 7
+
 class SensorPT100 {
 public:
   bool Active;  
@@ -25,6 +30,7 @@ public:
 
   float ReadTemp();       //Reading temeperature
   void  SendTempUSART();  //Sending temperature through USART
+  void  SendTempFrame(float t); //Sending temperature as a binary frame (MODE fmt=bin)
   void  reset();          //Zeroing parameters
   bool shouldReport();    //Checking if a sensor should report temperature, due to interval
 };
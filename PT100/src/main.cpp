@@ -20,6 +20,7 @@ void loop() {
   mgr.forEach([](SensorPT100& s) {
     if (s.shouldReport()) {
       float t = s.ReadTemp();
+      if (LineHandler_binaryFrames()) { s.SendTempFrame(t); return; }
       Serial.print("Interval: "); Serial.println(s.ReportInterval);
       Serial.print(F("{\"id\":"));    Serial.print(s.ID);
       Serial.print(F(",\"name\":\"")); Serial.print(s.NAME);
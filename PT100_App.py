@@ -1,162 +1,252 @@
-import sys, threading, json, time, os, csv, math
-import serial, serial.tools.list_ports
-import matplotlib.dates as mdates
-import datetime
+import os, sys, time, threading
+
+# --- Tryb bez GUI: nie ładuj Qt ani matplotlib ---
+if __name__ == "__main__" and "--headless" in sys.argv[1:]:
+    from pt100_headless import main
+    sys.exit(main(sys.argv[1:]))
 
 # --- GUI backend: PySide6 albo PyQt6 (auto-fallback) ---
 try:
     from PySide6.QtCore import Qt, QTimer, Signal, QObject
     from PySide6.QtWidgets import (
         QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton,
-        QLineEdit, QTextEdit, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox,
-        QFileDialog, QCheckBox, QSpinBox, QSizePolicy
+        QLineEdit, QTableView, QHeaderView, QMessageBox,
+        QFileDialog, QInputDialog, QCheckBox, QSpinBox, QDoubleSpinBox, QSizePolicy, QSlider
     )
     USING_PYSIDE = True
 except ImportError:
     from PyQt6.QtCore import Qt, QTimer, pyqtSignal as Signal, QObject
     from PyQt6.QtWidgets import (
         QApplication, QWidget, QVBoxLayout, QHBoxLayout, QLabel, QComboBox, QPushButton,
-        QLineEdit, QTextEdit, QTableWidget, QTableWidgetItem, QHeaderView, QMessageBox,
-        QFileDialog, QCheckBox, QSpinBox, QSizePolicy
+        QLineEdit, QTableView, QHeaderView, QMessageBox,
+        QFileDialog, QInputDialog, QCheckBox, QSpinBox, QDoubleSpinBox, QSizePolicy, QSlider
     )
     USING_PYSIDE = False
 
-# --- Matplotlib (Qt canvas) ---
-from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
-from matplotlib.figure import Figure
-
-BAUD = 9600
+from pt100_csvlog import CsvLogger
+from pt100_history import HistoryStore
+from pt100_logpane import COMMAND, ERROR, STATUS, LogPane, record_kind
+from pt100_logview import LoadCancelled, load_log
+from pt100_metrics import METRICS, JsonDumper, MetricsServer, Window, format_status
+from pt100_parser import parse_line
+from pt100_poller import MAX_PERIOD_S, MIN_PERIOD_S, PollScheduler
+from pt100_ports import PortInfo, PortWatcher
+from pt100_protocol import Link, Reply, Sample, SensorList, key_sort, sensor_key, split_key
+from pt100_sensortable import SensorTableModel
+from pt100_serial import BAUD, BAUD_RATES, DeviceManager
+from pt100_share import RemoteManager, ShareServer
+from pt100_stats import AlarmLog, StatsEngine, describe, parse_rule
+
+HIST_CAPACITY = 50000       # próbek na czujnik
+HIST_RETENTION_S = None     # maks. wiek historii [s], None = tylko limit pojemności
+PLOT_INTERVAL_MS = 100      # klatka wykresu (rysuje tylko gdy są nowe dane)
+POLL_TICK_MS = 50           # takt harmonogramu READ (pt100_poller)
+AGG_BUCKETS = "1m, 1h"      # domyślne przedziały agregacji logów (pt100_aggregate)
+AUTO_RECONNECT = True       # po utracie łącza otwieraj port ponownie (backoff, także po numerze seryjnym USB)
+PLOT_MAX_WINDOW_S = 366 * 24 * 3600 # wykres jest decymowany, więc okno może mieć dni (i więcej dla logów)
+CSV_FSYNC_INTERVAL_S = 10.0 # wymuszenie zapisu na nośnik (None = tylko flush)
+CSV_ROTATE_BYTES = None     # rotacja po rozmiarze, np. 100 * 1024 * 1024
+CSV_ROTATE_DAILY = False    # rotacja o północy
+CSV_COMPRESS = False        # gzip zamkniętych segmentów
+LOG_MAX_LINES = 2000        # linii w panelu logu komunikacji
+LOG_SPILL_PATH = None       # pełny log komunikacji do pliku z rotacją, np. "pt100_comm.log"
+METRICS_HTTP_PORT = None    # metryki na http://127.0.0.1:PORT/metrics, np. 9101 (None = wyłączone)
+METRICS_JSON_PATH = None    # okresowy zrzut metryk do pliku JSON, np. "pt100_metrics.json"
+METRICS_JSON_INTERVAL_S = 10.0
+METRICS_PANEL_MS = 1000     # odświeżanie panelu stanu (okno tempa i kwantyli)
+LAG_PROBE_MS = 100          # próbnik opóźnienia pętli zdarzeń GUI
+STATS_WINDOW_S = 60.0       # okno statystyk w tabeli (min/max/średnia/σ/°C/min)
+ALARM_LOG_PATH = None       # zdarzenia alarmów do CSV, np. "pt100_alarms.csv"
+SHARE_PORT = None           # udostępnianie strumienia klientom na 127.0.0.1:PORT, np. 8765 (None = wyłączone)
+SHARE_POLICY = "coalesce"   # wolny klient: "coalesce" (najnowszy pomiar czujnika) albo "drop" (najstarsze out)
+REMOTE_ADDRESS = None       # "host:port" – GUI jako klient ShareServer zamiast portu (--remote)
+
+_BATCH_S = METRICS.histogram("pt100_batch_seconds", "Obsługa paczki rekordów przez odbiorcę (GUI/headless)")
+_PLOT_S = METRICS.histogram("pt100_plot_frame_seconds", "Narysowanie klatki wykresu")
+_LAG_S = METRICS.histogram("pt100_gui_lag_seconds", "Spóźnienie timera-próbnika (zajęta pętla zdarzeń GUI)")
+_HIST_BYTES = METRICS.gauge("pt100_history_bytes", "Pamięć bufora historii czujnika", ("sensor",))
+_HIST_SAMPLES = METRICS.gauge("pt100_history_samples", "Próbek w historii czujnika", ("sensor",))
 
 # -------------------- Serial backend (wątek czytający) --------------------
 
 class SerialBackend(QObject):
-    line_received = Signal(str)
+    """
+    Adapter Qt dla DeviceManager (albo RemoteManager, gdy podano `remote`):
+    scalone paczki rekordów trafiają do GUI jako sygnał.
+    """
+    records_received = Signal(object)   # list[Sample | SensorList | Reply | Other]
     status = Signal(str)
-    connected = Signal(bool)
+    connected = Signal(str, bool)       # port, stan
+    command_done = Signal(object)       # (port, komenda, Future) – odpowiedź, błąd albo timeout
+
+    def __init__(self, remote=None):
+        super().__init__()
+        self.taps = []              # dodatkowi odbiorcy paczek, wołani w wątku scalającym (ShareServer)
+        # callbacki wołane z wątków czytających -> sygnały (kolejkowane do GUI)
+        manager = (lambda **kw: RemoteManager(remote, **kw)) if remote else DeviceManager
+        self.devices = manager(on_batch=self._on_batch,
+                               on_status=self.status.emit,
+                               on_connected=self.connected.emit,
+                               reconnect=AUTO_RECONNECT)
+
+    def _on_batch(self, batch):
+        for tap in self.taps:
+            tap(batch)
+        self.records_received.emit(batch)
+
+    def open(self, port: str, baud: int = BAUD, serial_number=None) -> bool:
+        return self.devices.open(port, baud, serial_number)
+
+    def close(self, port=None):
+        self.devices.close(port)
+
+    def ports(self):
+        return self.devices.ports()
+
+    def is_open(self, port=None) -> bool:
+        return self.devices.is_open(port)
+
+    def send_line(self, line: str, port=None):
+        self.devices.send_line(line, port)
+
+    def command(self, line: str, port: str):
+        """Komenda przez kolejkę z dopasowaniem odpowiedzi; wynik przychodzi sygnałem command_done."""
+        return self.devices.command(line, port,
+                                    callback=lambda f: self.command_done.emit((port, line, f)))
+
+class LogLoader(QObject):
+    """Wczytuje zapisany log w wątku tła (pt100_logview.load_log)."""
+    progress = Signal(float)
+    loaded = Signal(object)     # LogArchive
+    failed = Signal(str)
+    _done = Signal(object, object, object)  # (token, LogArchive, błąd) z wątku tła
 
     def __init__(self):
         super().__init__()
-        self.ser = None
-        self._stop = False
+        self._token = None      # Event bieżącego wczytywania; każde ma własny
+        self._done.connect(self._on_done)
+
+    def start(self, path: str):
+        self.cancel()
+        self._token = token = threading.Event()
+        threading.Thread(target=self._run, args=(path, token), daemon=True).start()
+
+    def cancel(self):
+        if self._token is not None:
+            self._token.set()
+            self._token = None
 
-    def open(self, port: str, baud: int = BAUD) -> bool:
-        self.close()
+    def _run(self, path, token):
         try:
-            self.ser = serial.Serial(port, baud, timeout=0.1, dsrdtr=False, rtscts=False)
-            self.ser.setDTR(False)   # <- ważne
-            self.ser.setRTS(False)
-            self._stop = False
-            t = threading.Thread(target=self._reader_loop, daemon=True)
-            t.start()
-            self.connected.emit(True)
-            self.status.emit(f"Connected: {port} @ {baud}")
-            return True
+            archive = load_log(path, progress=lambda f: token.is_set() or self.progress.emit(f),
+                               cancel=token.is_set)
+        except LoadCancelled:
+            return
         except Exception as e:
-            self.ser = None
-            self.connected.emit(False)
-            self.status.emit(f"ERR open: {e}")
-            return False
+            self._done.emit(token, None, str(e))
+            return
+        self._done.emit(token, archive, None)
 
-    def close(self):
-        self._stop = True
-        if self.ser:
-            try: self.ser.close()
-            except: pass
-        self.ser = None
-        self.connected.emit(False)
-        self.status.emit("Disconnected")
-
-    def send_line(self, line: str):
-        if not self.ser or not self.ser.is_open:
-            self.status.emit("Not connected")
+    def _on_done(self, token, archive, error):
+        # wynik przerwanego albo zastąpionego wczytywania nie trafia do okna
+        if token is not self._token:
             return
-        data = (line.strip() + "\n").encode("utf-8")
+        self._token = None
+        if error is not None:
+            self.failed.emit(error)
+        else:
+            self.loaded.emit(archive)
+
+class LogAggregator(QObject):
+    """Agregacja logów do przedziałów (pt100_aggregate) w wątku tła; pliki w osobnych procesach."""
+    progress = Signal(float)
+    finished = Signal(object)   # AggResult
+    failed = Signal(str)
+    _done = Signal(object, object, object)  # (token, AggResult, błąd) z wątku tła
+
+    def __init__(self):
+        super().__init__()
+        self._token = None      # Event bieżącej agregacji; każda ma własny
+        self._done.connect(self._on_done)
+
+    @property
+    def running(self) -> bool:
+        return self._token is not None
+
+    def start(self, paths, buckets, prefix: str):
+        self.cancel()
+        self._token = token = threading.Event()
+        threading.Thread(target=self._run, args=(paths, buckets, prefix, token), daemon=True).start()
+
+    def cancel(self):
+        if self._token is not None:
+            self._token.set()
+            self._token = None
+
+    def _run(self, paths, buckets, prefix, token):
+        from pt100_aggregate import aggregate   # tylko gdy potrzebne (start okna)
         try:
-            self.ser.write(data)
+            res = aggregate(paths, buckets, prefix, jobs=os.cpu_count() or 1,
+                            progress=lambda f: token.is_set() or self.progress.emit(f),
+                            cancel=token.is_set)
+        except LoadCancelled:
+            return
         except Exception as e:
-            self.status.emit(f"ERR write: {e}")
+            self._done.emit(token, None, str(e))
+            return
+        self._done.emit(token, res, None)
 
-    def _reader_loop(self):
-        buf = b""
-        while not self._stop and self.ser and self.ser.is_open:
-            try:
-                chunk = self.ser.read(256)
-                if chunk:
-                    buf += chunk
-                    while b"\n" in buf:
-                        line, buf = buf.split(b"\n", 1)
-                        self.line_received.emit(line.decode(errors="replace").rstrip("\r"))
-                else:
-                    time.sleep(0.01)
-            except Exception as e:
-                self.status.emit(f"ERR read: {e}")
-                break
-        self.connected.emit(False)
-
-# -------------------- CSV Logger --------------------
-
-class CsvLogger:
-    """
-    Nagłówek CSV:
-    timestamp_iso, epoch_ms, id, name, temp_c, source
-    """
-    def __init__(self):
-        self.path = None
-        self._file = None
-        self._writer = None
-
-    def set_path(self, path: str):
-        self.close()
-        self.path = path
-        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
-        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
-        self._file = open(path, "a", newline="", encoding="utf-8")
-        self._writer = csv.writer(self._file)
-        if new_file:
-            self._writer.writerow(["timestamp_iso", "epoch_ms", "id", "name", "temp_c", "source"])
-            self._file.flush()
-
-    def is_ready(self) -> bool:
-        return self._writer is not None
-
-    def log_temp(self, sid, name, temp, source="interval"):
-        if not self.is_ready():
+    def _on_done(self, token, res, error):
+        # wynik przerwanej albo zastąpionej agregacji jest pomijany
+        if token is not self._token:
             return
-        ts = time.time()
-        iso = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ts))
-        epoch_ms = int(ts * 1000)
-        try:
-            tval = float(temp) if temp is not None else ""
-        except:
-            tval = ""
-        self._writer.writerow([iso, epoch_ms, sid, name or "", tval, source])
-        self._file.flush()
+        self._token = None
+        if error is not None:
+            self.failed.emit(error)
+        else:
+            self.finished.emit(res)
+
+class PortScanner(QObject):
+    """Adapter Qt dla PortWatcher: lista portów (także po podłączeniu USB) przychodzi sygnałem."""
+    changed = Signal(object)    # list[PortInfo]
+    status = Signal(str)
+
+    def __init__(self):
+        super().__init__()
+        self.watcher = PortWatcher(on_change=self.changed.emit, on_error=self.status.emit)
+
+    def start(self):
+        self.watcher.start()
+
+    def refresh(self):
+        self.watcher.refresh()
 
     def close(self):
-        try:
-            if self._file:
-                self._file.flush()
-                self._file.close()
-        except:
-            pass
-        self._file = None
-        self._writer = None
+        self.watcher.close()
 
 # -------------------- GUI --------------------
 
 class PT100App(QWidget):
     def __init__(self):
         super().__init__()
-        self.setWindowTitle("PT100 Manager (Serial)")
-        self.backend = SerialBackend()
-        self.backend.line_received.connect(self.on_line)
+        self.setWindowTitle(f"PT100 Manager (remote {REMOTE_ADDRESS})" if REMOTE_ADDRESS else "PT100 Manager (Serial)")
+        self.backend = SerialBackend(REMOTE_ADDRESS)
+        devices = self.backend.devices
+        self.poller = PollScheduler(devices.command, baud_of=devices.baudrate,
+                                    pending_of=devices.commands.pending, ready_of=devices.is_open)
+        self.backend.records_received.connect(self.on_records)
         self.backend.status.connect(self.on_status)
         self.backend.connected.connect(self.on_connected)
+        self.backend.command_done.connect(self.on_command_done)
 
         # dane
-        self.sensors = {}  # id(str) -> dict {name,pin,active,last_t,updated_ts}
-        self.hist = {}     # id(str) -> list[(ts, temp)]
-        self.csv = CsvLogger()
+        # klucz czujnika = "port:id" (id są unikalne tylko w obrębie płytki)
+        self.sensors = {}  # klucz -> dict {dev,id,name,pin,active,last_t,updated_ts}
+        self.hist = HistoryStore(HIST_CAPACITY, HIST_RETENTION_S)  # klucz -> RingBuffer
+        self.stats = StatsEngine(STATS_WINDOW_S)   # statystyki kroczące i alarmy
+        self.alarmLog = AlarmLog(ALARM_LOG_PATH)
+        self.csv = CsvLogger(fsync_interval=CSV_FSYNC_INTERVAL_S, rotate_bytes=CSV_ROTATE_BYTES,
+                             rotate_daily=CSV_ROTATE_DAILY, compress=CSV_COMPRESS)
 
         layout = QVBoxLayout(self)
 
@@ -166,11 +256,23 @@ class PT100App(QWidget):
         self.btnRefresh = QPushButton("Refresh Ports")
         self.btnConn = QPushButton("Connect")
         self.btnDis = QPushButton("Disconnect")
+        # baud musi zgadzać się z LH_BAUD firmware; pole edytowalne dla nietypowych wartości
+        self.baudBox = QComboBox()
+        self.baudBox.setEditable(True)
+        self.baudBox.addItems([str(b) for b in BAUD_RATES])
+        self.baudBox.setCurrentText(str(BAUD))
+        self.chkFrames = QCheckBox("binary frames")
+        self.chkFrames.setToolTip("Auto-reports as 7-byte binary frames (MODE fmt=bin); commands stay JSON")
         row.addWidget(QLabel("Port:"))
         row.addWidget(self.portBox, 1)
+        row.addWidget(QLabel("Baud:"))
+        row.addWidget(self.baudBox)
+        row.addWidget(self.chkFrames)
         row.addWidget(self.btnRefresh)
         row.addWidget(self.btnConn)
         row.addWidget(self.btnDis)
+        self.lblDevices = QLabel("-")
+        row.addWidget(self.lblDevices)
         layout.addLayout(row)
 
         # CSV row
@@ -200,14 +302,49 @@ class PT100App(QWidget):
         self.btnNew  = QPushButton("NEW")
         self.btnSet  = QPushButton("SET")
         self.btnDel  = QPushButton("DEL")
+        self.btnReadAll = QPushButton("READ all")
         for w in [self.edId, self.edPin, self.edName, self.edT1, self.edQ1, self.edT2, self.edQ2, self.edInterval,
-                  self.btnList, self.btnRead, self.btnNew, self.btnSet, self.btnDel]:
+                  self.btnList, self.btnRead, self.btnNew, self.btnSet, self.btnDel, self.btnReadAll]:
             quick.addWidget(w)
         layout.addLayout(quick)
 
-        # Table
-        self.table = QTableWidget(0, 6)
-        self.table.setHorizontalHeaderLabels(["id", "name", "pin", "active", "last temp [°C]", "updated"])
+        # Odpytywanie READ z harmonogramu (pt100_poller)
+        pollrow = QHBoxLayout()
+        self.chkPoll = QCheckBox("Poll READ every")
+        self.pollPeriod = QDoubleSpinBox()
+        self.pollPeriod.setRange(MIN_PERIOD_S, MAX_PERIOD_S); self.pollPeriod.setValue(5.0)
+        self.pollPeriod.setSuffix(" s"); self.pollPeriod.setDecimals(1)
+        self.btnPollSel = QPushButton("Set for selected")
+        self.btnPollSel.setToolTip("Own poll period for the selected sensors")
+        self.chkPollAdaptive = QCheckBox("adaptive")
+        self.chkPollAdaptive.setToolTip("Poll fast-changing sensors more often, stable ones less often")
+        self.lblPoll = QLabel("")
+        pollrow.addWidget(self.chkPoll); pollrow.addWidget(self.pollPeriod)
+        pollrow.addWidget(self.btnPollSel); pollrow.addWidget(self.chkPollAdaptive)
+        pollrow.addWidget(self.lblPoll, 1)
+        layout.addLayout(pollrow)
+
+        # Alarmy (pt100_stats): puste pole = próg wyłączony
+        alarmrow = QHBoxLayout()
+        self.edAlarmHi = QLineEdit(); self.edAlarmHi.setPlaceholderText("hi °C")
+        self.edAlarmLo = QLineEdit(); self.edAlarmLo.setPlaceholderText("lo °C")
+        self.edAlarmRate = QLineEdit(); self.edAlarmRate.setPlaceholderText("rate °C/min")
+        self.edAlarmHyst = QLineEdit(); self.edAlarmHyst.setPlaceholderText("hyst °C (0.5)")
+        self.btnAlarmSel = QPushButton("Set for selected")
+        self.btnAlarmAll = QPushButton("Set default")
+        self.btnAlarmAll.setToolTip("Rule for all sensors without their own")
+        alarmrow.addWidget(QLabel("Alarms:"))
+        for w in (self.edAlarmHi, self.edAlarmLo, self.edAlarmRate, self.edAlarmHyst):
+            alarmrow.addWidget(w)
+        alarmrow.addWidget(self.btnAlarmSel); alarmrow.addWidget(self.btnAlarmAll)
+        alarmrow.addStretch(1)
+        layout.addLayout(alarmrow)
+
+        # Table (model/view – wiersze aktualizowane punktowo, bez przebudowy)
+        self.tableModel = SensorTableModel(self.sensors, self, stats=self.stats)
+        self.table = QTableView()
+        self.table.setModel(self.tableModel)
+        self.table.verticalHeader().setVisible(False)
         self.table.horizontalHeader().setSectionResizeMode(QHeaderView.ResizeMode.Stretch if not USING_PYSIDE else QHeaderView.Stretch)
         self.table.setSelectionBehavior(self.table.SelectionBehavior.SelectRows)
         self.table.setEditTriggers(self.table.EditTrigger.NoEditTriggers)
@@ -216,46 +353,108 @@ class PT100App(QWidget):
         # Plot controls + canvas
         pc = QHBoxLayout()
         self.plotSensor = QComboBox()
-        self.plotWin = QSpinBox(); self.plotWin.setRange(1, 3600); self.plotWin.setValue(60)
+        self.plotWin = QSpinBox(); self.plotWin.setRange(1, PLOT_MAX_WINDOW_S); self.plotWin.setValue(60)
         self.btnClearTrace = QPushButton("Clear")
+        self.chkOverview = QCheckBox("Overview")
+        self.chkOverview.setToolTip("wszystkie czujniki (albo ≥2 zaznaczone w tabeli) na jednym wykresie")
+        self.overviewMode = QComboBox(); self.overviewMode.addItems(["overlay", "grid"])
+        self.overviewMode.setEnabled(False)
+        self.btnOpenLog = QPushButton("Open log…")
+        self.btnAggregate = QPushButton("Aggregate…")
+        self.btnAggregate.setToolTip("min/max/mean/count/last na przedział czasu z zapisanych logów")
+        self.btnLive = QPushButton("Live")
+        self.viewPos = QSlider(Qt.Orientation.Horizontal)   # przesuwanie widoku logu
+        self.viewPos.setRange(0, 10000); self.viewPos.setValue(10000)
+        self.lblView = QLabel("live")
         pc.addWidget(QLabel("Sensor:")); pc.addWidget(self.plotSensor)
+        pc.addWidget(self.chkOverview); pc.addWidget(self.overviewMode)
         pc.addWidget(QLabel("Window [s]:")); pc.addWidget(self.plotWin)
         pc.addWidget(self.btnClearTrace)
+        pc.addWidget(self.btnOpenLog); pc.addWidget(self.btnAggregate); pc.addWidget(self.btnLive)
+        pc.addWidget(self.viewPos, 1); pc.addWidget(self.lblView)
         layout.addLayout(pc)
 
-        self.fig = Figure(figsize=(5,3))
-        self.canvas = FigureCanvas(self.fig)
-        self.ax = self.fig.add_subplot(111)
-        self.ax.set_xlabel("time [HH:MM:SS]")
-        self.ax.set_ylabel("temp [°C]")
-        # Zwiększ margines na dole, aby podpisy czasu nie nachodziły na log
-        self.fig.subplots_adjust(bottom=0.22)
-        layout.addWidget(self.canvas, 2)
+        self._listPending = set()      # porty z zaplanowanym LIST (po NEW/DEL)
+
+        # log z pliku (None = wykres na żywo)
+        self.archive = None
+        self.loader = LogLoader()
+        self.loader.progress.connect(lambda f: self.lblView.setText(f"loading {f:.0%}"))
+        self.loader.loaded.connect(self.on_log_loaded)
+        self.loader.failed.connect(self.on_log_failed)
+        self.aggregator = LogAggregator()
+        self.aggregator.progress.connect(lambda f: self.btnAggregate.setText(f"Aggregating {f:.0%}"))
+        self.aggregator.finished.connect(self.on_aggregated)
+        self.aggregator.failed.connect(self.on_aggregate_failed)
+        self.viewPos.setVisible(False)
+        self.btnLive.setEnabled(False)
+
+        # wykres (matplotlib) powstaje dopiero po pokazaniu okna – ensurePlot()
+        self.plot = None
+        self.overview = None    # OverviewPlot, tworzony przy pierwszym włączeniu
+        self._plotScheduled = False
+        self.plotHost = QVBoxLayout()
+        self.lblPlotLoading = QLabel("loading plot…")
+        self.lblPlotLoading.setAlignment(Qt.AlignmentFlag.AlignCenter)
+        self.plotHost.addWidget(self.lblPlotLoading)
+        layout.addLayout(self.plotHost, 2)
+
+        # Stan toru danych (pt100_metrics)
+        self.lblMetrics = QLabel("")
+        self.lblMetrics.setWordWrap(True)
+        self.lblMetrics.setToolTip("rec/s i kB/s z portów, błędy, p95 opóźnień z ostatniej sekundy"
+                                   + (f"\nhttp://127.0.0.1:{METRICS_HTTP_PORT}/metrics" if METRICS_HTTP_PORT else ""))
+        layout.addWidget(self.lblMetrics, 0)
 
         # Log (mniejszy)
-        self.log = QTextEdit(); self.log.setReadOnly(True)
-        self.log.setMaximumHeight(50)
+        self.log = LogPane(LOG_MAX_LINES)
+        self.log.set_spill(LOG_SPILL_PATH)
+        self.log.view.setMaximumHeight(50)
         self.log.setSizePolicy(QSizePolicy.Policy.Preferred, QSizePolicy.Policy.Fixed)
         layout.addWidget(self.log, 0)
 
         # Signals
         self.btnRefresh.clicked.connect(self.refreshPorts)
         self.btnConn.clicked.connect(self.connectPort)
-        self.btnDis.clicked.connect(self.backend.close)
-        self.btnList.clicked.connect(lambda: self.backend.send_line("LIST"))
+        self.btnDis.clicked.connect(self.disconnectPort)
+        self.portBox.currentTextChanged.connect(lambda _: self.updateButtons())
+        self.chkFrames.toggled.connect(lambda _: self.sendFrameMode())
+        self.btnList.clicked.connect(lambda: self.backend.send_line("LIST"))  # do wszystkich
         self.btnRead.clicked.connect(self.sendRead)
         self.btnNew.clicked.connect(self.sendNew)
         self.btnSet.clicked.connect(self.sendSet)
         self.btnDel.clicked.connect(self.sendDel)
-        self.table.itemSelectionChanged.connect(self.on_select_row)
+        self.btnReadAll.clicked.connect(self.sendReadAll)
+        self.chkPoll.toggled.connect(self.poller.set_enabled)
+        self.pollPeriod.valueChanged.connect(lambda v: self.poller.set_period(None, v))
+        self.btnPollSel.clicked.connect(self.setPollForSelected)
+        self.btnAlarmSel.clicked.connect(lambda: self.setAlarmRule(selected=True))
+        self.btnAlarmAll.clicked.connect(lambda: self.setAlarmRule(selected=False))
+        self.chkPollAdaptive.toggled.connect(lambda on: setattr(self.poller, "adaptive", on))
+        self.table.selectionModel().selectionChanged.connect(lambda *_: self.on_select_row())
 
         self.btnPickCsv.clicked.connect(self.pickCsv)
         self.btnDumpCsv.clicked.connect(self.dumpTableToCsv)
         self.btnClearTrace.clicked.connect(self.clearSelectedHistory)
         self.plotSensor.currentIndexChanged.connect(self.updatePlot)
-
-        self.refreshPorts()
-        self.updateButtons(False)
+        self.chkOverview.toggled.connect(lambda _: self.showOverview())
+        self.overviewMode.currentTextChanged.connect(lambda _: self.showOverview())
+        self.plotWin.valueChanged.connect(self.updatePlot)
+        self.viewPos.valueChanged.connect(self.updatePlot)
+        self.btnOpenLog.clicked.connect(self.openLog)
+        self.btnAggregate.clicked.connect(self.aggregateLogs)
+        self.btnLive.clicked.connect(self.showLive)
+
+        # lista portów z wątku tła, odświeżana także po podłączeniu/odłączeniu USB
+        self.ports = PortScanner()
+        self.ports.changed.connect(self.on_ports_changed)
+        self.ports.status.connect(self.on_status)
+        if REMOTE_ADDRESS:
+            # porty należą do serwera – lista przychodzi przez on_connected
+            self.backend.open(None)
+        else:
+            self.ports.start()
+        self.updateButtons()
 
         # UI timer
         self.uiTimer = QTimer(self)
@@ -263,33 +462,142 @@ class PT100App(QWidget):
         self.uiTimer.timeout.connect(self.on_ui_tick)
         self.uiTimer.start()
 
+        # Plot timer – szybszy od UI, ale bez nowych próbek nic nie rysuje
+        self.plotTimer = QTimer(self)
+        self.plotTimer.setInterval(PLOT_INTERVAL_MS)
+        self.plotTimer.timeout.connect(self.updatePlot)
+        self.plotTimer.start()
+
+        self.pollTimer = QTimer(self)
+        self.pollTimer.setInterval(POLL_TICK_MS)
+        self.pollTimer.timeout.connect(self.poller.tick)
+        self.pollTimer.start()
+
+        # metryki: pamięć historii liczona przy odczycie, próbnik pętli zdarzeń, panel
+        _HIST_BYTES.set_function(lambda: {(k,): self.hist.get(k).nbytes() for k in list(self.hist)})
+        _HIST_SAMPLES.set_function(lambda: {(k,): len(self.hist.get(k)) for k in list(self.hist)})
+        self.metricsWin = Window()
+        self.metricsWin.tick()
+        self._lagDue = None         # pierwszy takt próbnika (start pętli zdarzeń) bez pomiaru
+        self.lagTimer = QTimer(self)
+        self.lagTimer.setInterval(LAG_PROBE_MS)
+        self.lagTimer.timeout.connect(self.probeLag)
+        self.lagTimer.start()
+        self.metricsTimer = QTimer(self)
+        self.metricsTimer.setInterval(METRICS_PANEL_MS)
+        self.metricsTimer.timeout.connect(self.updateMetrics)
+        self.metricsTimer.start()
+        self.metricsServer = None
+        if METRICS_HTTP_PORT:
+            try:
+                self.metricsServer = MetricsServer(port=METRICS_HTTP_PORT)
+            except OSError as e:
+                self.on_status(f"ERR metrics port {METRICS_HTTP_PORT}: {e}")
+        self.metricsDump = JsonDumper(METRICS_JSON_PATH, METRICS_JSON_INTERVAL_S) if METRICS_JSON_PATH else None
+
+        # inne programy (skrypty testowe, drugi dashboard) dostają ten sam strumień i kolejkę komend
+        self.share = None
+        if SHARE_PORT:
+            try:
+                self.share = ShareServer(self.backend.devices, SHARE_PORT, policy=SHARE_POLICY,
+                                         on_status=self.backend.status.emit)
+                self.backend.taps.append(self.share.publish)
+                self.on_status(f"sharing on {self.share.host}:{self.share.port}")
+            except OSError as e:
+                self.on_status(f"ERR share port {SHARE_PORT}: {e}")
+
     # ---------- Ports ----------
     def refreshPorts(self):
+        self.ports.refresh()
+
+    def on_ports_changed(self, ports):
+        old = [self.portBox.itemText(i) for i in range(self.portBox.count())]
+        current = self.portBox.currentText()
+        names = [p.device for p in ports]
+        self.portBox.blockSignals(True)
         self.portBox.clear()
-        ports = [p.device for p in serial.tools.list_ports.comports()]
-        self.portBox.addItems(ports)
+        for i, p in enumerate(ports):
+            self.portBox.addItem(p.device)
+            tip = p.description + (f" (S/N {p.serial_number})" if p.serial_number else "")
+            self.portBox.setItemData(i, tip, Qt.ItemDataRole.ToolTipRole)
+        added = [n for n in names if n not in old]
+        if current in names:
+            self.portBox.setCurrentText(current)
+        elif added:
+            self.portBox.setCurrentText(added[0])   # właśnie podłączone urządzenie
+        self.portBox.blockSignals(False)
+        removed = [n for n in old if n not in names]
+        if old and (added or removed):
+            self.on_status("ports: " + " ".join([f"+{n}" for n in added] + [f"-{n}" for n in removed]))
+        self.updateButtons()
 
     def connectPort(self):
         port = self.portBox.currentText().strip()
-        if not port:
+        if not port and not REMOTE_ADDRESS:     # zdalnie porty wybiera serwer
             QMessageBox.warning(self, "Brak portu", "Wybierz port z listy.")
             return
-        self.backend.open(port, BAUD)
+        try:
+            baud = int(self.baudBox.currentText())
+        except ValueError:
+            QMessageBox.warning(self, "Baud", "Nieprawidłowa prędkość.")
+            return
+        # numer seryjny USB pozwala odnaleźć płytkę po ponownym wyliczeniu pod inną nazwą
+        info = self.ports.watcher.info(port)
+        self.backend.open(port, baud, info.serial_number if info else None)
 
-    def on_connected(self, ok: bool):
-        self.updateButtons(ok)
+    def disconnectPort(self):
+        # wybrany port, a jeśli nie jest otwarty – wszystkie
+        port = self.portBox.currentText().strip()
+        port = port if self.backend.is_open(port) or port in self.backend.devices.reconnecting() else None
+        self.restoreJson(port)
+        self.backend.close(port)
+
+    def on_connected(self, port: str, ok: bool):
+        if ok and self.chkFrames.isChecked():
+            self.sendFrameMode(port)
+        if self.share:
+            self.share.ports_changed()
+        if REMOTE_ADDRESS:
+            self.on_ports_changed([PortInfo(p, f"remote {REMOTE_ADDRESS}") for p in self.backend.ports()])
+        self.updateButtons()
+
+    def sendFrameMode(self, port=None):
+        # port=None – wszystkie otwarte (zmiana pola wyboru)
+        cmd = "MODE fmt=bin" if self.chkFrames.isChecked() else "MODE fmt=json"
+        for p in [port] if port else self.backend.ports():
+            self.sendCommand(p, cmd)
+
+    def restoreJson(self, port=None):
+        # płytka zostaje w trybie ramek po rozłączeniu – przywróć JSON dla kolejnej sesji
+        if not self.chkFrames.isChecked():
+            return
+        for p in [port] if port else self.backend.ports():
+            self.backend.send_line("MODE fmt=json", p)
 
-    def updateButtons(self, connected: bool):
-        self.btnConn.setEnabled(not connected)
-        self.btnDis.setEnabled(connected)
-        for b in [self.btnList, self.btnRead, self.btnNew, self.btnSet, self.btnDel]:
-            b.setEnabled(connected)
+    def updateButtons(self):
+        port = self.portBox.currentText().strip()
+        selected = self.backend.is_open(port) if port else False
+        self.btnConn.setEnabled(not selected)
+        waiting = self.backend.devices.reconnecting()
+        self.btnDis.setEnabled(self.backend.is_open() or bool(waiting))
+        for b in [self.btnList, self.btnRead, self.btnNew, self.btnSet, self.btnDel, self.btnReadAll]:
+            b.setEnabled(self.backend.is_open())
+        self.lblDevices.setText(", ".join(self.backend.ports() + [f"{p} (reconnecting…)" for p in waiting]) or "-")
 
     # ---------- CSV ----------
     def pickCsv(self):
-        path, _ = QFileDialog.getSaveFileName(self, "Wybierz plik CSV", "pt100_log.csv", "CSV files (*.csv);;All files (*.*)")
+        path, _ = QFileDialog.getSaveFileName(self, "Wybierz plik CSV", "pt100_log.csv",
+                                              "CSV files (*.csv);;PT100 binary log (*.ptb);;All files (*.*)")
         if not path: return
         try:
+            # .ptb -> binarny log z indeksem czasu, inaczej CSV (ten sam interfejs)
+            self.csv.close()
+            if path.lower().endswith(".ptb"):
+                from pt100_binlog import BinLogWriter
+                self.csv = BinLogWriter()
+            elif not isinstance(self.csv, CsvLogger):
+                self.csv = CsvLogger(fsync_interval=CSV_FSYNC_INTERVAL_S, rotate_bytes=CSV_ROTATE_BYTES,
+                                     rotate_daily=CSV_ROTATE_DAILY, compress=CSV_COMPRESS)
             self.csv.set_path(path)
             self.lblCsv.setText(path)
             self.log.append(f"# CSV: {path}")
@@ -308,112 +616,224 @@ class PT100App(QWidget):
 
     # ---------- Commands ----------
     def getIdFromUI(self):
-        sid = self.edId.text().strip()
-        if not sid:
+        """
+        Zwraca (port, id) dla komendy. Pole id przyjmuje "port:id" (np. z tabeli)
+        albo samo id – wtedy komenda idzie do portu wybranego na liście
+        (lub do jedynego podłączonego).
+        """
+        key = self.edId.text().strip()
+        if not key:
             QMessageBox.information(self, "Brak id", "Podaj id czujnika.")
             return None
-        return sid
+        port, sid = split_key(key)
+        if not port:
+            ports = self.backend.ports()
+            selected = self.portBox.currentText().strip()
+            port = selected if selected in ports else (ports[0] if len(ports) == 1 else "")
+        if not self.backend.is_open(port):
+            QMessageBox.information(self, "Brak portu", "Podaj id w postaci port:id albo wybierz podłączony port.")
+            return None
+        return port, sid
+
+    def getTargetsFromUI(self):
+        """
+        Czujniki, których dotyczy komenda: wszystkie zaznaczone w tabeli, gdy
+        zaznaczono więcej niż jeden wiersz, inaczej (port, id) z pola id.
+        """
+        keys = [self.tableModel.key_at(ix.row()) for ix in self.table.selectionModel().selectedRows()]
+        keys = [k for k in keys if k is not None]
+        if len(keys) > 1:
+            targets = [split_key(k) for k in keys]
+            return [(port, sid) for port, sid in targets if self.backend.is_open(port)]
+        target = self.getIdFromUI()
+        return [target] if target is not None else []
+
+    def commandParams(self):
+        parts = []
+        if self.edT1.text().strip(): parts.append(f"t1={self.edT1.text().strip()}")
+        if self.edQ1.text().strip(): parts.append(f"q1={self.edQ1.text().strip()}")
+        if self.edT2.text().strip(): parts.append(f"t2={self.edT2.text().strip()}")
+        if self.edQ2.text().strip(): parts.append(f"q2={self.edQ2.text().strip()}")
+        if self.edInterval.text().strip(): parts.append(f"interval={self.edInterval.text().strip()}")
+        return parts
+
+    def sendCommand(self, port: str, cmd: str):
+        self.log.append(f"> [{port}] {cmd}", COMMAND)
+        self.backend.command(cmd, port)
 
     def sendRead(self):
-        sid = self.getIdFromUI()
-        if sid is None: return
-        self.backend.send_line(f"READ id={sid}")
+        for port, sid in self.getTargetsFromUI():
+            self.backend.command(f"READ id={sid}", port)
+
+    def sendReadAll(self):
+        # kolejka komend pilnuje bufora RX – można wysłać wszystko naraz
+        for key in sorted(self.sensors, key=key_sort):
+            port, sid = split_key(key)
+            if self.backend.is_open(port):
+                self.backend.command(f"READ id={sid}", port)
 
     def sendDel(self):
-        sid = self.getIdFromUI()
-        if sid is None: return
-        self.backend.send_line(f"DEL id={sid}")
+        for port, sid in self.getTargetsFromUI():
+            self.sendCommand(port, f"DEL id={sid}")
 
     def sendNew(self):
-        sid = self.getIdFromUI()
-        if sid is None: return
+        target = self.getIdFromUI()
+        if target is None: return
+        port, sid = target
         pin = self.edPin.text().strip() or "A0"
         name = self.edName.text().strip() or "PT100"
-        parts = [f"NEW id={sid} active=1 pin={pin} name={name}"]
-        if self.edT1.text().strip(): parts.append(f"t1={self.edT1.text().strip()}")
-        if self.edQ1.text().strip(): parts.append(f"q1={self.edQ1.text().strip()}")
-        if self.edT2.text().strip(): parts.append(f"t2={self.edT2.text().strip()}")
-        if self.edQ2.text().strip(): parts.append(f"q2={self.edQ2.text().strip()}")
-        if self.edInterval.text().strip(): parts.append(f"interval={self.edInterval.text().strip()}")
-        cmd = " ".join(parts)
-        self.log.append(f"> {cmd}")
-        self.backend.send_line(cmd)
+        parts = [f"NEW id={sid} active=1 pin={pin} name={name}"] + self.commandParams()
+        self.sendCommand(port, " ".join(parts))
 
     def sendSet(self):
-        sid = self.getIdFromUI()
-        if sid is None: return
-        parts = [f"SET id={sid}"]
-        if self.edPin.text().strip(): parts.append(f"pin={self.edPin.text().strip()}")
-        if self.edName.text().strip(): parts.append(f"name={self.edName.text().strip()}")
-        if self.edT1.text().strip(): parts.append(f"t1={self.edT1.text().strip()}")
-        if self.edQ1.text().strip(): parts.append(f"q1={self.edQ1.text().strip()}")
-        if self.edT2.text().strip(): parts.append(f"t2={self.edT2.text().strip()}")
-        if self.edQ2.text().strip(): parts.append(f"q2={self.edQ2.text().strip()}")
-        if self.edInterval.text().strip(): parts.append(f"interval={self.edInterval.text().strip()}")
-        cmd = " ".join(parts)
-        self.log.append(f"> {cmd}")
-        self.backend.send_line(cmd)
-
-    # ---------- Parsing incoming ----------
-    def on_line(self, line: str):
-        line = line.strip()
-        if not line: return
-        self.log.append(line)
-
-        # spróbuj JSON
+        targets = self.getTargetsFromUI()
+        params = []
+        if self.edPin.text().strip() and len(targets) == 1: params.append(f"pin={self.edPin.text().strip()}")
+        if self.edName.text().strip() and len(targets) == 1: params.append(f"name={self.edName.text().strip()}")
+        params += self.commandParams()
+        for port, sid in targets:
+            self.sendCommand(port, " ".join([f"SET id={sid}"] + params))
+
+    def on_command_done(self, item):
+        port, cmd, fut = item
+        exc = fut.exception()
+        if exc is not None:
+            self.on_status(f"ERR [{port}] {cmd}: {exc or type(exc).__name__}")
+            return
+        rec = fut.result()
+        if isinstance(rec, Reply) and not rec.ok:
+            self.on_status(f"ERR [{port}] {cmd}: {rec.err}")
+        elif cmd.split(None, 1)[0].upper() in ("NEW", "DEL"):
+            self.requestList(port)
+
+    def setPollForSelected(self):
+        rows = {i.row() for i in self.table.selectionModel().selectedRows()}
+        keys = [self.tableModel.key_at(r) for r in sorted(rows)]
+        for key in keys:
+            self.poller.set_period(key, self.pollPeriod.value())
+        if keys:
+            self.on_status(f"poll {self.pollPeriod.value():g} s: {', '.join(keys)}")
+
+    def setAlarmRule(self, selected: bool):
+        spec = ",".join(f"{k}={e.text().strip()}" for k, e in
+                        (("hi", self.edAlarmHi), ("lo", self.edAlarmLo),
+                         ("rate", self.edAlarmRate), ("hyst", self.edAlarmHyst)))
         try:
-            obj = json.loads(line)
-        except Exception:
+            rule = parse_rule(spec, self.stats.default_rule)
+        except ValueError:
+            QMessageBox.information(self, "Alarm", "Progi muszą być liczbami (puste = wyłączony).")
             return
-
-        # LIST
-        if isinstance(obj, dict) and "s" in obj and isinstance(obj["s"], list):
-            self.apply_list(obj["s"])
+        if not selected:
+            self.stats.set_rule(None, rule)
+            self.on_status(f"alarms (default): {spec}")
             return
+        rows = {i.row() for i in self.table.selectionModel().selectedRows()}
+        keys = [self.tableModel.key_at(r) for r in sorted(rows)]
+        for key in keys:
+            self.stats.set_rule(key, rule)
+        if keys:
+            self.on_status(f"alarms {spec}: {', '.join(keys)}")
+
+    def on_alarm(self, ev):
+        self.log.append(f"# {describe(ev)}", ERROR if ev.active else STATUS)
+        self.alarmLog.log(ev, self.sensors.get(ev.key, {}).get("name", ""))
+        self.tableModel.mark(ev.key)
+
+    def requestList(self, port: str):
+        # jeden LIST po serii NEW/DEL
+        if port in self._listPending: return
+        self._listPending.add(port)
+        def send():
+            self._listPending.discard(port)
+            if self.backend.is_open(port):
+                self.backend.command("LIST", port)
+        QTimer.singleShot(300, send)
 
-        # READ / auto-raport
-        if isinstance(obj, dict) and ("id" in obj) and ("t" in obj):
-            sid = str(obj.get("id"))
-            name = obj.get("name")
-            pin = obj.get("pin")  # może być int lub string
-            t = obj.get("t")
-            self.apply_temp(sid, name, pin, t)
-
-            # CSV auto
-            if self.chkAutoCsv.isChecked() and self.csv.is_ready():
-                source = "read" if obj.get("ok") else "interval"
-                self.csv.log_temp(sid, name, t, source=source)
-            return
+    # ---------- Parsing incoming ----------
+    def on_records(self, records):
+        # paczka rekordów sparsowanych w wątku czytającym
+        with _BATCH_S.time():
+            self._on_records(records)
+
+    def _on_records(self, records):
+        auto_csv = self.chkAutoCsv.isChecked() and self.csv.is_ready()
+        self.poller.on_records(records)
+        for rec in records:
+            self.log.append(rec.raw, record_kind(rec))
+            # LIST
+            if isinstance(rec, SensorList):
+                self.apply_list(rec.sensors, rec.dev)
+            # READ / auto-raport
+            elif isinstance(rec, Sample):
+                key = rec.key
+                self.apply_temp(key, rec.name, rec.pin, rec.t, rec.ts)
+                # CSV auto
+                if auto_csv:
+                    # ramki binarne nie niosą nazwy – ta z LIST
+                    name = rec.name or self.sensors.get(key, {}).get("name", "")
+                    self.csv.log_temp(key, name, rec.t, source=rec.source, ts=rec.ts)
+            elif isinstance(rec, Link):
+                self.apply_link(rec, auto_csv)
+        self.refreshTable()
+
+    def on_line(self, line: str):
+        rec = parse_line(line, time.time())
+        if rec is not None:
+            self.on_records([rec])
 
-    def apply_list(self, lst):
+    def apply_list(self, lst, dev=""):
+        # LIST opisuje tylko czujniki jednego urządzenia – pozostałe zostają
         existing = self.sensors
-        sensors = {}
+        sensors = {k: v for k, v in existing.items() if v.get("dev", "") != dev}
         for it in lst:
             if "id" not in it: continue
-            sid = str(it["id"])
+            key = sensor_key(dev, it["id"])
             entry = {
+                "dev": dev,
+                "id": str(it["id"]),
                 "name": it.get("name", ""),
                 "pin":  it.get("pin", ""),
                 "active": bool(it.get("active", 0)),
-                "last_t": existing.get(sid, {}).get("last_t"),
-                "updated_ts": existing.get(sid, {}).get("updated_ts"),
+                "last_t": existing.get(key, {}).get("last_t"),
+                "updated_ts": existing.get(key, {}).get("updated_ts"),
             }
-            sensors[sid] = entry
-            if sid not in self.hist:
-                self.hist[sid] = []
+            sensors[key] = entry
+            self.hist.ensure(key)
+        for key, data in existing.items():
+            if data.get("dev", "") == dev and key not in sensors:
+                self.stats.remove(key)      # usunięty z płytki – bez alarmu "stale"
         self.sensors = sensors
+        self.tableModel.set_sensors(sensors)
+        self.poller.set_sensors(sensors)
         self.rebuildPlotSensorList()
-        self.refreshTable()
         # jeśli nic nie wybrane na wykresie, wybierz pierwszy
         if self.plotSensor.currentIndex() < 0 and self.plotSensor.count() > 0:
             self.plotSensor.setCurrentIndex(0)
 
-    def apply_temp(self, sid, name, pin, t):
-        # sid to już string
+    def apply_link(self, rec, auto_csv: bool):
+        # utrata łącza: znacznik przerwy w historii (NaN urywa linię wykresu),
+        # statystykach i CSV – nic nie jest interpolowane przez przerwę
+        if rec.up:
+            return
+        for key, data in self.sensors.items():
+            if data.get("dev", "") != rec.dev:
+                continue
+            self.hist.append(key, rec.ts, float("nan"))
+            self.stats.reset(key)
+            self.tableModel.mark(key)
+            if auto_csv:
+                self.csv.log_temp(key, data.get("name", ""), None, source="gap", ts=rec.ts)
+
+    def apply_temp(self, sid, name, pin, t, ts=None):
+        # sid to klucz "port:id"; ts = czas odbioru po stronie hosta
+        if ts is None:
+            ts = time.time()
         if sid not in self.sensors:
-            self.sensors[sid] = {"name": name or "",  "pin": (str(pin) if pin is not None else ""), "active": True, "last_t": t, "updated_ts": time.time()}
-            if sid not in self.hist:
-                self.hist[sid] = []
+            dev, raw_id = split_key(sid)
+            self.sensors[sid] = {"dev": dev, "id": raw_id, "name": name or "",  "pin": (str(pin) if pin is not None else ""), "active": True, "last_t": t, "updated_ts": ts}
+            self.hist.ensure(sid)
+            # czujnik spoza LIST (np. auto-raport) też trafia do odpytywania
+            self.poller.set_sensors(self.sensors)
             # upewnij się, że wpadnie też na listę wyboru wykresu
             self.rebuildPlotSensorList()
             if self.plotSensor.currentIndex() < 0:
@@ -423,46 +843,21 @@ class PT100App(QWidget):
             if name: self.sensors[sid]["name"] = name
             if pin is not None: self.sensors[sid]["pin"] = str(pin)
             self.sensors[sid]["last_t"] = t
-            self.sensors[sid]["updated_ts"] = time.time()
+            self.sensors[sid]["updated_ts"] = ts
+        self.tableModel.mark(sid)
 
         # dodaj do historii z bezpiecznym castem
         try:
             val = float(t)
         except Exception:
             return  # nieprawidłowa liczba – pomiń
-        self.hist.setdefault(sid, []).append((time.time(), val))
-        if len(self.hist[sid]) > 20000:
-            self.hist[sid] = self.hist[sid][-20000:]
-        self.refreshTable()
+        self.hist.append(sid, ts, val)
+        for ev in self.stats.update(sid, ts, val):
+            self.on_alarm(ev)
 
     def refreshTable(self):
-        items = sorted(self.sensors.items(), key=lambda kv: int(kv[0]) if str(kv[0]).isdigit() else str(kv[0]))
-        self.table.setRowCount(len(items))
-        now = time.time()
-        for row, (sid, data) in enumerate(items):
-            def setcell(c, text):
-                item = QTableWidgetItem(text)
-                item.setTextAlignment(Qt.AlignmentFlag.AlignCenter if not USING_PYSIDE else Qt.AlignCenter)
-                self.table.setItem(row, c, item)
-
-            setcell(0, sid)
-            setcell(1, str(data.get("name","")))
-            setcell(2, str(data.get("pin","")))
-            setcell(3, "1" if data.get("active") else "0")
-
-            t = data.get("last_t")
-            ts = data.get("updated_ts")
-            if t is None:
-                setcell(4, "-"); setcell(5, "-")
-            else:
-                age = now - (ts or now)
-                try:
-                    txt = f"{float(t):.2f}"
-                except Exception:
-                    txt = str(t)
-                setcell(4, txt)
-                age_txt = "now" if age < 0.5 else f"{int(age)}s ago"
-                setcell(5, age_txt)
+        # dataChanged tylko dla czujników zmienionych od ostatniego odświeżenia
+        self.tableModel.refresh()
 
     # ---------- Plot ----------
 
@@ -470,12 +865,20 @@ class PT100App(QWidget):
         prev_data = self.plotSensor.currentData()
         self.plotSensor.blockSignals(True)
         self.plotSensor.clear()
-        ids = sorted(self.sensors.keys(), key=lambda x: int(x) if x.isdigit() else x)
+        if self.archive is not None:
+            # przeglądanie logu: czujniki z pliku
+            ids = sorted(self.archive.keys(), key=key_sort)
+        else:
+            ids = sorted(self.sensors.keys(), key=key_sort)
         for sid in ids:
-            s = self.sensors[sid]
-            name = s.get("name","")
-            pin  = s.get("pin","")
-            label = f"{sid} (pin {pin}" + (f", {name})" if name else ")")
+            if self.archive is not None:
+                name = self.archive.names.get(sid, "")
+                label = f"{sid}" + (f" ({name})" if name else "")
+            else:
+                s = self.sensors[sid]
+                name = s.get("name","")
+                pin  = s.get("pin","")
+                label = f"{sid} (pin {pin}" + (f", {name})" if name else ")")
             # userData = sid (string) – spójnie z hist/sensors
             if hasattr(self.plotSensor, "addItem"):
                 self.plotSensor.addItem(label, sid)
@@ -500,64 +903,203 @@ class PT100App(QWidget):
             text = self.plotSensor.currentText()
             sid = text.split(" ", 1)[0]
         if sid is None: return
-        self.hist[sid] = []
+        self.hist.clear(sid)
+        self.stats.reset(sid)
+        self.tableModel.mark(sid)
+        self.tableModel.refresh()
         self.updatePlot()
 
     def on_ui_tick(self):
-        self.refreshTable()
+        # tylko kolumna "updated" – dane odświeża refreshTable() po każdej paczce
+        self.tableModel.refresh_ages()
+        for ev in self.stats.check_stale():
+            self.on_alarm(ev)
+        self.tableModel.refresh()
+        if self.chkPoll.isChecked():
+            st = self.poller.status()
+            self.lblPoll.setText("  ".join(f"{p}: link {u:.0%}" + (f", x{k:.1f} slower" if k > 1.01 else "")
+                                           for p, (u, k) in sorted(st.items()))
+                                 + f"  reads {self.poller.reads_sent}, errors {self.poller.errors}")
+        else:
+            self.lblPoll.setText("")
+        # błędy wątku zapisu CSV
+        err = self.csv.last_error
+        if err:
+            self.csv.last_error = None
+            self.on_status(f"ERR CSV: {err}")
+
+    def paintEvent(self, event):
+        super().paintEvent(event)
+        # najpierw narysowane okno, potem import matplotlib i budowa wykresu
+        if self.plot is None and not self._plotScheduled:
+            self._plotScheduled = True
+            QTimer.singleShot(0, self.ensurePlot)
+
+    def ensurePlot(self):
+        if self.plot is not None:
+            return
+        from pt100_plot import LivePlot
+        self.plot = LivePlot()
+        self.fig, self.canvas, self.ax = self.plot.fig, self.plot.canvas, self.plot.ax
+        self.plotHost.removeWidget(self.lblPlotLoading)
+        self.lblPlotLoading.deleteLater()
+        self.plotHost.addWidget(self.canvas)
+        self.showOverview()
+
+    def showOverview(self):
+        on = self.chkOverview.isChecked()
+        self.plotSensor.setEnabled(not on)
+        self.overviewMode.setEnabled(on)
+        if self.plot is None:
+            return
+        if on and self.overview is None:
+            from pt100_plot import OverviewPlot
+            self.overview = OverviewPlot()
+            self.plotHost.addWidget(self.overview.canvas)
+        if self.overview is not None:
+            self.overview.mode = self.overviewMode.currentText()
+            self.overview.canvas.setVisible(on)
+        self.canvas.setVisible(not on)
         self.updatePlot()
 
+    def overviewKeys(self):
+        """Zaznaczone w tabeli czujniki (co najmniej 2), inaczej wszystkie; z etykietami."""
+        rows = self.table.selectionModel().selectedRows()
+        keys = [self.tableModel.key_at(ix.row()) for ix in rows] if len(rows) >= 2 else []
+        if self.archive is not None:
+            known, names = self.archive.keys(), self.archive.names
+        else:
+            known = self.sensors.keys()
+            names = {k: s.get("name", "") for k, s in self.sensors.items()}
+        keys = sorted({k for k in keys if k in known} or known, key=key_sort)
+        return keys, {k: f"{k} ({names[k]})" if names.get(k) else k for k in keys}
+
     def updatePlot(self):
+        if self.plot is None:
+            return
+        window_s = max(1, int(self.plotWin.value()))
+        if self.overview is not None and self.chkOverview.isChecked():
+            keys, labels = self.overviewKeys()
+            t0 = time.perf_counter()
+            if self.archive is not None:
+                drawn = self.overview.update(keys, self.archive, window_s, self.viewEnd(window_s), labels)
+            else:
+                drawn = self.overview.update(keys, self.hist, window_s, time.time(), labels)
+            if drawn:
+                _PLOT_S.observe(time.perf_counter() - t0)
+            return
         # pobierz aktualny wybór
         sid = self.plotSensor.currentData()
         if sid is None and self.plotSensor.currentIndex() >= 0:
             text = self.plotSensor.currentText()
             sid = text.split(" ", 1)[0]
-        if sid is None:
-            self.ax.clear()
-            self.ax.set_xlabel("time [HH:MM:SS]")
-            self.ax.set_ylabel("temp [°C]")
-            self.fig.tight_layout()
-            self.canvas.draw_idle()
+        t0 = time.perf_counter()
+        if self.archive is not None:
+            drawn = self.plot.update(sid, self.archive, window_s, self.viewEnd(window_s))
+        else:
+            # okno to tylko widok – historia zostaje nietknięta
+            drawn = self.plot.update(sid, self.hist, window_s, time.time())
+        if drawn:
+            _PLOT_S.observe(time.perf_counter() - t0)
+
+    # ---------- Metryki ----------
+
+    def probeLag(self):
+        # timer spóźnia się o tyle, ile pętla zdarzeń była zajęta czymś innym
+        now = time.monotonic()
+        if self._lagDue is not None:
+            _LAG_S.observe(max(0.0, now - self._lagDue))
+        self._lagDue = now + LAG_PROBE_MS / 1000
+
+    def updateMetrics(self):
+        self.metricsWin.tick()
+        self.lblMetrics.setText(format_status(self.metricsWin))
+
+    # ---------- Log z pliku ----------
+
+    def openLog(self):
+        path, _ = QFileDialog.getOpenFileName(self, "Otwórz log", "",
+                                              "PT100 logs (*.csv *.csv.gz *.ptb);;All files (*.*)")
+        if not path: return
+        self.loader.cancel()
+        self.btnLive.setEnabled(True)   # pozwala też przerwać wczytywanie
+        self.lblView.setText("loading…")
+        self.loader.start(path)
+
+    def on_log_loaded(self, archive):
+        self.archive = archive
+        self.log.append(f"# Log: {archive.path} ({archive.samples()} samples, {len(archive.keys())} sensors)")
+        self.viewPos.setVisible(True)
+        self.viewPos.setValue(self.viewPos.maximum())
+        self.btnClearTrace.setEnabled(False)
+        self.rebuildPlotSensorList()
+        if self.plotSensor.currentIndex() < 0 and self.plotSensor.count() > 0:
+            self.plotSensor.setCurrentIndex(0)
+        self.updatePlot()
+
+    def on_log_failed(self, msg: str):
+        self.lblView.setText("live" if self.archive is None else "log")
+        QMessageBox.critical(self, "Błąd logu", msg)
+
+    def aggregateLogs(self):
+        if self.aggregator.running:
+            # drugie kliknięcie przerywa
+            self.aggregator.cancel()
+            self.btnAggregate.setText("Aggregate…")
+            return
+        paths, _ = QFileDialog.getOpenFileNames(self, "Logi do agregacji", "",
+                                                "PT100 logs (*.csv *.csv.gz *.ptb);;All files (*.*)")
+        if not paths: return
+        text, ok = QInputDialog.getText(self, "Agregacja", "Przedziały (np. 1m, 15m, 1h, 1d):", text=AGG_BUCKETS)
+        if not ok: return
+        from pt100_aggregate import default_prefix, parse_buckets
+        try:
+            buckets = parse_buckets(text)
+        except ValueError as e:
+            QMessageBox.warning(self, "Agregacja", str(e))
             return
+        if not buckets: return
+        prefix, _ = QFileDialog.getSaveFileName(self, "Prefiks plików wynikowych", default_prefix(paths[0]),
+                                                "CSV prefix (*)")
+        if not prefix: return
+        self.btnAggregate.setText("Aggregating…")
+        self.aggregator.start(paths, buckets, prefix)
+
+    def on_aggregated(self, res):
+        self.btnAggregate.setText("Aggregate…")
+        self.log.append(f"# Aggregated {res.rows} records"
+                        + (f" ({res.late} late skipped)" if res.late else "")
+                        + ": " + ", ".join(res.outputs.values()))
+
+    def on_aggregate_failed(self, msg: str):
+        self.btnAggregate.setText("Aggregate…")
+        QMessageBox.critical(self, "Błąd agregacji", msg)
+
+    def showLive(self):
+        self.loader.cancel()
+        self.archive = None
+        self.viewPos.setVisible(False)
+        self.btnLive.setEnabled(False)
+        self.btnClearTrace.setEnabled(True)
+        self.lblView.setText("live")
+        self.rebuildPlotSensorList()
+        self.updatePlot()
 
-        window_s = max(1, int(self.plotWin.value()))
-        now = time.time()
-        series = self.hist.get(sid, [])
-        series = [(ts, val) for (ts, val) in series if (now - ts) <= window_s]
-        self.hist[sid] = series  # przycięte
-
-        self.ax.clear()
-        if series:
-            xs = [datetime.datetime.fromtimestamp(ts) for ts, _ in series]
-            ys = [val for _, val in series]
-            self.ax.plot(xs, ys, linewidth=1.5)
-
-            # format osi czasu: aktualne godziny HH:MM:SS + auto-lokatory
-            self.ax.xaxis.set_major_locator(mdates.AutoDateLocator())
-            self.ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S'))
-            self.fig.autofmt_xdate(rotation=20, ha='center')  # czytelniejsze daty
-
-            ymin, ymax = min(ys), max(ys)
-            if math.isfinite(ymin) and math.isfinite(ymax) and ymin != ymax:
-                pad = (ymax - ymin) * 0.1
-                self.ax.set_ylim(ymin - pad, ymax + pad)
-
-        self.ax.set_xlabel("time [HH:MM:SS]")
-        self.ax.set_ylabel("temp [°C]")
-        self.ax.grid(True, alpha=0.3)
-        # utrzymaj większy margines na dolnej krawędzi dla etykiet czasu
-        self.fig.subplots_adjust(bottom=0.22)
-        self.canvas.draw_idle()
+    def viewEnd(self, window_s: float) -> float:
+        """Prawa krawędź widoku logu wg suwaka (cały zakres pliku)."""
+        a = self.archive
+        lo = min(a.t_min + window_s, a.t_max)
+        end = lo + (a.t_max - lo) * self.viewPos.value() / self.viewPos.maximum()
+        self.lblView.setText(time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(end)))
+        return end
 
     # ---------- Selection & status ----------
 
     def on_select_row(self):
-        row = self.table.currentRow()
-        if row < 0: return
-        sid = self.table.item(row, 0).text()
-        name = self.table.item(row, 1).text()
-        pin  = self.table.item(row, 2).text()
+        sid = self.tableModel.key_at(self.table.currentIndex().row())
+        if sid is None or sid not in self.sensors: return
+        name = str(self.sensors[sid].get("name", ""))
+        pin  = str(self.sensors[sid].get("pin", ""))
         self.edId.setText(sid)
         if not self.edName.text():
             self.edName.setText(name)
@@ -567,18 +1109,42 @@ class PT100App(QWidget):
         idx = -1
         for i in range(self.plotSensor.count()):
             data = self.plotSensor.itemData(i) if hasattr(self.plotSensor, "itemData") else None
-            if (data is not None and str(data) == sid) or self.plotSensor.itemText(i).startswith(sid):
+            if (data is not None and str(data) == sid) or self.plotSensor.itemText(i).startswith(sid + " "):
                 idx = i; break
         if idx >= 0:
             self.plotSensor.setCurrentIndex(idx)
 
     def on_status(self, msg: str):
-        self.log.append(f"# {msg}")
+        self.log.append(f"# {msg}", ERROR if "ERR" in msg else STATUS)
+
+    def closeEvent(self, event):
+        # zamknij porty i dopisz do CSV to, co czeka w kolejce
+        self.restoreJson()
+        self.ports.close()
+        self.aggregator.cancel()
+        self.backend.close()
+        if self.share:
+            self.share.close()
+        self.csv.close()
+        self.log.stop_spill()
+        self.alarmLog.close()
+        if self.metricsServer:
+            self.metricsServer.close()
+        if self.metricsDump:
+            self.metricsDump.close()
+        super().closeEvent(event)
 
 # -------------------- main --------------------
 
 if __name__ == "__main__":
-    app = QApplication(sys.argv)
+    import argparse
+    ap = argparse.ArgumentParser(description="PT100 Manager")
+    ap.add_argument("--share", type=int, metavar="PORT", help="udostępnij strumień klientom (pt100_share)")
+    ap.add_argument("--remote", metavar="HOST:PORT", help="pracuj na strumieniu z ShareServer zamiast na porcie")
+    opts, qt_args = ap.parse_known_args()
+    SHARE_PORT = opts.share or SHARE_PORT
+    REMOTE_ADDRESS = opts.remote or REMOTE_ADDRESS
+    app = QApplication(sys.argv[:1] + qt_args)
     w = PT100App()
     w.resize(1200, 860)
     w.show()
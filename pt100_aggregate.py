@@ -0,0 +1,349 @@
+"""
+Agregacja zapisanych logów do przedziałów czasu (bez Qt).
+
+Logi CSV/.csv.gz/.ptb czytane są porcjami (pt100_logview, BinLogReader),
+a dla każdego czujnika i przedziału liczone są count/min/max/mean/last –
+dla kilku długości przedziału w jednym przebiegu. Zużycie pamięci nie
+zależy od długości logów: trzymane są tylko przedziały jeszcze otwarte.
+Rekordy spóźnione o więcej niż `late` sekund względem najnowszego są
+pomijane (licznik `late`). Wiersze przerw (source=gap, pusty temp_c)
+nie wchodzą do statystyk.
+
+Każdy plik daje wyniki częściowe posortowane po początku przedziału
+(pliki tymczasowe obok wyniku), scalane potem strumieniowo (heapq.merge),
+więc pliki mogą być przetwarzane równolegle w osobnych procesach (--jobs).
+Przedziały wyrównane są do czasu lokalnego (przesunięcie UTC z chwili
+uruchomienia – przy zmianie czasu granice doby przesuwają się o godzinę)
+albo do UTC (--utc).
+
+    python pt100_aggregate.py pt100_log.csv --bucket 1m --bucket 1h
+    python pt100_aggregate.py logs/*.csv.gz --bucket 15m --bucket 1d -j 4 -o kwartal
+
+Wynik: <prefix>_<przedział>.csv z kolumnami AGG_HEADER.
+"""
+import argparse
+import csv
+import heapq
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import NamedTuple
+
+import numpy as np
+
+from pt100_logview import LoadCancelled, iter_csv
+
+LATE_S = 60.0
+PTB_CHUNK_RECORDS = 1 << 20
+CANCEL_POLL_S = 0.2         # jak często aggregate() z procesami sprawdza cancel()
+DEFAULT_BUCKETS = "1m,1h"
+AGG_HEADER = ["bucket_iso", "bucket_ms", "id", "name", "count", "min", "max", "mean", "last"]
+_UNITS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+
+class AggResult(NamedTuple):
+    outputs: dict       # długość przedziału [s] -> ścieżka CSV
+    rows: int           # rekordy z temperaturą (bez przerw)
+    late: int           # rekordy pominięte jako spóźnione
+
+
+def parse_bucket(spec: str) -> int:
+    """"90", "30s", "15m", "1h", "1d" -> długość przedziału w sekundach."""
+    spec = spec.strip().lower()
+    unit = _UNITS.get(spec[-1:])
+    try:
+        sec = int(round(float(spec[:-1] if unit else spec) * (unit or 1)))
+    except ValueError:
+        raise ValueError(f"nieprawidłowy przedział: {spec!r}") from None
+    if sec <= 0:
+        raise ValueError(f"przedział musi być dodatni: {spec!r}")
+    return sec
+
+
+def parse_buckets(text: str) -> list:
+    """"1m, 1h" -> [60, 3600] (bez powtórzeń, rosnąco)."""
+    return sorted({parse_bucket(s) for s in text.replace(";", ",").split(",") if s.strip()})
+
+
+def bucket_label(sec: int) -> str:
+    for unit, n in (("d", 86400), ("h", 3600), ("m", 60)):
+        if sec % n == 0:
+            return f"{sec // n}{unit}"
+    return f"{sec}s"
+
+
+class Aggregator:
+    """
+    Agregaty jednego strumienia rekordów dla kilku długości przedziału.
+
+    add() przyjmuje porcję jako tablice NumPy, emit(bucket_s, rows) dostaje
+    zamknięte przedziały rosnąco po (początek, klucz); wiersz:
+    (start_ms, klucz, nazwa, count, min, max, suma, last_ms, last).
+    """
+
+    def __init__(self, buckets, emit, late_s: float = LATE_S, offset_s: int = 0):
+        self.buckets = sorted(int(b) for b in buckets)
+        self.emit = emit
+        self.late_ms = int(late_s * 1000)
+        self.offset_ms = int(offset_s * 1000)
+        self.names = {}             # klucz -> ostatnia niepusta nazwa
+        self.rows = 0
+        self.late = 0               # pominięte w najkrótszym przedziale (najostrzejszym)
+        self._open = {b: {} for b in self.buckets}  # (start_ms, klucz) -> [count, min, max, sum, last_ms, last]
+        self._closed_ms = None      # przedziały kończące się do tej chwili są już oddane
+        self._max_ms = None
+
+    def add(self, ids, ms, temps, names=None):
+        """ids – klucze czujników, ms – epoch [ms], temps – °C (NaN = przerwa), names – nazwy wierszy."""
+        ok = ~np.isnan(temps)
+        if not ok.all():
+            sel = np.flatnonzero(ok)
+            ids, ms, temps = ids[sel], ms[sel], temps[sel]
+            if names is not None:
+                names = [names[i] for i in sel.tolist()]
+        if not len(ms):
+            return
+        self.rows += len(ms)
+        keys, codes = np.unique(ids, return_inverse=True)
+        codes = codes.reshape(-1)
+        # spóźnienie liczone od najnowszego wcześniejszego rekordu (także w tej porcji),
+        # więc wynik nie zależy od granic porcji
+        run = np.maximum.accumulate(ms)
+        if self._max_ms is not None:
+            np.maximum(run, self._max_ms, out=run)
+        cutoff = run - self.late_ms
+        for b in self.buckets:
+            self._add(b, keys, codes, ms, temps, names, cutoff)
+        self._max_ms = int(run[-1])
+        self._flush(self._max_ms - self.late_ms)
+
+    def close(self):
+        """Oddaje wszystkie otwarte przedziały (koniec danych)."""
+        self._flush(None)
+
+    def _add(self, b, keys, codes, ms, temps, names, cutoff):
+        size = b * 1000
+        start = (ms + self.offset_ms) // size * size - self.offset_ms
+        rows = None
+        keep = start + size > cutoff       # przedział zamknięty przed nadejściem rekordu
+        if not keep.all():
+            if b == self.buckets[0]:
+                self.late += int(len(keep) - keep.sum())
+            rows = np.flatnonzero(keep)
+            if not len(rows):
+                return
+        c, s, m, t = (codes, start, ms, temps) if rows is None else (codes[rows], start[rows], ms[rows], temps[rows])
+        order = np.lexsort((m, s, c))       # czujnik, przedział, czas
+        c, s, m, t = c[order], s[order], m[order], t[order]
+        edge = np.flatnonzero((c[1:] != c[:-1]) | (s[1:] != s[:-1])) + 1
+        first = np.concatenate(([0], edge))
+        last = np.concatenate((edge, [len(c)])) - 1
+        groups = zip(c[first].tolist(), s[first].tolist(), (last - first + 1).tolist(),
+                     np.minimum.reduceat(t, first).tolist(), np.maximum.reduceat(t, first).tolist(),
+                     np.add.reduceat(t, first).tolist(), m[last].tolist(), t[last].tolist(),
+                     order[last].tolist())
+        acc = self._open[b]
+        for code, st, n, lo, hi, total, last_ms, last_t, row in groups:
+            key = str(keys[code])
+            if names is not None:
+                name = names[row if rows is None else int(rows[row])]
+                if name:
+                    self.names[key] = name
+            a = acc.get((st, key))
+            if a is None:
+                acc[(st, key)] = [n, lo, hi, total, last_ms, last_t]
+                continue
+            a[0] += n
+            a[1] = min(a[1], lo)
+            a[2] = max(a[2], hi)
+            a[3] += total
+            if last_ms >= a[4]:
+                a[4], a[5] = last_ms, last_t
+
+    def _flush(self, watermark_ms):
+        if watermark_ms is not None:
+            if self._closed_ms is not None and watermark_ms <= self._closed_ms:
+                return
+            self._closed_ms = watermark_ms
+        for b in self.buckets:
+            size = b * 1000
+            acc = self._open[b]
+            done = sorted(k for k in acc if watermark_ms is None or k[0] + size <= watermark_ms)
+            if done:
+                self.emit(b, [(st, key, self.names.get(key, ""), *acc.pop((st, key))) for st, key in done])
+
+
+def _iter_ptb(path: str, agg: Aggregator, progress=None, cancel=None):
+    """Porcje pliku .ptb (memmap) jako (ids, ms, temps) dla Aggregator.add()."""
+    from pt100_binlog import BinLogReader
+    r = BinLogReader(path)
+    agg.names.update({k: v for k, v in r.sensors().items() if v})
+    n = len(r.records)
+    for lo in range(0, n, PTB_CHUNK_RECORDS):
+        if cancel and cancel():
+            raise LoadCancelled()
+        recs = r.records[lo:lo + PTB_CHUNK_RECORDS]
+        codes, inv = np.unique(recs["dev"].astype(np.int32) * 256 + recs["sid"], return_inverse=True)
+        keys = np.array([r.key(int(c) // 256, int(c) % 256) for c in codes])
+        yield keys[inv.reshape(-1)], recs["ts_ms"].astype(np.int64), recs["temp"].astype(np.float64)
+        if progress:
+            progress(min(lo + PTB_CHUNK_RECORDS, n) / n)
+
+
+def aggregate_file(path: str, buckets, part_prefix: str, late_s: float = LATE_S, offset_s: int = 0,
+                   progress=None, cancel=None):
+    """
+    Agreguje jeden plik logu do plików częściowych <part_prefix>_<s>.part
+    (posortowanych po przedziale). Zwraca ({przedział: ścieżka}, wierszy, spóźnionych).
+    """
+    parts = {b: f"{part_prefix}_{b}.part" for b in buckets}
+    files = {b: open(p, "w", newline="") for b, p in parts.items()}
+    writers = {b: csv.writer(f) for b, f in files.items()}
+    try:
+        agg = Aggregator(buckets, lambda b, rows: writers[b].writerows(rows), late_s, offset_s)
+        if path.lower().endswith(".ptb"):
+            for ids, ms, temps in _iter_ptb(path, agg, progress, cancel):
+                agg.add(ids, ms, temps)
+        else:
+            for ids, ms, temps, names in iter_csv(path, progress, cancel):
+                agg.add(ids, ms, temps, names)
+        agg.close()
+    finally:
+        for f in files.values():
+            f.close()
+    return parts, agg.rows, agg.late
+
+
+def _aggregate_file_job(path, buckets, part_prefix, late_s, offset_s, cancel_flag):
+    # w procesie roboczym: przerwanie sygnalizuje plik-flaga (sprawdzany co porcję)
+    return aggregate_file(path, buckets, part_prefix, late_s, offset_s,
+                          cancel=lambda: os.path.exists(cancel_flag))
+
+
+def _read_part(path: str):
+    with open(path, newline="") as f:
+        for r in csv.reader(f):
+            yield (int(r[0]), r[1], r[2], int(r[3]), float(r[4]), float(r[5]), float(r[6]),
+                   int(r[7]), float(r[8]))
+
+
+def merge_parts(parts, out_path: str):
+    """Scala posortowane wyniki częściowe (ten sam przedział z kilku plików) w plik wynikowy."""
+    iso = (None, "")
+
+    def write(row):
+        nonlocal iso
+        st, key, name, n, lo, hi, total, _, last = row
+        sec = st // 1000
+        if iso[0] != sec:
+            iso = (sec, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec)))
+        w.writerow([iso[1], st, key, name, n, lo, hi, round(total / n, 4), last])
+
+    with open(out_path, "w", newline="") as f:
+        w = csv.writer(f)
+        w.writerow(AGG_HEADER)
+        cur = None
+        for row in heapq.merge(*[_read_part(p) for p in parts], key=lambda r: (r[0], r[1])):
+            if cur is None or cur[0] != row[0] or cur[1] != row[1]:
+                if cur is not None:
+                    write(cur)
+                cur = list(row)
+                continue
+            # ten sam czujnik i przedział w kilku plikach (np. granica rotacji)
+            cur[2] = row[2] or cur[2]
+            cur[3] += row[3]
+            cur[4] = min(cur[4], row[4])
+            cur[5] = max(cur[5], row[5])
+            cur[6] += row[6]
+            if row[7] >= cur[7]:
+                cur[7], cur[8] = row[7], row[8]
+        if cur is not None:
+            write(cur)
+
+
+def aggregate(paths, buckets, prefix: str, jobs: int = 1, late_s: float = LATE_S, utc: bool = False,
+              progress=None, cancel=None) -> AggResult:
+    """
+    Agreguje logi `paths` do <prefix>_<przedział>.csv dla każdej długości
+    z `buckets` [s]. jobs > 1 – pliki w osobnych procesach. progress(frac)
+    i cancel() jak w pt100_logview.load_log.
+    """
+    buckets = sorted(set(int(b) for b in buckets))
+    offset_s = 0 if utc else time.localtime().tm_gmtoff
+    out_dir = os.path.dirname(os.path.abspath(prefix))
+    results = []
+    with tempfile.TemporaryDirectory(prefix=".pt100_agg_", dir=out_dir) as tmp:
+        calls = [(p, buckets, os.path.join(tmp, str(i)), late_s, offset_s) for i, p in enumerate(paths)]
+        if jobs > 1 and len(paths) > 1:
+            # spawn: bezpieczne także z procesu z wątkami (GUI)
+            ctx = multiprocessing.get_context("spawn")
+            flag = os.path.join(tmp, "cancel")
+            with ProcessPoolExecutor(min(jobs, len(paths)), mp_context=ctx) as ex:
+                futures = [ex.submit(_aggregate_file_job, *c, flag) for c in calls]
+                pending, n_done = set(futures), 0
+                while pending:
+                    done, pending = wait(pending, timeout=CANCEL_POLL_S, return_when=FIRST_COMPLETED)
+                    if cancel and cancel():
+                        # pracujące procesy kończą po bieżącej porcji, czekające nie startują
+                        open(flag, "w").close()
+                        for fut in pending:
+                            fut.cancel()
+                        raise LoadCancelled()
+                    for fut in done:
+                        fut.result()
+                        n_done += 1
+                        if progress:
+                            progress(n_done / len(calls))
+                results = [f.result() for f in futures]
+        else:
+            for i, c in enumerate(calls):
+                step = (lambda f, i=i: progress((i + f) / len(calls))) if progress else None
+                results.append(aggregate_file(*c, progress=step, cancel=cancel))
+        outputs = {}
+        for b in buckets:
+            outputs[b] = f"{prefix}_{bucket_label(b)}.csv"
+            merge_parts([r[0][b] for r in results], outputs[b])
+    return AggResult(outputs, sum(r[1] for r in results), sum(r[2] for r in results))
+
+
+def default_prefix(path: str) -> str:
+    """pt100_log.csv.gz -> pt100_log_agg"""
+    base = os.path.basename(path)
+    for ext in (".gz", ".csv", ".ptb"):
+        if base.lower().endswith(ext):
+            base = base[:-len(ext)]
+    return os.path.join(os.path.dirname(path), base + "_agg")
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="PT100 – agregacja logów do przedziałów czasu")
+    p.add_argument("logs", nargs="+", help="pliki CSV / .csv.gz / .ptb")
+    p.add_argument("-b", "--bucket", action="append", default=[], metavar="LEN",
+                   help=f"długość przedziału, np. 30s, 1m, 15m, 1h, 1d (można powtarzać; domyślnie {DEFAULT_BUCKETS})")
+    p.add_argument("-o", "--out", metavar="PREFIX",
+                   help="prefiks plików wynikowych (domyślnie <pierwszy log>_agg)")
+    p.add_argument("-j", "--jobs", type=int, default=1, metavar="N",
+                   help="liczba procesów (pliki równolegle; 0 = liczba rdzeni)")
+    p.add_argument("--late", type=float, default=LATE_S, metavar="S",
+                   help="ile sekund czekać na rekordy spoza kolejności")
+    p.add_argument("--utc", action="store_true", help="przedziały wyrównane do UTC zamiast czasu lokalnego")
+    args = p.parse_args(argv)
+    try:
+        buckets = parse_buckets(",".join(args.bucket) or DEFAULT_BUCKETS)
+    except ValueError as e:
+        p.error(f"--bucket: {e}")
+    jobs = args.jobs or os.cpu_count() or 1
+    t0 = time.perf_counter()
+    res = aggregate(args.logs, buckets, args.out or default_prefix(args.logs[0]), jobs, args.late, args.utc)
+    print(f"{res.rows} records from {len(args.logs)} file(s) in {time.perf_counter() - t0:.1f} s"
+          + (f", {res.late} late records skipped" if res.late else ""))
+    for b, path in res.outputs.items():
+        print(f"  {bucket_label(b):>4} -> {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,433 @@
+"""
+Benchmark całego toru danych na symulatorze (pt100_sim).
+
+Uruchamia symulatory (osobne procesy, po jednym na płytkę) z --stamp,
+podłącza do nich DeviceManager i mierzy:
+  - linie/s i pomiary/s przyjęte przez aplikację,
+  - zgubione pomiary (wysłane przez symulator, a nieodebrane),
+  - opóźnienie od wysłania przez urządzenie do: odbiorcy paczki (historia
+    albo tabela w GUI), zapisu wiersza CSV (bez --gui) i klatki wykresu (--gui),
+  - CPU każdego wątku (czytnik portu, scalanie, zapis CSV, wątek główny)
+    i RSS procesu po kolejnych etapach.
+
+    python pt100_bench.py --boards 2 --sensors 8 --interval 100 --duration 20
+    python pt100_bench.py --baud 0 --max-sensors 64 --sensors 64 --interval 10 --csv /tmp/b.csv
+    python pt100_bench.py --gui --csv /tmp/b.csv --json wyniki.json
+    python pt100_bench.py --frames --sensors 6 --interval 20
+    python pt100_bench.py --startup 5 --max-startup 2.0
+
+Z --frames auto-raporty idą jako ramki binarne (MODE fmt=bin) – ramki nie
+niosą znacznika "e", więc opóźnienia nie są wtedy mierzone.
+
+--startup N zamiast toru danych mierzy start GUI (N procesów, mediana):
+od uruchomienia interpretera do importu PT100_App, konstruktora okna,
+pierwszego odrysowania okna (okno widoczne), gotowego
+wykresu i pierwszej listy portów. --max-startup S kończy się kodem 1,
+gdy okno pojawia się później niż po S sekundach (strażnik regresji).
+
+Wyniki z --json nadają się do porównywania między wersjami kodu.
+"""
+import argparse
+import json
+import os
+import re
+import resource
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+from pt100_csvlog import CsvLogger
+from pt100_history import HistoryStore
+from pt100_protocol import Sample
+from pt100_serial import DeviceManager
+
+_STAMP = re.compile(r'"e":([0-9.]+)')
+DRAIN_S = 0.5       # po zatrzymaniu symulatorów: czas na dojście rekordów w drodze
+
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 2**20
+    except OSError:
+        # maks. RSS (Linux: kB, macOS: B)
+        r = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return r / 2**20 if sys.platform == "darwin" else r / 1024
+
+
+def thread_cpu() -> dict:
+    """Czas CPU [s] wątków, zgrupowany po funkcji wątku (np. _reader_loop)."""
+    out = {}
+    for t in threading.enumerate():
+        m = re.search(r"\((\w+)\)", t.name)
+        group = m.group(1) if m else t.name
+        try:
+            cpu = time.clock_gettime(time.pthread_getcpuclockid(t.ident))
+        except (AttributeError, OSError, TypeError):
+            continue
+        out[group] = out.get(group, 0.0) + cpu
+    return out
+
+
+def percentiles(values, ps=(50, 95, 99)) -> dict:
+    if not values:
+        out = {f"p{p}": None for p in ps}
+        out["max"] = None
+        return out
+    v = sorted(values)
+    out = {f"p{p}": v[min(len(v) - 1, int(len(v) * p / 100))] * 1000 for p in ps}
+    out["max"] = v[-1] * 1000
+    return out
+
+
+def start_sims(a) -> list:
+    sims = []
+    for _ in range(a.boards):
+        cmd = [sys.executable, os.path.join(os.path.dirname(os.path.abspath(__file__)), "pt100_sim.py"),
+               "--stamp", "--sensors", str(a.sensors), "--max-sensors", str(max(a.max_sensors, a.sensors)),
+               "--interval", "0", "--baud", str(a.baud), "--adc-ms", str(a.adc_ms),
+               "--drop", str(a.drop), "--corrupt", str(a.corrupt)]
+        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, text=True)
+        path = p.stdout.readline().split("pty:", 1)[1].strip()
+        sims.append((p, path))
+    return sims
+
+
+def start_reports(a, send_line):
+    """
+    Auto-raporty włączane dopiero po otwarciu portów – wszystko, co
+    symulator wyśle, może dotrzeć do aplikacji (open() czyści bufor wejścia).
+    """
+    send_line("LIST")
+    if a.frames:
+        send_line("MODE fmt=bin")
+    for sid in range(a.sensors):
+        send_line(f"SET id={sid} interval={a.interval}")
+
+
+def stop_sims(sims) -> dict:
+    total = {}
+    for p, _ in sims:
+        p.terminate()
+        out, _ = p.communicate(timeout=10)
+        stats = json.loads(out.strip().splitlines()[-1])
+        for k, v in stats.items():
+            total[k] = total.get(k, 0) + v
+    return total
+
+
+class Probe:
+    """Zbiera opóźnienia; wołany z wątku głównego po obsłużeniu paczki."""
+
+    def __init__(self):
+        self.lines = 0
+        self.samples = 0
+        self.ingest = []            # wysłanie -> odbiorca paczki
+        self.plot = []              # wysłanie -> klatka wykresu
+        self.csv_stamps = []        # czasy "e" w kolejności dopisywania do CSV
+        self._since_frame = []
+
+    def batch(self, records, csv_on: bool):
+        now = time.time()
+        self.lines += len(records)
+        for rec in records:
+            if not isinstance(rec, Sample):
+                continue
+            self.samples += 1
+            m = _STAMP.search(rec.raw)
+            if m:
+                e = float(m.group(1))
+                self.ingest.append(now - e)
+                self._since_frame.append(e)
+                if csv_on:
+                    self.csv_stamps.append(e)
+
+    def frame(self):
+        if self._since_frame:
+            now = time.time()
+            self.plot.append(now - min(self._since_frame))
+            self._since_frame = []
+
+
+class CsvWatch(threading.Thread):
+    """Odpytuje CsvLogger.rows_written i przypisuje wierszom czas zapisu."""
+
+    def __init__(self, logger):
+        super().__init__(name="bench_csv_watch", daemon=True)
+        self.logger = logger
+        self.marks = []             # (czas, rows_written)
+        self.stop = False
+
+    def run(self):
+        last = -1
+        while not self.stop:
+            n = self.logger.rows_written
+            if n != last:
+                self.marks.append((time.time(), n))
+                last = n
+            time.sleep(0.005)
+
+    def latencies(self, stamps) -> list:
+        out, j = [], 0
+        for i, e in enumerate(stamps):
+            while j < len(self.marks) and self.marks[j][1] <= i:
+                j += 1
+            if j == len(self.marks):
+                break
+            out.append(self.marks[j][0] - e)
+        return out
+
+
+def run_headless(a, sims, probe, csv, on_end):
+    hist = HistoryStore()
+    inbox = []
+    cond = threading.Condition()
+
+    def on_batch(batch):
+        with cond:
+            inbox.append(batch)
+            cond.notify()
+
+    dm = DeviceManager(on_batch=on_batch, on_status=lambda m: None)
+    for _, path in sims:
+        dm.open(path, a.baud or 115200)
+    start_reports(a, dm.send_line)
+    t_end = time.monotonic() + a.duration
+    t_drain = None
+    while t_drain is None or time.monotonic() < t_drain:
+        if t_drain is None and time.monotonic() >= t_end:
+            on_end()
+            t_drain = time.monotonic() + DRAIN_S
+        with cond:
+            cond.wait(0.02)
+            batches, inbox[:] = list(inbox), []
+        for batch in batches:
+            for rec in batch:
+                if isinstance(rec, Sample):
+                    try:
+                        hist.append(rec.key, rec.ts, float(rec.t))
+                    except (TypeError, ValueError):
+                        pass
+                    if csv:
+                        csv.log_temp(rec.key, rec.name, rec.t, source=rec.source, ts=rec.ts)
+            probe.batch(batch, csv is not None)
+    return dm, hist.nbytes()
+
+
+def run_gui(a, sims, probe, csv_path, on_end):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import PT100_App as app_mod
+    qapp = app_mod.QApplication.instance() or app_mod.QApplication([])
+    w = app_mod.PT100App()
+    w.resize(1200, 860)
+    w.show()
+    if csv_path:
+        w.csv.set_path(csv_path)
+        w.chkAutoCsv.setChecked(True)
+    frame_ms = []
+
+    on_records, update_plot = w.on_records, w.updatePlot
+
+    def timed_records(records):
+        on_records(records)
+        probe.batch(records, bool(csv_path))
+
+    def timed_plot(*args):
+        t = time.perf_counter()
+        update_plot()
+        frame_ms.append((time.perf_counter() - t) * 1000)
+        probe.frame()
+
+    w.backend.records_received.disconnect(w.on_records)
+    w.backend.records_received.connect(timed_records)
+    w.plotTimer.timeout.disconnect(w.updatePlot)
+    w.plotTimer.timeout.connect(timed_plot)
+    for _, path in sims:
+        w.backend.open(path, a.baud or 115200)
+    start_reports(a, w.backend.send_line)
+    app_mod.QTimer.singleShot(int(a.duration * 1000), on_end)
+    app_mod.QTimer.singleShot(int((a.duration + DRAIN_S) * 1000), qapp.quit)
+    qapp.exec()
+    return w, frame_ms
+
+
+STARTUP_STAGES = ("import", "init", "window", "plot", "ports")
+
+
+def startup_child(t0: float):
+    """Proces potomny --startup: ms od uruchomienia do kolejnych etapów, JSON na stdout."""
+    marks = {}
+
+    def mark(name):
+        marks.setdefault(name, round((time.time() - t0) * 1000, 1))
+
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    import PT100_App as app_mod
+    mark("import")
+    qapp = app_mod.QApplication([])
+    w = app_mod.PT100App()
+    w.resize(1200, 860)
+    mark("init")
+    w.ports.changed.connect(lambda _: mark("ports"))
+    if app_mod.USING_PYSIDE:
+        from PySide6.QtCore import QEvent
+    else:
+        from PyQt6.QtCore import QEvent
+
+    class FirstPaint(app_mod.QObject):
+        def eventFilter(self, obj, ev):
+            if ev.type() == QEvent.Type.Paint:
+                mark("window")
+            return False
+
+    paint = FirstPaint()
+    w.installEventFilter(paint)
+    w.show()
+
+    def poll():
+        if w.plot is not None:
+            mark("plot")
+        if len(marks) == len(STARTUP_STAGES):
+            qapp.quit()
+
+    timer = app_mod.QTimer()
+    timer.timeout.connect(poll)
+    timer.start(5)
+    app_mod.QTimer.singleShot(30000, qapp.quit)
+    qapp.exec()
+    w.close()
+    print(json.dumps(marks), flush=True)
+
+
+def run_startup(a) -> int:
+    runs = []
+    for _ in range(a.startup):
+        t0 = time.time()
+        out = subprocess.run([sys.executable, os.path.abspath(__file__), "--startup-child", repr(t0)],
+                             capture_output=True, text=True, timeout=120).stdout
+        line = next((l for l in reversed(out.splitlines()) if l.startswith("{")), None)
+        if line is None:
+            print("startup run failed", file=sys.stderr)
+            return 1
+        runs.append(json.loads(line))
+    med = {k: statistics.median(r[k] for r in runs if k in r) for k in STARTUP_STAGES
+           if any(k in r for r in runs)}
+    print(f"startup, median of {len(runs)} runs [ms from launch]: "
+          + ", ".join(f"{k} {v:.0f}" for k, v in med.items()))
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump({"startup_ms": med, "runs": runs}, f, indent=2)
+    if a.max_startup and med.get("window", float("inf")) > a.max_startup * 1000:
+        print(f"FAIL: window after {med.get('window', float('inf')) / 1000:.2f} s "
+              f"> {a.max_startup:g} s", file=sys.stderr)
+        return 1
+    return 0
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="PT100 – benchmark toru danych na symulatorze")
+    p.add_argument("--boards", type=int, default=1)
+    p.add_argument("--sensors", type=int, default=8)
+    p.add_argument("--max-sensors", type=int, default=8)
+    p.add_argument("--interval", type=int, default=100, metavar="MS")
+    p.add_argument("--baud", type=int, default=9600, help="0 = łącze bez limitu")
+    p.add_argument("--frames", action="store_true", help="auto-raporty jako ramki binarne (MODE fmt=bin)")
+    p.add_argument("--adc-ms", type=float, default=7.0)
+    p.add_argument("--drop", type=float, default=0.0)
+    p.add_argument("--corrupt", type=float, default=0.0)
+    p.add_argument("--duration", type=float, default=10.0, metavar="S")
+    p.add_argument("--csv", help="zapis do CSV w trakcie pomiaru")
+    p.add_argument("--gui", action="store_true", help="pełne GUI (offscreen) zamiast samej historii")
+    p.add_argument("--json", help="zapisz wyniki do pliku JSON")
+    p.add_argument("--startup", type=int, default=0, metavar="N",
+                   help="zmierz czas startu GUI (N uruchomień) zamiast toru danych")
+    p.add_argument("--max-startup", type=float, default=None, metavar="S",
+                   help="z --startup: błąd, gdy okno pojawia się później niż po S s")
+    p.add_argument("--startup-child", type=float, help=argparse.SUPPRESS)
+    a = p.parse_args(argv)
+    if a.startup_child is not None:
+        startup_child(a.startup_child)
+        return 0
+    if a.startup:
+        return run_startup(a)
+
+    rss = {"start": rss_mb()}
+    probe = Probe()
+    csv = watch = None
+    sims = start_sims(a)
+    cpu0 = thread_cpu()
+    t0 = time.monotonic()
+    end = {}
+
+    def on_end():
+        # koniec pomiaru: CPU/RSS przed zamknięciem wątków, potem zatrzymanie symulatorów
+        end["wall"] = time.monotonic() - t0
+        end["cpu"] = thread_cpu()
+        rss["running"] = rss_mb()
+        end["sim"] = stop_sims(sims)
+
+    frame_ms = []
+    if a.gui:
+        w, frame_ms = run_gui(a, sims, probe, a.csv, on_end)
+        csv, dm, hist_bytes = w.csv, w.backend.devices, w.hist.nbytes()
+    else:
+        if a.csv:
+            csv = CsvLogger()
+            csv.set_path(a.csv)
+            watch = CsvWatch(csv)
+            watch.start()
+        dm, hist_bytes = run_headless(a, sims, probe, csv, on_end)
+    dm.close()
+    if csv:
+        csv.close()
+    if watch:
+        watch.stop = True
+    rss["end"] = rss_mb()
+    wall, cpu1, sim_stats = end["wall"], end["cpu"], end["sim"]
+
+    cpu = {k: round((v - cpu0.get(k, 0.0)) / wall * 100, 1) for k, v in cpu1.items() if v - cpu0.get(k, 0.0) > 0}
+    sent = sim_stats.get("samples_out", 0)
+    res = {
+        "config": vars(a),
+        "wall_s": round(wall, 2),
+        "lines_per_s": round(probe.lines / wall, 1),
+        "samples_per_s": round(probe.samples / wall, 1),     # wliczone też dochodzące po końcu
+        "samples_sent": sent,
+        "samples_received": probe.samples,
+        "samples_lost": max(0, sent - probe.samples),
+        "sim": sim_stats,
+        "latency_ms": {"table" if a.gui else "ingest": percentiles(probe.ingest)},
+        "plot_frame_ms": percentiles([f / 1000 for f in frame_ms]) if frame_ms else None,
+        "cpu_pct": cpu,
+        "rss_mb": {k: round(v, 1) for k, v in rss.items()},
+        "history_mb": round(hist_bytes / 2**20, 2),
+    }
+    if a.gui:
+        res["latency_ms"]["plot"] = percentiles(probe.plot)
+    if watch:
+        res["latency_ms"]["csv"] = percentiles(watch.latencies(probe.csv_stamps))
+
+    print(f"{probe.lines} lines, {probe.samples} samples in {wall:.1f} s: "
+          f"{res['lines_per_s']} lines/s, {res['samples_per_s']} samples/s")
+    print(f"sent {sent}, received {probe.samples}, lost {res['samples_lost']} "
+          f"(sim dropped {sim_stats.get('dropped', 0)}, corrupted {sim_stats.get('corrupted', 0)}, "
+          f"overflow {sim_stats.get('overflow', 0)})")
+    for name, lat in res["latency_ms"].items():
+        if lat["p50"] is not None:
+            print(f"latency {name:7s} p50 {lat['p50']:8.2f}  p95 {lat['p95']:8.2f}  "
+                  f"p99 {lat['p99']:8.2f}  max {lat['max']:8.2f} ms")
+    if res["plot_frame_ms"]:
+        f = res["plot_frame_ms"]
+        print(f"plot frame      p50 {f['p50']:8.2f}  p95 {f['p95']:8.2f}  max {f['max']:8.2f} ms")
+    print("cpu %: " + ", ".join(f"{k} {v}" for k, v in sorted(cpu.items(), key=lambda kv: -kv[1])))
+    print("rss MB: " + ", ".join(f"{k} {v:.1f}" for k, v in rss.items()) + f", history {res['history_mb']} MB")
+    if a.json:
+        with open(a.json, "w", encoding="utf-8") as f:
+            json.dump(res, f, indent=2)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
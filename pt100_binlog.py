@@ -0,0 +1,409 @@
+"""
+Binarny log pomiarów (.ptb) z indeksem czasu – alternatywa dla CSV.
+
+Pliki:
+  <plik>.ptb        nagłówek + rekordy o stałej długości (16 B, RECORD_DTYPE),
+  <plik>.ptb.idx    indeks bloków po BLOCK_RECORDS rekordów: t_min, t_max,
+                    flaga posortowania i maska czujników (256 bitów),
+  <plik>.ptb.names  słowniki (JSON lines): kod urządzenia -> port,
+                    (urządzenie, id) -> nazwa czujnika.
+Wszystkie trzy pliki są tylko dopisywane. Indeks obejmuje pełne bloki,
+ogon pliku czytelnik skanuje sam.
+
+BinLogReader mapuje plik (np.memmap) i dla przedziału czasu zwraca widok
+NumPy bez kopiowania, jeśli rekordy są uporządkowane w czasie.
+
+    python pt100_binlog.py convert pt100_log.csv [...] -o pomiary.ptb
+    python pt100_binlog.py info pomiary.ptb
+"""
+import argparse
+import csv
+import gzip
+import json
+import os
+import queue
+import sys
+import threading
+import time
+
+import numpy as np
+
+from pt100_protocol import sensor_key, split_key, ts_ms
+
+MAGIC = b"PT100BIN"
+VERSION = 1
+HEADER_SIZE = 64
+BLOCK_RECORDS = 4096
+FLUSH_INTERVAL_S = 1.0
+CONVERT_BATCH_ROWS = 16384  # wierszy CSV na porcję przy konwersji
+
+RECORD_DTYPE = np.dtype([
+    ("ts_ms", "<i8"),       # epoch [ms]
+    ("temp", "<f4"),        # °C (NaN = brak wartości)
+    ("dev", "u1"),          # kod urządzenia (słownik .names)
+    ("sid", "u1"),          # id czujnika z firmware (uint8_t)
+    ("src", "u1"),          # kod źródła (SOURCES)
+    ("flags", "u1"),
+])
+INDEX_DTYPE = np.dtype([
+    ("t_min", "<i8"),
+    ("t_max", "<i8"),
+    ("count", "<u4"),
+    ("sorted", "u1"),
+    ("_pad", "u1", 3),
+    ("mask", "<u8", 4),     # bit (dev*31 + sid) % 256 – „może zawierać czujnik”
+])
+
+SOURCES = ["", "read", "interval", "list_export", "gap"]   # tylko dopisywać – kody są w plikach
+_SOURCE_CODE = {s: i for i, s in enumerate(SOURCES)}
+
+
+def _mask_bit(dev, sid):
+    return (np.asarray(dev, dtype=np.int64) * 31 + np.asarray(sid, dtype=np.int64)) % 256
+
+
+def _block_index(recs) -> np.ndarray:
+    e = np.zeros(1, dtype=INDEX_DTYPE)
+    ts = recs["ts_ms"]
+    e["t_min"] = ts.min()
+    e["t_max"] = ts.max()
+    e["count"] = len(recs)
+    e["sorted"] = bool(np.all(ts[1:] >= ts[:-1]))
+    bits = np.unique(_mask_bit(recs["dev"], recs["sid"]))
+    mask = np.zeros(4, dtype=np.uint64)
+    for b in bits:
+        mask[b // 64] |= np.uint64(1) << np.uint64(b % 64)
+    e["mask"][0] = mask
+    return e
+
+
+def _write_header(f):
+    hdr = MAGIC + np.array([VERSION, RECORD_DTYPE.itemsize, BLOCK_RECORDS], dtype="<u4").tobytes()
+    f.write(hdr.ljust(HEADER_SIZE, b"\0"))
+
+
+def _check_header(buf: bytes, path: str):
+    if buf[:8] != MAGIC:
+        raise ValueError(f"{path}: not a PT100 binary log")
+    version, recsize, block = np.frombuffer(buf[8:20], dtype="<u4")
+    if version != VERSION or recsize != RECORD_DTYPE.itemsize or block != BLOCK_RECORDS:
+        raise ValueError(f"{path}: unsupported format (v{version}, {recsize} B, block {block})")
+
+
+class _Names:
+    """Słowniki urządzeń i nazw czujników (plik JSON lines, tylko dopisywany)."""
+
+    def __init__(self, path: str):
+        self.path = path
+        self.devices = []       # kod -> port
+        self.names = {}         # (dev, sid) -> nazwa
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        obj = json.loads(line)
+                    except ValueError:
+                        continue    # urwana ostatnia linia
+                    if "dev" in obj:
+                        self.devices.append(obj["dev"])
+                    elif "sensor" in obj:
+                        self.names[tuple(obj["sensor"])] = obj.get("name", "")
+
+    def key(self, dev: int, sid: int) -> str:
+        port = self.devices[dev] if dev < len(self.devices) else str(dev)
+        return sensor_key(port, sid)
+
+
+class BinLogWriter:
+    """
+    Zapis do .ptb. Interfejs jak CsvLogger (set_path, is_ready, log_temp,
+    close), rekordy zapisuje wątek tła co FLUSH_INTERVAL_S. Z
+    set_path(..., background=False) nie ma wątku ani kolejki – porcje
+    zapisuje write_batch() w wątku wołającym (konwersja dużych plików
+    w stałej pamięci). Czujniki o id spoza 0..255 są pomijane
+    (licznik `skipped`).
+    """
+
+    def __init__(self, flush_interval: float = FLUSH_INTERVAL_S):
+        self.path = None
+        self.flush_interval = flush_interval
+        self.rows_written = 0
+        self.skipped = 0
+        self.last_error = None
+        self._queue = None
+        self._thread = None
+        self._data = None
+
+    def set_path(self, path: str, background: bool = True):
+        self.close()
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._data = open(path, "ab")
+        if self._data.tell() == 0:
+            _write_header(self._data)
+            self._data.flush()
+        self._idx = open(path + ".idx", "ab")
+        self._names_file = open(path + ".names", "a", encoding="utf-8")
+        self._names = _Names(path + ".names")
+        self._dev_code = {p: i for i, p in enumerate(self._names.devices)}
+        # rekordy z niepełnego ostatniego bloku – do zbudowania jego wpisu w indeksie
+        n = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        indexed = os.path.getsize(path + ".idx") // INDEX_DTYPE.itemsize * BLOCK_RECORDS
+        tail = n - indexed
+        if tail > 0:
+            with open(path, "rb") as f:
+                f.seek(HEADER_SIZE + indexed * RECORD_DTYPE.itemsize)
+                self._block = list(np.frombuffer(f.read(tail * RECORD_DTYPE.itemsize), dtype=RECORD_DTYPE))
+        else:
+            self._block = []
+        if not background:
+            return
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer_loop, args=(self._queue,), daemon=True)
+        self._thread.start()
+
+    def is_ready(self) -> bool:
+        return self._queue is not None
+
+    def log_temp(self, sid, name, temp, source="interval", ts=None):
+        if not self.is_ready():
+            return
+        if ts is None:
+            ts = time.time()
+        self._queue.put((ts, sid, name, temp, source))
+
+    def write_batch(self, items):
+        """Koduje i zapisuje porcję krotek (ts, klucz, nazwa, temp, źródło) od razu (background=False)."""
+        rows = [rec for rec in map(self._encode, items) if rec is not None]
+        if rows:
+            self._write(rows)
+
+    def close(self):
+        q, t = self._queue, self._thread
+        self._queue = self._thread = None
+        if q is not None:
+            q.put(None)
+            t.join()
+        if self._data is None:
+            return
+        for f in (self._data, self._idx, self._names_file):
+            try: f.close()
+            except: pass
+        self._data = None
+
+    # ---------- wątek zapisu ----------
+
+    def _encode(self, item):
+        ts, key, name, temp, source = item
+        port, sid = split_key(key)
+        if not sid.isdigit() or int(sid) > 255:
+            self.skipped += 1
+            return None
+        sid = int(sid)
+        dev = self._dev_code.get(port)
+        if dev is None:
+            if len(self._dev_code) >= 256:
+                self.skipped += 1
+                return None
+            dev = self._dev_code[port] = len(self._dev_code)
+            self._names_file.write(json.dumps({"dev": port}) + "\n")
+        known = self._names.names.get((dev, sid))
+        if known is None or (name and known != name):
+            self._names.names[(dev, sid)] = name or ""
+            self._names_file.write(json.dumps({"sensor": [dev, sid], "name": name or ""}) + "\n")
+        try:
+            t = float(temp)
+        except (TypeError, ValueError):
+            t = float("nan")
+        return (ts_ms(ts), t, dev, sid, _SOURCE_CODE.get(source, 0), 0)
+
+    def _write(self, rows):
+        # słownik przed danymi – czytelnik nigdy nie zobaczy nieznanego kodu
+        self._names_file.flush()
+        recs = np.array(rows, dtype=RECORD_DTYPE)
+        self._data.write(recs.tobytes())
+        self._data.flush()
+        self.rows_written += len(recs)
+        self._block.extend(recs)
+        while len(self._block) >= BLOCK_RECORDS:
+            blk = np.array(self._block[:BLOCK_RECORDS], dtype=RECORD_DTYPE)
+            del self._block[:BLOCK_RECORDS]
+            self._idx.write(_block_index(blk).tobytes())
+        self._idx.flush()
+
+    def _writer_loop(self, q):
+        stop = False
+        while not stop:
+            rows = []
+            deadline = time.monotonic() + self.flush_interval
+            while True:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    item = q.get(timeout=timeout)
+                except queue.Empty:
+                    break
+                if item is None:
+                    stop = True
+                    break
+                rec = self._encode(item)
+                if rec is not None:
+                    rows.append(rec)
+            if rows:
+                try:
+                    self._write(rows)
+                except Exception as e:
+                    self.last_error = str(e)
+
+
+class BinLogReader:
+    def __init__(self, path: str):
+        self.path = path
+        with open(path, "rb") as f:
+            _check_header(f.read(HEADER_SIZE), path)
+        n = (os.path.getsize(path) - HEADER_SIZE) // RECORD_DTYPE.itemsize
+        self.records = (np.memmap(path, dtype=RECORD_DTYPE, mode="r", offset=HEADER_SIZE, shape=(n,))
+                        if n else np.empty(0, dtype=RECORD_DTYPE))
+        idx_path = path + ".idx"
+        self.index = (np.fromfile(idx_path, dtype=INDEX_DTYPE)
+                      if os.path.exists(idx_path) else np.empty(0, dtype=INDEX_DTYPE))
+        self.index = self.index[:n // BLOCK_RECORDS]
+        self._names = _Names(path + ".names")
+        self._tail_from = len(self.index) * BLOCK_RECORDS
+        tail = self.records[self._tail_from:]
+        self._tail_index = _block_index(tail) if len(tail) else None
+        self.monotonic = self._check_monotonic()
+
+    def __len__(self):
+        return len(self.records)
+
+    def _blocks(self):
+        """Wpisy indeksu łącznie z ogonem."""
+        if self._tail_index is None:
+            return self.index
+        return np.concatenate((self.index, self._tail_index))
+
+    def _check_monotonic(self) -> bool:
+        b = self._blocks()
+        if not len(b):
+            return True
+        return bool(b["sorted"].all() and np.all(b["t_min"][1:] >= b["t_max"][:-1]))
+
+    def sensors(self):
+        """Klucze "port:id" obecne w słowniku nazw, z nazwami."""
+        return {self._names.key(d, s): name for (d, s), name in self._names.names.items()}
+
+    def key(self, dev: int, sid: int) -> str:
+        return self._names.key(dev, sid)
+
+    def time_range(self):
+        b = self._blocks()
+        if not len(b):
+            return None
+        return int(b["t_min"].min()), int(b["t_max"].max())
+
+    def range(self, t_from_ms=None, t_to_ms=None):
+        """
+        Rekordy z przedziału [t_from_ms, t_to_ms]. Dla pliku uporządkowanego
+        w czasie to widok memmap (bez kopiowania), w przeciwnym razie kopia.
+        """
+        recs = self.records
+        lo_t = -2**63 if t_from_ms is None else t_from_ms
+        hi_t = 2**63 - 1 if t_to_ms is None else t_to_ms
+        if self.monotonic:
+            ts = recs["ts_ms"]
+            lo = int(np.searchsorted(ts, lo_t, side="left"))
+            hi = int(np.searchsorted(ts, hi_t, side="right"))
+            return recs[lo:hi]
+        b = self._blocks()
+        hit = np.flatnonzero((b["t_max"] >= lo_t) & (b["t_min"] <= hi_t))
+        parts = []
+        for i in hit:
+            blk = recs[i * BLOCK_RECORDS:(i + 1) * BLOCK_RECORDS]
+            parts.append(blk[(blk["ts_ms"] >= lo_t) & (blk["ts_ms"] <= hi_t)])
+        return np.concatenate(parts) if parts else recs[:0]
+
+    def series(self, key: str, t_from_ms=None, t_to_ms=None):
+        """(ts [s] float64, temp float32) jednego czujnika; pomija bloki bez niego."""
+        port, sid = split_key(key)
+        try:
+            dev = self._names.devices.index(port)
+            sid = int(sid)
+        except ValueError:
+            return np.empty(0), np.empty(0, dtype=np.float32)
+        bit = int(_mask_bit(dev, sid))
+        b = self._blocks()
+        lo_t = -2**63 if t_from_ms is None else t_from_ms
+        hi_t = 2**63 - 1 if t_to_ms is None else t_to_ms
+        has = (b["mask"][:, bit // 64] >> np.uint64(bit % 64)) & np.uint64(1)
+        hit = np.flatnonzero(has.astype(bool) & (b["t_max"] >= lo_t) & (b["t_min"] <= hi_t))
+        parts = []
+        for i in hit:
+            blk = self.records[i * BLOCK_RECORDS:(i + 1) * BLOCK_RECORDS]
+            sel = (blk["dev"] == dev) & (blk["sid"] == sid) & (blk["ts_ms"] >= lo_t) & (blk["ts_ms"] <= hi_t)
+            parts.append(blk[sel])
+        recs = np.concatenate(parts) if parts else self.records[:0]
+        return recs["ts_ms"] / 1000.0, np.asarray(recs["temp"])
+
+
+def _open_text(path: str):
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    return open(path, newline="", encoding="utf-8")
+
+
+def csv_to_binlog(csv_paths, out_path: str) -> int:
+    """Konwertuje logi CSV (także .csv.gz) do .ptb. Zwraca liczbę rekordów."""
+    w = BinLogWriter()
+    # porcje kodowane w tym wątku – pamięć nie zależy od rozmiaru CSV
+    w.set_path(out_path, background=False)
+    try:
+        for path in csv_paths:
+            with _open_text(path) as f:
+                batch = []
+                for row in csv.reader(f):
+                    if len(row) < 6 or row[0] == "timestamp_iso":
+                        continue
+                    try:
+                        ts = int(row[1]) / 1000.0
+                    except ValueError:
+                        continue
+                    batch.append((ts, row[2], row[3], row[4] if row[4] != "" else None, row[5]))
+                    if len(batch) >= CONVERT_BATCH_ROWS:
+                        w.write_batch(batch)
+                        batch = []
+                w.write_batch(batch)
+    finally:
+        w.close()
+    return w.rows_written
+
+
+def main(argv=None) -> int:
+    p = argparse.ArgumentParser(description="PT100 – binarny log pomiarów")
+    sub = p.add_subparsers(dest="cmd", required=True)
+    c = sub.add_parser("convert", help="CSV -> .ptb")
+    c.add_argument("csv", nargs="+")
+    c.add_argument("-o", "--out", required=True)
+    i = sub.add_parser("info", help="podsumowanie pliku .ptb")
+    i.add_argument("path")
+    args = p.parse_args(argv)
+
+    if args.cmd == "convert":
+        t0 = time.perf_counter()
+        n = csv_to_binlog(args.csv, args.out)
+        print(f"{n} records -> {args.out} ({time.perf_counter() - t0:.1f} s)")
+        return 0
+    r = BinLogReader(args.path)
+    tr = r.time_range()
+    print(f"records: {len(r)}  blocks: {len(r.index)}  time-ordered: {r.monotonic}")
+    if tr:
+        fmt = lambda ms: time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ms / 1000))
+        print(f"from {fmt(tr[0])} to {fmt(tr[1])}")
+    for key, name in sorted(r.sensors().items()):
+        print(f"  {key}  {name}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
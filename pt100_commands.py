@@ -0,0 +1,262 @@
+"""
+Kolejka komend z dopasowaniem odpowiedzi (bez zależności od Qt).
+
+Firmware obsługuje linie po kolei, więc odpowiedzi przychodzą w kolejności
+komend – przeplatane auto-raportami. CommandQueue trzyma dla każdego portu
+kolejkę oczekujących komend i listę wysłanych ("w locie"), ograniczoną
+liczbą komend i sumą bajtów, żeby nie przepełnić 64-bajtowego bufora RX
+Uno (line_overflow). Każdy rekord odpowiedzi jest dopasowywany do
+najstarszej wysłanej komendy, której typ pasuje:
+  LIST -> SensorList, READ id=X -> Sample "read" z id X albo Reply,
+  NEW/SET/DEL/inne -> Reply.
+Komendy pominięte przy dopasowaniu (firmware ich nie dostał) i te bez
+odpowiedzi w czasie `timeout` są wysyłane ponownie, najwyżej `retries` razy.
+submit() zwraca concurrent.futures.Future z rekordem odpowiedzi
+(Reply z ok=False też jest wynikiem), a po wyczerpaniu prób –
+wyjątek CommandTimeout.
+"""
+import collections
+import re
+import threading
+import time
+from concurrent.futures import Future
+
+from pt100_metrics import METRICS
+from pt100_protocol import Reply, Sample, SensorList
+
+COMMAND_TIMEOUT_S = 2.0     # bez odpowiedzi dłużej -> ponowna próba
+COMMAND_RETRIES = 2
+MAX_INFLIGHT = 4            # komend wysłanych bez odpowiedzi (na port)
+RX_BUDGET_BYTES = 48        # bajtów w locie (bufor RX Uno: 64 B)
+
+_ID = re.compile(r"\bid=(-?\d+)", re.IGNORECASE)
+
+_COMMAND_S = METRICS.histogram("pt100_command_seconds", "Od pierwszego wysłania komendy do odpowiedzi", ("cmd",))
+_RETRIES = METRICS.counter("pt100_command_retries_total", "Ponowne wysłania komend", ("cmd",))
+_TIMEOUTS = METRICS.counter("pt100_command_timeouts_total", "Komendy bez odpowiedzi po wszystkich próbach", ("cmd",))
+
+
+class CommandTimeout(Exception):
+    pass
+
+
+class Command:
+    __slots__ = ("port", "line", "kind", "sid", "future", "timeout", "retries", "tries", "deadline", "sent")
+
+    def __init__(self, port: str, line: str, timeout: float, retries: int):
+        self.port = port
+        self.line = line.strip()
+        self.kind = self.line.split(None, 1)[0].upper()
+        m = _ID.search(self.line)
+        # firmware: (uint8_t)atoi(v)
+        self.sid = str(int(m.group(1)) & 0xFF) if m else None
+        self.future = Future()
+        self.timeout = timeout
+        self.retries = retries
+        self.tries = 0
+        self.deadline = None
+        self.sent = None            # czas pierwszego wysłania (monotonic)
+
+    @property
+    def nbytes(self) -> int:
+        return len(self.line) + 1
+
+    def matches(self, rec) -> bool:
+        if self.kind == "LIST":
+            return isinstance(rec, SensorList)
+        if self.kind == "READ":
+            if isinstance(rec, Sample):
+                return rec.source == "read" and (self.sid is None or rec.sid == self.sid)
+            return isinstance(rec, Reply)
+        return isinstance(rec, Reply)
+
+    def __repr__(self):
+        return f"Command({self.port!r}, {self.line!r})"
+
+
+def is_reply(rec) -> bool:
+    """Rekord będący odpowiedzią na komendę (a nie auto-raportem)."""
+    return isinstance(rec, (Reply, SensorList)) or (isinstance(rec, Sample) and rec.source == "read")
+
+
+class _Port:
+    def __init__(self):
+        self.queue = collections.deque()    # czekające na wysłanie
+        self.inflight = []                  # wysłane, w kolejności
+        self.inflight_bytes = 0
+        # zdjęcie z kolejki i wysłanie pod jedną blokadą: kolejność na łączu = kolejność inflight
+        self.send_lock = threading.Lock()
+
+
+class CommandQueue:
+    def __init__(self, send, timeout: float = COMMAND_TIMEOUT_S, retries: int = COMMAND_RETRIES,
+                 max_inflight: int = MAX_INFLIGHT, rx_budget: int = RX_BUDGET_BYTES):
+        self.send = send            # send(line, port) -> bool
+        self.timeout = timeout
+        self.retries = retries
+        self.max_inflight = max(1, max_inflight)
+        self.rx_budget = rx_budget
+        self._ports = {}
+        self._cond = threading.Condition()
+        self._timer = None
+
+    # ---------- API ----------
+
+    def submit(self, line: str, port: str, timeout=None, retries=None, callback=None) -> Future:
+        """Kolejkuje komendę; callback(future) wołany z wątku, który ją zakończy."""
+        cmd = Command(port, line, self.timeout if timeout is None else timeout,
+                      self.retries if retries is None else retries)
+        if callback:
+            cmd.future.add_done_callback(callback)
+        if not cmd.line:
+            cmd.future.set_exception(ValueError("empty command"))
+            return cmd.future
+        with self._cond:
+            self._ports.setdefault(port, _Port()).queue.append(cmd)
+            self._ensure_timer()
+        self._pump(port)
+        return cmd.future
+
+    def submit_many(self, lines, port: str, **kw) -> list:
+        """Wiele komend do jednego portu – wysyłane w tempie, na jakie pozwala bufor RX."""
+        return [self.submit(line, port, **kw) for line in lines]
+
+    def pending(self, port=None) -> int:
+        with self._cond:
+            ports = self._ports.values() if port is None else [self._ports.get(port) or _Port()]
+            return sum(len(p.queue) + len(p.inflight) for p in ports)
+
+    def cancel(self, port=None, exc=None):
+        """Kończy wszystkie komendy portu (albo wszystkich) wyjątkiem, np. po zamknięciu portu."""
+        with self._cond:
+            ports = list(self._ports) if port is None else [port]
+            dropped = []
+            for p in ports:
+                st = self._ports.pop(p, None)
+                if st:
+                    dropped += st.inflight + list(st.queue)
+        for cmd in dropped:
+            if not cmd.future.done():
+                cmd.future.set_exception(exc or ConnectionError(f"{cmd.port}: port closed"))
+
+    # ---------- odpowiedzi ----------
+
+    def on_records(self, records):
+        """Wołane ze strumienia rekordów (wszystkie porty, w kolejności odbioru)."""
+        done = []
+        touched = set()
+        with self._cond:
+            for rec in records:
+                if not is_reply(rec):
+                    continue
+                st = self._ports.get(rec.dev)
+                if st is None or not st.inflight:
+                    continue
+                for i, cmd in enumerate(st.inflight):
+                    if cmd.matches(rec):
+                        break
+                else:
+                    continue    # spóźniona odpowiedź na komendę, która już wygasła
+                # wcześniejsze komendy nie dostały odpowiedzi – firmware ich nie przyjął
+                lost = st.inflight[:i]
+                del st.inflight[:i + 1]
+                st.inflight_bytes -= sum(c.nbytes for c in lost) + cmd.nbytes
+                for c in reversed(lost):
+                    self._retry(st, c, done)
+                done.append((cmd, rec))
+                touched.add(rec.dev)
+        self._finish(done)
+        for port in touched:
+            self._pump(port)
+
+    # ---------- wewnętrzne ----------
+
+    def _retry(self, st, cmd, done):
+        if cmd.tries <= cmd.retries:
+            _RETRIES.inc(cmd=cmd.kind)
+            st.queue.appendleft(cmd)
+        else:
+            _TIMEOUTS.inc(cmd=cmd.kind)
+            done.append((cmd, CommandTimeout(f"{cmd.port}: no reply to '{cmd.line}' after {cmd.tries} tries")))
+
+    @staticmethod
+    def _finish(done):
+        for cmd, result in done:
+            if cmd.future.done():
+                continue
+            if isinstance(result, Exception):
+                cmd.future.set_exception(result)
+            else:
+                _COMMAND_S.observe(time.monotonic() - cmd.sent, cmd=cmd.kind)
+                cmd.future.set_result(result)
+
+    def _pump(self, port):
+        """Wysyła z kolejki portu tyle komend, ile mieści się w limitach."""
+        with self._cond:
+            st = self._ports.get(port)
+        if st is None:
+            return
+        with st.send_lock:
+            self._pump_locked(st, port)
+
+    def _pump_locked(self, st, port):
+        to_send = []
+        with self._cond:
+            while st.queue and len(st.inflight) < self.max_inflight:
+                cmd = st.queue[0]
+                # za długa komenda idzie sama, gdy nic nie jest w locie
+                if st.inflight and st.inflight_bytes + cmd.nbytes > self.rx_budget:
+                    break
+                st.queue.popleft()
+                cmd.tries += 1
+                cmd.deadline = time.monotonic() + cmd.timeout
+                if cmd.sent is None:
+                    cmd.sent = cmd.deadline - cmd.timeout
+                st.inflight.append(cmd)
+                st.inflight_bytes += cmd.nbytes
+                to_send.append(cmd)
+            if to_send:
+                self._cond.notify()
+        failed = []
+        for cmd in to_send:
+            if not self.send(cmd.line, port):
+                failed.append(cmd)
+        if failed:
+            with self._cond:
+                for cmd in failed:
+                    if cmd in st.inflight:
+                        st.inflight.remove(cmd)
+                        st.inflight_bytes -= cmd.nbytes
+            for cmd in failed:
+                if not cmd.future.done():
+                    cmd.future.set_exception(ConnectionError(f"{port}: write failed"))
+
+    def _ensure_timer(self):
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Thread(target=self._timer_loop, daemon=True)
+            self._timer.start()
+
+    def _timer_loop(self):
+        while True:
+            done = []
+            ports = set()
+            with self._cond:
+                now = time.monotonic()
+                nearest = None
+                for port, st in self._ports.items():
+                    expired = [c for c in st.inflight if c.deadline <= now]
+                    for cmd in expired:
+                        st.inflight.remove(cmd)
+                        st.inflight_bytes -= cmd.nbytes
+                    for cmd in reversed(expired):
+                        self._retry(st, cmd, done)
+                    if expired:
+                        ports.add(port)
+                    for c in st.inflight:
+                        nearest = c.deadline if nearest is None else min(nearest, c.deadline)
+                if not done and not ports:
+                    self._cond.wait(None if nearest is None else max(0.0, nearest - now))
+                    continue
+            self._finish(done)
+            for port in ports:
+                self._pump(port)
@@ -0,0 +1,233 @@
+"""
+Zapis pomiarów do pliku CSV (bez zależności od Qt).
+
+log_temp() tylko wrzuca krotkę do kolejki – formatowanie, zapis, flush,
+fsync, rotacja i kompresja dzieją się w osobnym wątku, więc wolny dysk
+(sieciowy, karta SD) nie blokuje GUI ani wątku akwizycji.
+"""
+import csv
+import datetime
+import gzip
+import os
+import queue
+import shutil
+import threading
+import time
+
+from pt100_metrics import METRICS
+from pt100_protocol import ts_ms
+
+CSV_HEADER = ["timestamp_iso", "epoch_ms", "id", "name", "temp_c", "source"]
+
+FLUSH_ROWS = 200            # flush co tyle wierszy...
+FLUSH_INTERVAL_S = 1.0      # ...albo co tyle sekund
+CLOSE_TIMEOUT_S = 5.0       # maks. czekanie na wątek zapisu przy close()
+_STOP = object()
+
+_ROWS = METRICS.counter("pt100_csv_rows_total", "Wiersze zapisane do CSV")
+_WRITE_S = METRICS.histogram("pt100_csv_write_seconds", "Zapis porcji wierszy CSV (z flush/fsync/rotacją)")
+_QUEUE = METRICS.gauge("pt100_csv_queue", "Wiersze czekające w kolejce zapisu CSV")
+_ERRORS = METRICS.counter("pt100_csv_errors_total", "Błędy zapisu CSV")
+
+
+def _gzip_file(path: str):
+    try:
+        with open(path, "rb") as src, gzip.open(path + ".gz", "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.remove(path)
+    except OSError:
+        pass   # zostaje nieskompresowany segment
+
+
+class CsvLogger:
+    """
+    Nagłówek CSV:
+    timestamp_iso, epoch_ms, id, name, temp_c, source
+
+    Polityka zapisu:
+      flush_rows / flush_interval – kiedy opróżniać bufor pliku,
+      fsync_interval – co ile sekund wymuszać zapis na nośnik (None = nigdy),
+      rotate_bytes / rotate_daily – kiedy zamknąć segment i zacząć nowy plik,
+      compress – gzip zamkniętych segmentów.
+    Zamknięty segment dostaje nazwę <plik>.<YYYYmmdd-HHMMSS>.csv[.gz]
+    (czas rozpoczęcia segmentu), a bieżący plik zawsze ma ścieżkę z set_path().
+    """
+    def __init__(self, flush_rows: int = FLUSH_ROWS, flush_interval: float = FLUSH_INTERVAL_S,
+                 fsync_interval=None, rotate_bytes=None, rotate_daily: bool = False,
+                 compress: bool = False, on_error=None):
+        self.path = None
+        self.flush_rows = max(1, int(flush_rows))
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.rotate_bytes = rotate_bytes
+        self.rotate_daily = rotate_daily
+        self.compress = compress
+        self.on_error = on_error            # on_error(str), wołane z wątku zapisu
+        self.rows_written = 0
+        self.last_error = None
+        self._file = None
+        self._writer = None
+        self._queue = None
+        self._thread = None
+        self._segment_start = None
+        self._segment_bytes = 0
+        self._iso_cache = (None, "")
+
+    def set_path(self, path: str):
+        self.close()
+        self.path = path
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        # otwarcie w wątku wołającym, żeby błąd (brak uprawnień itp.) był od razu widoczny
+        self._open_segment(time.time())
+        self._queue = queue.SimpleQueue()
+        self._thread = threading.Thread(target=self._writer_loop, args=(self._queue,), daemon=True)
+        self._thread.start()
+
+    def is_ready(self) -> bool:
+        return self._queue is not None
+
+    def log_temp(self, sid, name, temp, source="interval", ts=None):
+        if not self.is_ready():
+            return
+        if ts is None:
+            ts = time.time()
+        self._queue.put((ts, sid, name, temp, source))
+
+    def close(self):
+        q, t = self._queue, self._thread
+        self._queue = self._thread = None
+        if q is not None:
+            q.put(_STOP)
+            t.join(CLOSE_TIMEOUT_S)
+            if t.is_alive():
+                # zawieszony zapis (np. dysk sieciowy) nie może zablokować GUI;
+                # plik zostaje wątkowi zapisu (daemon)
+                self._report(f"writer did not stop within {CLOSE_TIMEOUT_S:g} s")
+                self._file = self._writer = None
+                return
+        try:
+            if self._file:
+                self._file.flush()
+                self._file.close()
+        except:
+            pass
+        self._file = None
+        self._writer = None
+
+    # ---------- wątek zapisu ----------
+
+    def _open_segment(self, ts: float):
+        new_file = not os.path.exists(self.path) or os.path.getsize(self.path) == 0
+        self._file = open(self.path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self._segment_start = ts
+        self._segment_bytes = os.path.getsize(self.path)
+        if new_file:
+            self._writer.writerow(CSV_HEADER)
+            self._file.flush()
+
+    def _rotate(self, ts: float):
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        root, ext = os.path.splitext(self.path)
+        stamp = time.strftime("%Y%m%d-%H%M%S", time.localtime(self._segment_start))
+        closed = f"{root}.{stamp}{ext or '.csv'}"
+        n = 1
+        while os.path.exists(closed) or os.path.exists(closed + ".gz"):
+            closed = f"{root}.{stamp}-{n}{ext or '.csv'}"; n += 1
+        os.replace(self.path, closed)
+        if self.compress:
+            threading.Thread(target=_gzip_file, args=(closed,), daemon=True).start()
+        self._open_segment(ts)
+
+    def _keep_segment(self, ts: float):
+        # rotacja nie wyszła – dopisuj dalej do bieżącego pliku, następna próba po kolejnym progu
+        if self._file is None or self._file.closed:
+            self._open_segment(ts)
+        self._segment_start = ts
+        self._segment_bytes = 0
+
+    def _report(self, e):
+        _ERRORS.inc()
+        self.last_error = str(e)
+        if self.on_error:
+            self.on_error(f"ERR CSV: {e}")
+
+    def _needs_rotation(self, ts: float) -> bool:
+        if self.rotate_bytes and self._segment_bytes >= self.rotate_bytes:
+            return True
+        if self.rotate_daily:
+            seg = datetime.date.fromtimestamp(self._segment_start)
+            return datetime.date.fromtimestamp(ts) != seg
+        return False
+
+    def _format(self, row):
+        ts, sid, name, temp, source = row
+        sec = int(ts)
+        if self._iso_cache[0] != sec:
+            self._iso_cache = (sec, time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(sec)))
+        try:
+            tval = float(temp) if temp is not None else ""
+        except:
+            tval = ""
+        return [self._iso_cache[1], ts_ms(ts), sid, name or "", tval, source]
+
+    def _writer_loop(self, q):
+        unflushed = 0
+        last_flush = last_fsync = time.monotonic()
+        stop = False
+        while not stop:
+            try:
+                item = q.get(timeout=self.flush_interval)
+                batch = [item]
+                # zbierz wszystko, co już czeka w kolejce
+                while len(batch) < 10000:
+                    try:
+                        batch.append(q.get_nowait())
+                    except queue.Empty:
+                        break
+            except queue.Empty:
+                batch = []
+            _QUEUE.set(q.qsize())
+            # _STOP sprawdzany przed zapisem – błąd zapisu nie może zablokować close()
+            if any(item is _STOP for item in batch):
+                stop = True
+                batch = [item for item in batch if item is not _STOP]
+            t0 = time.perf_counter()
+            try:
+                rotating = self.rotate_bytes or self.rotate_daily
+                rows = []
+                written = 0
+                for item in batch:
+                    if rotating and self._needs_rotation(item[0]):
+                        self._writer.writerows(rows)
+                        written += len(rows); rows = []
+                        try:
+                            self._rotate(item[0])
+                        except OSError as e:
+                            self._report(f"rotation failed: {e}")
+                            self._keep_segment(item[0])
+                    row = self._format(item)
+                    rows.append(row)
+                    if self.rotate_bytes:
+                        # przybliżony rozmiar wiersza (separatory + CRLF)
+                        self._segment_bytes += sum(len(str(v)) for v in row) + 7
+                self._writer.writerows(rows)
+                written += len(rows)
+                self.rows_written += written
+                _ROWS.inc(written)
+                unflushed += written
+
+                now = time.monotonic()
+                if unflushed and (stop or unflushed >= self.flush_rows or now - last_flush >= self.flush_interval):
+                    self._file.flush()
+                    unflushed = 0
+                    last_flush = now
+                    if self.fsync_interval is not None and (stop or now - last_fsync >= self.fsync_interval):
+                        os.fsync(self._file.fileno())
+                        last_fsync = now
+                if batch:
+                    _WRITE_S.observe(time.perf_counter() - t0)
+            except Exception as e:
+                self._report(e)
@@ -0,0 +1,127 @@
+"""
+Decymacja min/max dla wykresu.
+
+Oś czasu dzielona jest na kubełki o szerokości ~1 piksela; z każdego
+kubełka zostają dwa punkty (min i max, w kolejności czasu), więc szpilki
+i przekroczenia progów pozostają widoczne. Siatka kubełków jest
+wyrównana do epoch, a szerokość zaokrąglona do potęgi 2, dzięki czemu
+gotowe kubełki można trzymać w pamięci podręcznej i liczyć przy każdej
+klatce tylko nowe próbki. Punkty NaN (przerwy w danych, np. utrata
+łącza) przechodzą bez zmian – linia wykresu się na nich urywa.
+"""
+import math
+
+import numpy as np
+
+
+def bucket_width(span_s: float, pixels: int) -> float:
+    """Szerokość kubełka [s] – potęga 2, nie mniejsza niż span/pixels."""
+    raw = span_s / max(1, int(pixels))
+    if raw <= 0:
+        return 0.0
+    return 2.0 ** math.ceil(math.log2(raw))
+
+
+def minmax_reduce(ts, ys, width: float):
+    """
+    Redukcja min/max po kubełkach floor(ts / width).
+    Zwraca (ts, ys) z co najwyżej dwoma punktami na kubełek (plus
+    znaczniki przerw NaN).
+    """
+    ts = np.asarray(ts, dtype=np.float64)
+    ys = np.asarray(ys, dtype=np.float64)
+    ok = np.isfinite(ys)
+    if not ok.all():
+        rts, rys = minmax_reduce(ts[ok], ys[ok], width)
+        gaps = ts[np.isnan(ys)]
+        ts = np.concatenate((rts, gaps))
+        ys = np.concatenate((rys, np.full(len(gaps), np.nan)))
+        order = np.argsort(ts, kind="stable")
+        return ts[order], ys[order]
+    n = len(ts)
+    if n <= 2 or width <= 0:
+        return ts, ys
+
+    idx = np.floor(ts / width).astype(np.int64)
+    starts = np.flatnonzero(np.diff(idx)) + 1
+    starts = np.concatenate(([0], starts))
+    if 2 * len(starts) >= n:
+        return ts, ys   # nie ma czego redukować
+    counts = np.diff(np.append(starts, n))
+    bucket = np.repeat(np.arange(len(starts)), counts)
+
+    mins = np.minimum.reduceat(ys, starts)
+    maxs = np.maximum.reduceat(ys, starts)
+    # pierwsze wystąpienie min/max w każdym kubełku
+    pos_min = np.flatnonzero(ys == mins[bucket])
+    pos_min = pos_min[np.unique(bucket[pos_min], return_index=True)[1]]
+    pos_max = np.flatnonzero(ys == maxs[bucket])
+    pos_max = pos_max[np.unique(bucket[pos_max], return_index=True)[1]]
+
+    first = np.minimum(pos_min, pos_max)
+    second = np.maximum(pos_min, pos_max)
+    keep = np.empty(2 * len(starts), dtype=np.int64)
+    keep[0::2] = first
+    keep[1::2] = second
+    # kubełek płaski (min == max w tym samym punkcie) -> jeden punkt
+    keep = keep[np.concatenate(([True], np.diff(keep) != 0))]
+    return ts[keep], ys[keep]
+
+
+class _Entry:
+    __slots__ = ("width", "generation", "since", "done_until", "ts", "ys")
+
+    def __init__(self, width, generation, since):
+        self.width = width
+        self.generation = generation
+        self.since = since                # od kiedy pamięć podręczna jest pełna
+        self.done_until = -math.inf       # koniec ostatniego zamkniętego kubełka
+        self.ts = np.empty(0)
+        self.ys = np.empty(0)
+
+
+class Decimator:
+    """
+    Pamięć podręczna zdecymowanych serii, per czujnik.
+    Zamknięte kubełki liczone są raz; przy każdej klatce redukowany jest
+    tylko ogon od ostatniego zamkniętego kubełka.
+    """
+
+    def __init__(self):
+        self._cache = {}   # sid -> _Entry
+
+    def invalidate(self, sid=None):
+        if sid is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(sid, None)
+
+    def window(self, sid, buf, t_from: float, span_s: float, pixels: int, t_to=None):
+        width = bucket_width(span_s, pixels)
+        e = self._cache.get(sid)
+        if e is None or e.width != width or e.generation != buf.generation or t_from < e.since:
+            e = self._cache[sid] = _Entry(width, buf.generation, t_from)
+
+        # odetnij kubełki, które wypadły z okna
+        if len(e.ts) and e.ts[0] < t_from:
+            k = int(np.searchsorted(e.ts, t_from, side="left"))
+            e.ts, e.ys = e.ts[k:], e.ys[k:]
+        e.since = max(e.since, t_from)
+
+        tail_from = max(t_from, e.done_until)
+        ts, ys = buf.window(tail_from, t_to)
+        if not len(ts):
+            return e.ts, e.ys
+        if width <= 0:
+            return ts, ys
+
+        # wszystko przed początkiem kubełka z najnowszą próbką jest już zamknięte
+        closed_until = math.floor(ts[-1] / width) * width
+        k = int(np.searchsorted(ts, closed_until, side="left"))
+        if k:
+            rts, rys = minmax_reduce(ts[:k], ys[:k], width)
+            e.ts = np.concatenate((e.ts, rts))
+            e.ys = np.concatenate((e.ys, rys))
+            e.done_until = closed_until
+        pts, pys = minmax_reduce(ts[k:], ys[k:], width)
+        return np.concatenate((e.ts, pts)), np.concatenate((e.ys, pys))
@@ -0,0 +1,329 @@
+"""
+Tryb bez GUI: akwizycja z portu szeregowego do CSV.
+
+Nie importuje Qt ani matplotlib – nadaje się na małe komputery bez
+ekranu. Przykład:
+
+    python PT100_App.py --headless --port /dev/ttyUSB0 --csv out.csv
+    python pt100_headless.py --port COM3 --csv out.csv --poll 5 --send "SET id=1 interval=1000"
+    python pt100_headless.py --port /dev/ttyUSB0 --port /dev/ttyUSB1 --csv rig.csv
+    python pt100_headless.py --port /dev/ttyUSB0 --baud 115200 --frames --csv fast.csv
+    python pt100_headless.py --port /dev/ttyUSB0 --csv out.csv --metrics-port 9101 --stats 10
+    python pt100_headless.py --port COM3 --csv out.csv --alarm hi=80,rate=2 --alarm 3:lo=5 --alarm-log alarms.csv
+    python pt100_headless.py --port /dev/ttyUSB0 --csv out.csv --share 8765
+
+Czujniki w CSV mają id w postaci "port:id" (np. /dev/ttyUSB0:1) – także
+przy jednym porcie.
+Utracony port jest otwierany ponownie (backoff, także pod nową nazwą po
+numerze seryjnym USB); przerwa trafia do CSV jako wiersze source=gap.
+"""
+import argparse
+import queue
+import signal
+import sys
+import time
+
+from pt100_csvlog import FLUSH_INTERVAL_S, FLUSH_ROWS, CsvLogger
+from pt100_metrics import JSON_DUMP_INTERVAL_S, METRICS, JsonDumper, MetricsServer, Window, format_status
+from pt100_poller import PollScheduler
+from pt100_protocol import Link, Reply, Sample, SensorList, sensor_key, split_key
+from pt100_serial import BAUD, DeviceManager
+from pt100_stats import STATS_WINDOW_S, AlarmLog, StatsEngine, describe, parse_rule
+
+_BATCH_S = METRICS.histogram("pt100_batch_seconds", "Obsługa paczki rekordów przez odbiorcę (GUI/headless)")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="PT100 – akwizycja bez GUI")
+    p.add_argument("--headless", action="store_true", help=argparse.SUPPRESS)
+    p.add_argument("--port", required=True, action="append",
+                   help="port szeregowy, np. /dev/ttyUSB0 lub COM3 (można powtarzać)")
+    p.add_argument("--baud", type=int, default=BAUD, help="musi zgadzać się z LH_BAUD firmware")
+    p.add_argument("--frames", action="store_true",
+                   help="auto-raporty jako ramki binarne (MODE fmt=bin); po zakończeniu MODE fmt=json")
+    p.add_argument("--csv", help="plik CSV (dopisywanie)")
+    p.add_argument("--bin", help="dodatkowo binarny log .ptb (pt100_binlog)")
+    p.add_argument("--no-reconnect", action="store_true",
+                   help="zakończ po utracie łącza zamiast ponownie otwierać port")
+    p.add_argument("--send", action="append", default=[], metavar="CMD",
+                   help="komenda wysyłana po połączeniu do wszystkich portów (można powtarzać)")
+    p.add_argument("--poll", type=float, default=0.0, metavar="S",
+                   help="co ile sekund wysyłać READ do znanych czujników (0 = tylko auto-raporty)")
+    p.add_argument("--poll-sensor", action="append", default=[], metavar="ID=S",
+                   help="własny okres READ dla czujnika (id albo port:id), np. 3=0.5 (można powtarzać)")
+    p.add_argument("--poll-adaptive", action="store_true",
+                   help="częściej czytaj czujniki, których temperatura szybko się zmienia")
+    p.add_argument("--alarm", action="append", default=[], metavar="[ID:]SPEC",
+                   help="reguła alarmu hi=..,lo=..,rate=..(°C/min),hyst=..,stale=..(s); "
+                        "z prefiksem ID: (id albo port:id) tylko dla czujnika (można powtarzać)")
+    p.add_argument("--alarm-log", metavar="PATH", help="zdarzenia alarmów do CSV")
+    p.add_argument("--roll-window", type=float, default=STATS_WINDOW_S, metavar="S",
+                   help="okno statystyk kroczących (nachylenie dla alarmu rate)")
+    p.add_argument("--duration", type=float, default=0.0, metavar="S",
+                   help="zakończ po tylu sekundach (0 = do sygnału)")
+    p.add_argument("--flush-rows", type=int, default=FLUSH_ROWS, metavar="N",
+                   help="flush CSV co N wierszy")
+    p.add_argument("--flush-interval", type=float, default=FLUSH_INTERVAL_S, metavar="S",
+                   help="flush CSV najpóźniej co S sekund")
+    p.add_argument("--fsync-interval", type=float, default=None, metavar="S",
+                   help="fsync CSV co S sekund (domyślnie wyłączony)")
+    p.add_argument("--rotate-mb", type=float, default=None, metavar="MB",
+                   help="rotacja pliku CSV po przekroczeniu rozmiaru")
+    p.add_argument("--rotate-daily", action="store_true", help="rotacja pliku CSV o północy")
+    p.add_argument("--gzip", action="store_true", help="kompresuj zamknięte segmenty CSV")
+    p.add_argument("--metrics-port", type=int, default=None, metavar="N",
+                   help="metryki na http://127.0.0.1:N/metrics (Prometheus) i /metrics.json")
+    p.add_argument("--metrics-json", default=None, metavar="PATH",
+                   help="okresowy zapis metryk do pliku JSON")
+    p.add_argument("--metrics-interval", type=float, default=JSON_DUMP_INTERVAL_S, metavar="S",
+                   help="co ile sekund zapisywać --metrics-json")
+    p.add_argument("--share", type=int, default=None, metavar="N",
+                   help="udostępnij strumień i komendy klientom na 127.0.0.1:N (TCP/WebSocket, pt100_share)")
+    p.add_argument("--share-policy", choices=("coalesce", "drop"), default="coalesce",
+                   help="co robić z wolnym klientem: tylko najnowszy pomiar czujnika albo odrzucanie najstarszych")
+    p.add_argument("--stats", type=float, default=0.0, metavar="S",
+                   help="co S sekund wypisuj stan toru danych na stderr (0 = nie)")
+    p.add_argument("-q", "--quiet", action="store_true", help="nie wypisuj pomiarów na stdout")
+    return p
+
+
+class HeadlessApp:
+    def __init__(self, args):
+        self.args = args
+        self.csv = CsvLogger(flush_rows=args.flush_rows, flush_interval=args.flush_interval,
+                             fsync_interval=args.fsync_interval,
+                             rotate_bytes=int(args.rotate_mb * 1024 * 1024) if args.rotate_mb else None,
+                             rotate_daily=args.rotate_daily, compress=args.gzip,
+                             on_error=self.on_status)
+        self.bin = None             # BinLogWriter, gdy podano --bin
+        self.sensors = {}           # klucz "port:id" -> name
+        self.records = queue.Queue()
+        self._stop = False
+        self._started = False       # po pierwszym połączeniu: on_connected oznacza reconnect
+        self.share = None           # ShareServer, gdy podano --share
+        self.devices = DeviceManager(on_batch=self.on_batch,
+                                     on_status=self.on_status,
+                                     on_connected=self.on_connected,
+                                     reconnect=not args.no_reconnect)
+        self.poller = PollScheduler(self.devices.command, baud_of=self.devices.baudrate,
+                                    pending_of=self.devices.commands.pending,
+                                    ready_of=self.devices.is_open,
+                                    period=args.poll, adaptive=args.poll_adaptive)
+        self.stats = StatsEngine(args.roll_window)
+        self.alarm_log = AlarmLog()
+        self.alarm_rules = []       # (id albo port:id, AlarmRule) z --alarm
+        for spec in args.alarm:
+            sid, rule = self.split_alarm(spec)
+            if sid is None:
+                self.stats.set_rule(None, rule)
+            else:
+                self.alarm_rules.append((sid, rule))
+
+    def stop(self, *_):
+        self._stop = True
+
+    def on_status(self, msg: str):
+        print(f"# {msg}", file=sys.stderr, flush=True)
+
+    def on_batch(self, batch):
+        # wątek scalający: klienci dostają paczkę od razu, bez czekania na pętlę główną
+        if self.share:
+            self.share.publish(batch)
+        self.records.put(batch)
+
+    def on_connected(self, port: str, ok: bool):
+        if self.share:
+            self.share.ports_changed()
+        # płytka po resecie wraca do JSON – po ponownym połączeniu przywróć ramki
+        if ok and self._started and self.args.frames:
+            self.devices.command("MODE fmt=bin", port,
+                                 callback=lambda f: self.on_command_done(port, "MODE fmt=bin", f))
+
+    def on_command_done(self, port: str, cmd: str, fut):
+        exc = fut.exception()
+        # odpowiedzi ok:false wypisuje handle(), tu tylko timeouty i błędy portu
+        if exc is not None:
+            self.on_status(f"[{port}] ERR {cmd}: {exc}")
+
+    def split_alarm(self, spec: str):
+        """"[ID:]hi=80,..." -> (ID albo None, AlarmRule); ID może mieć postać port:id."""
+        head, _, _ = spec.partition("=")
+        sid, sep, _ = head.rpartition(":")
+        if sep:
+            spec = spec[len(sid) + 1:]
+        return (sid or None), parse_rule(spec, self.stats.default_rule)
+
+    def apply_alarm_rules(self, key: str):
+        for sid, rule in self.alarm_rules:
+            if key == sid or split_key(key)[1] == sid:
+                self.stats.set_rule(key, rule)
+
+    def on_alarm(self, ev):
+        self.on_status(describe(ev))
+        self.alarm_log.log(ev, self.sensors.get(ev.key, ""))
+
+    def handle(self, rec):
+        if isinstance(rec, Sample):
+            key = rec.key
+            new = key not in self.sensors
+            if new:
+                self.apply_alarm_rules(key)
+            # ramki binarne nie niosą nazwy – ta z LIST
+            name = self.sensors[key] = rec.name or self.sensors.get(key, "")
+            if new:
+                # czujnik spoza LIST (np. auto-raport) też trafia do odpytywania
+                self.poller.set_sensors(self.sensors)
+                self.apply_poll_overrides()
+            self.csv.log_temp(key, name, rec.t, source=rec.source, ts=rec.ts)
+            if self.bin:
+                self.bin.log_temp(key, name, rec.t, source=rec.source, ts=rec.ts)
+            if not self.args.quiet:
+                print(f"{rec.ts:.3f} {key} {name} {rec.t} {rec.source}", flush=True)
+            try:
+                t = float(rec.t)
+            except (TypeError, ValueError):
+                return
+            for ev in self.stats.update(key, rec.ts, t):
+                self.on_alarm(ev)
+        elif isinstance(rec, SensorList):
+            # LIST opisuje jedno urządzenie
+            self.sensors = {k: v for k, v in self.sensors.items() if split_key(k)[0] != rec.dev}
+            for it in rec.sensors:
+                if "id" in it:
+                    self.sensors[sensor_key(rec.dev, it["id"])] = it.get("name", "")
+            for key in list(self.stats.stats):
+                if split_key(key)[0] == rec.dev and key not in self.sensors:
+                    self.stats.remove(key)
+            for key in self.sensors:
+                self.apply_alarm_rules(key)
+            self.on_status(f"[{rec.dev}] sensors: {', '.join(sorted(self.sensors)) or '-'}")
+            self.poller.set_sensors(self.sensors)
+            self.apply_poll_overrides()
+        elif isinstance(rec, Link):
+            self.on_status(f"[{rec.dev}] {rec.raw.lstrip('# ')}")
+            if not rec.up:
+                self.mark_gap(rec.dev, rec.ts)
+        elif isinstance(rec, Reply) and not rec.ok:
+            self.on_status(f"[{rec.dev}] ERR device: {rec.err}")
+
+    def mark_gap(self, dev: str, ts: float):
+        """Wiersz przerwy (pusta temperatura) dla czujników utraconego portu."""
+        for key, name in self.sensors.items():
+            if split_key(key)[0] != dev:
+                continue
+            self.csv.log_temp(key, name, None, source="gap", ts=ts)
+            if self.bin:
+                self.bin.log_temp(key, name, None, source="gap", ts=ts)
+            self.stats.reset(key)
+
+    def apply_poll_overrides(self):
+        for spec in self.args.poll_sensor:
+            sid, _, period = spec.partition("=")
+            for key in self.sensors:
+                if key == sid or split_key(key)[1] == sid:
+                    self.poller.set_period(key, float(period))
+
+    def run(self) -> int:
+        a = self.args
+        if a.csv:
+            self.csv.set_path(a.csv)
+        if a.alarm_log:
+            self.alarm_log.set_path(a.alarm_log)
+        if a.bin:
+            # NumPy tylko wtedy, gdy jest potrzebny
+            from pt100_binlog import BinLogWriter
+            self.bin = BinLogWriter()
+            self.bin.set_path(a.bin)
+        if a.share is not None:
+            from pt100_share import ShareServer
+            try:
+                self.share = ShareServer(self.devices, a.share, policy=a.share_policy, on_status=self.on_status)
+            except OSError as e:
+                self.on_status(f"ERR share port {a.share}: {e}")
+                return 1
+            self.on_status(f"sharing on {self.share.host}:{self.share.port}")
+        try:
+            # numery seryjne USB – do odnalezienia płytki pod nową nazwą po reconnect
+            from pt100_ports import scan
+            serials = {p.device: p.serial_number for p in scan()}
+        except Exception:
+            serials = {}
+        for port in a.port:
+            self.devices.open(port, a.baud, serials.get(port))
+        if not self.devices.is_open():
+            return 1
+        server = MetricsServer(port=a.metrics_port) if a.metrics_port is not None else None
+        dumper = JsonDumper(a.metrics_json, a.metrics_interval) if a.metrics_json else None
+        win = Window()
+        win.tick()
+        next_stats = time.monotonic() + a.stats
+        next_stale = time.monotonic() + 1.0
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(sig, self.stop)
+
+        self.devices.send_line("LIST")
+        sends = (["MODE fmt=bin"] if a.frames else []) + a.send
+        for cmd in sends:
+            for port in self.devices.ports():
+                self.devices.command(cmd, port, callback=lambda f, p=port, c=cmd: self.on_command_done(p, c, f))
+        self._started = True
+
+        t_end = time.monotonic() + a.duration if a.duration > 0 else None
+        self.poller.set_enabled(a.poll > 0 or bool(a.poll_sensor))
+        try:
+            while not self._stop and (self.devices.is_open() or self.devices.reconnecting()):
+                now = time.monotonic()
+                if t_end is not None and now >= t_end:
+                    break
+                if a.stats > 0 and now >= next_stats:
+                    next_stats = now + a.stats
+                    win.tick()
+                    self.on_status(format_status(win))
+                if now >= next_stale:
+                    next_stale = now + 1.0
+                    for ev in self.stats.check_stale():
+                        self.on_alarm(ev)
+                self.poller.tick()
+                try:
+                    batch = self.records.get(timeout=0.05)
+                except queue.Empty:
+                    continue
+                with _BATCH_S.time():
+                    self.poller.on_records(batch)
+                    for rec in batch:
+                        self.handle(rec)
+        finally:
+            if a.frames and self.devices.is_open():
+                # następna sesja (albo starszy host) dostanie znowu JSON
+                self.devices.send_line("MODE fmt=json")
+                time.sleep(0.1)
+            self.devices.close()
+            if self.share:
+                self.share.close()
+            # dokończ to, co wątek czytający zdążył oddać
+            while not self.records.empty():
+                for rec in self.records.get_nowait():
+                    self.handle(rec)
+            self.csv.close()
+            self.alarm_log.close()
+            if self.bin:
+                self.bin.close()
+            if server:
+                server.close()
+            if dumper:
+                dumper.close()
+        return 0
+
+
+def main(argv=None) -> int:
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    try:
+        app = HeadlessApp(args)
+    except ValueError as e:
+        parser.error(f"--alarm: {e}")
+    return app.run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,200 @@
+"""
+Historia pomiarów: jeden bufor pierścieniowy (NumPy) na czujnik.
+
+Bufor ma stałą pojemność zaalokowaną z góry, dopisanie próbki to O(1),
+a zapytanie o okno czasowe to wyszukiwanie binarne po znacznikach czasu
+(zakładamy, że czasy dla jednego czujnika rosną). Retencja (liczba próbek
+i opcjonalnie maksymalny wiek) jest niezależna od okna wykresu.
+"""
+import numpy as np
+
+DEFAULT_CAPACITY = 50000        # próbek na czujnik (~800 kB: 2 x float64)
+DEFAULT_RETENTION_S = None      # None = tylko limit pojemności
+
+
+class RingBuffer:
+    """Bufor pierścieniowy par (ts, value) o stałej pojemności."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, retention_s=DEFAULT_RETENTION_S):
+        if capacity < 1:
+            raise ValueError("capacity must be >= 1")
+        self.capacity = int(capacity)
+        self.retention_s = retention_s
+        self._ts = np.empty(self.capacity, dtype=np.float64)
+        self._val = np.empty(self.capacity, dtype=np.float64)
+        self._start = 0   # indeks najstarszej próbki
+        self._len = 0
+        self.version = 0     # rośnie przy każdej zmianie zawartości (np. dla wykresu)
+        self.generation = 0  # rośnie przy clear() – unieważnia pamięci podręczne
+
+    def __len__(self):
+        return self._len
+
+    def clear(self):
+        self._start = 0
+        self._len = 0
+        self.version += 1
+        self.generation += 1
+
+    def append(self, ts: float, value: float):
+        cap = self.capacity
+        if self._len < cap:
+            i = self._start + self._len
+            if i >= cap:
+                i -= cap
+            self._len += 1
+        else:
+            # pełny – nadpisz najstarszą
+            i = self._start
+            self._start = i + 1 if i + 1 < cap else 0
+        self._ts[i] = ts
+        self._val[i] = value
+        self.version += 1
+        if self.retention_s is not None:
+            self._drop_older_than(ts - self.retention_s)
+
+    def extend(self, ts, values):
+        ts = np.asarray(ts, dtype=np.float64)
+        values = np.asarray(values, dtype=np.float64)
+        n = len(ts)
+        if n == 0:
+            return
+        cap = self.capacity
+        if n >= cap:
+            # zostaje tylko ogon wsadu
+            self._ts[:] = ts[-cap:]
+            self._val[:] = values[-cap:]
+            self._start = 0
+            self._len = cap
+        else:
+            end = (self._start + self._len) % cap
+            first = min(n, cap - end)
+            self._ts[end:end + first] = ts[:first]
+            self._val[end:end + first] = values[:first]
+            if first < n:
+                self._ts[:n - first] = ts[first:]
+                self._val[:n - first] = values[first:]
+            overflow = self._len + n - cap
+            if overflow > 0:
+                self._start = (self._start + overflow) % cap
+                self._len = cap
+            else:
+                self._len += n
+        self.version += 1
+        if self.retention_s is not None:
+            self._drop_older_than(float(ts[-1]) - self.retention_s)
+
+    def _segments(self):
+        """Zwraca (ts, val) jako jeden lub dwa ciągłe widoki w kolejności czasu."""
+        s, n, cap = self._start, self._len, self.capacity
+        if s + n <= cap:
+            return [(self._ts[s:s + n], self._val[s:s + n])]
+        k = cap - s
+        return [(self._ts[s:], self._val[s:]), (self._ts[:n - k], self._val[:n - k])]
+
+    def _index_ge(self, t: float) -> int:
+        """Logiczny indeks pierwszej próbki z ts >= t (wyszukiwanie binarne)."""
+        offset = 0
+        for ts, _ in self._segments():
+            if len(ts) and ts[-1] >= t:
+                return offset + int(np.searchsorted(ts, t, side="left"))
+            offset += len(ts)
+        return offset
+
+    def _drop_older_than(self, t: float):
+        k = self._index_ge(t)
+        if k:
+            self._start = (self._start + k) % self.capacity
+            self._len -= k
+            self.version += 1
+
+    def window(self, t_from=None, t_to=None):
+        """
+        Próbki z przedziału [t_from, t_to] jako (ts, values).
+        Gdy dane nie są zawinięte, zwracane są widoki bez kopiowania –
+        nie należy ich modyfikować ani trzymać dłużej niż do następnego append.
+        """
+        lo = 0 if t_from is None else self._index_ge(t_from)
+        hi = self._len if t_to is None else self._index_ge(np.nextafter(t_to, np.inf))
+        return self._slice(lo, hi)
+
+    def _slice(self, lo: int, hi: int):
+        if hi <= lo:
+            return self._ts[:0], self._val[:0]
+        cap = self.capacity
+        a = self._start + lo
+        b = self._start + hi
+        if b <= cap:
+            return self._ts[a:b], self._val[a:b]
+        if a >= cap:
+            return self._ts[a - cap:b - cap], self._val[a - cap:b - cap]
+        return (np.concatenate((self._ts[a:], self._ts[:b - cap])),
+                np.concatenate((self._val[a:], self._val[:b - cap])))
+
+    def last(self):
+        if not self._len:
+            return None
+        i = (self._start + self._len - 1) % self.capacity
+        return float(self._ts[i]), float(self._val[i])
+
+    def nbytes(self) -> int:
+        return self._ts.nbytes + self._val.nbytes
+
+
+class HistoryStore:
+    """Zbiór buforów pierścieniowych indeksowany id czujnika (str)."""
+
+    def __init__(self, capacity: int = DEFAULT_CAPACITY, retention_s=DEFAULT_RETENTION_S):
+        self.capacity = capacity
+        self.retention_s = retention_s
+        self._buffers = {}
+
+    def __contains__(self, sid):
+        return sid in self._buffers
+
+    def __iter__(self):
+        return iter(self._buffers)
+
+    def ensure(self, sid) -> RingBuffer:
+        buf = self._buffers.get(sid)
+        if buf is None:
+            buf = self._buffers[sid] = RingBuffer(self.capacity, self.retention_s)
+        return buf
+
+    def get(self, sid):
+        return self._buffers.get(sid)
+
+    def append(self, sid, ts: float, value: float):
+        self.ensure(sid).append(ts, value)
+
+    def extend(self, sid, ts, values):
+        self.ensure(sid).extend(ts, values)
+
+    def window(self, sid, t_from=None, t_to=None):
+        buf = self._buffers.get(sid)
+        if buf is None:
+            empty = np.empty(0, dtype=np.float64)
+            return empty, empty
+        return buf.window(t_from, t_to)
+
+    def clear(self, sid=None):
+        if sid is None:
+            for buf in self._buffers.values():
+                buf.clear()
+        elif sid in self._buffers:
+            self._buffers[sid].clear()
+
+    def remove(self, sid):
+        self._buffers.pop(sid, None)
+
+    def set_retention(self, retention_s):
+        """Zmienia retencję wiekową wszystkich buforów (None = bez limitu)."""
+        self.retention_s = retention_s
+        for buf in self._buffers.values():
+            buf.retention_s = retention_s
+            last = buf.last()
+            if retention_s is not None and last is not None:
+                buf._drop_older_than(last[0] - retention_s)
+
+    def nbytes(self) -> int:
+        return sum(b.nbytes() for b in self._buffers.values())
@@ -0,0 +1,153 @@
+"""
+Panel logu komunikacji (Qt).
+
+LogPane trzyma tekst w QPlainTextEdit z limitem linii (maximumBlockCount),
+więc wielogodzinne auto-raporty nie zajmują coraz więcej pamięci. append()
+tylko dopisuje wpis do listy oczekujących – dokument zmienia się raz na
+takt timera (jedno appendPlainText na całą porcję). Wpisy mają rodzaj
+(pomiar, komenda, błąd, status, inna linia urządzenia), a pole wyboru
+dla każdego z pierwszych czterech włącza/wyłącza ich widoczność. Pełny
+log można dodatkowo zapisywać do pliku z rotacją (set_spill) – zapis
+robi osobny wątek.
+"""
+import logging
+import logging.handlers
+import heapq
+import itertools
+import queue
+from collections import defaultdict, deque
+
+try:
+    from PySide6.QtCore import QTimer
+    from PySide6.QtWidgets import QCheckBox, QHBoxLayout, QPlainTextEdit, QVBoxLayout, QWidget
+except ImportError:
+    from PyQt6.QtCore import QTimer
+    from PyQt6.QtWidgets import QCheckBox, QHBoxLayout, QPlainTextEdit, QVBoxLayout, QWidget
+
+from pt100_protocol import Link, Reply, Sample
+
+MAX_LINES = 2000            # linii w widoku (i w pamięci do ponownego filtrowania)
+FLUSH_MS = 200              # co ile ms oczekujące wpisy trafiają do widoku
+SPILL_ROTATE_BYTES = 10 * 1024 * 1024
+SPILL_BACKUPS = 5
+
+# rodzaje wpisów
+SAMPLE = "sample"           # pomiar z urządzenia (READ / auto-raport)
+COMMAND = "command"         # echo wysłanej komendy
+ERROR = "error"             # błędy (łącze, CSV, odpowiedź ok:false)
+STATUS = "status"           # komunikaty aplikacji
+RX = "rx"                   # pozostałe linie urządzenia (LIST, ok:true) – zawsze widoczne
+
+FILTERS = [(SAMPLE, "samples"), (COMMAND, "commands"), (ERROR, "errors"), (STATUS, "status")]
+
+
+def record_kind(rec) -> str:
+    """Rodzaj wpisu dla rekordu z pt100_protocol."""
+    if isinstance(rec, Sample):
+        return SAMPLE
+    if isinstance(rec, Reply) and not rec.ok:
+        return ERROR
+    if isinstance(rec, Link):
+        return STATUS if rec.up else ERROR
+    return RX
+
+
+class LogPane(QWidget):
+    def __init__(self, max_lines: int = MAX_LINES, flush_ms: int = FLUSH_MS, parent=None):
+        super().__init__(parent)
+        self.view = QPlainTextEdit()
+        self.view.setReadOnly(True)
+        self.view.setUndoRedoEnabled(False)
+        self.view.setMaximumBlockCount(max_lines)
+        self.filters = {}
+        frow = QHBoxLayout()
+        for kind, label in FILTERS:
+            chk = QCheckBox(label)
+            chk.setChecked(True)
+            chk.toggled.connect(self.refilter)
+            self.filters[kind] = chk
+            frow.addWidget(chk)
+        frow.addStretch(1)
+        layout = QVBoxLayout(self)
+        layout.setContentsMargins(0, 0, 0, 0)
+        layout.setSpacing(0)
+        layout.addLayout(frow)
+        layout.addWidget(self.view)
+
+        # ostatnie wpisy osobno dla każdego rodzaju (nr, tekst) – odfiltrowanie
+        # pomiarów nie zostawia w widoku tylko kilku ostatnich błędów
+        self._lines = defaultdict(lambda: deque(maxlen=max_lines))
+        self._seq = itertools.count()
+        self._pending = []
+        self._spill = None                      # (logger, QueueListener)
+        self._timer = QTimer(self)
+        self._timer.setInterval(flush_ms)
+        self._timer.timeout.connect(self.flush)
+        self._timer.start()
+
+    def append(self, text: str, kind: str = STATUS):
+        self._pending.append((kind, text))
+
+    def _shown(self, kind: str) -> bool:
+        chk = self.filters.get(kind)
+        return chk is None or chk.isChecked()
+
+    def flush(self):
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, []
+        for kind, text in pending:
+            self._lines[kind].append((next(self._seq), text))
+        if self._spill:
+            logger = self._spill[0]
+            for kind, text in pending:
+                logger.info("%s %s", kind, text)
+        visible = [text for kind, text in pending if self._shown(kind)]
+        if visible:
+            # starsze i tak wypadłyby z dokumentu przez maximumBlockCount
+            self.view.appendPlainText("\n".join(visible[-self.view.maximumBlockCount():]))
+
+    def refilter(self):
+        """Przebudowa widoku z pamiętanych wpisów po zmianie filtrów."""
+        self.flush()
+        shown = [lines for kind, lines in self._lines.items() if self._shown(kind)]
+        merged = list(heapq.merge(*shown))[-self.view.maximumBlockCount():]
+        self.view.setPlainText("\n".join(text for _, text in merged))
+        bar = self.view.verticalScrollBar()
+        bar.setValue(bar.maximum())
+
+    def clear(self):
+        self._pending = []
+        self._lines.clear()
+        self.view.clear()
+
+    # ---------- zapis do pliku ----------
+
+    def set_spill(self, path, max_bytes: int = SPILL_ROTATE_BYTES, backups: int = SPILL_BACKUPS):
+        """Zapis wszystkich wpisów (także odfiltrowanych) do pliku z rotacją; path=None wyłącza."""
+        self.stop_spill()
+        if not path:
+            return
+        handler = logging.handlers.RotatingFileHandler(path, maxBytes=max_bytes, backupCount=backups,
+                                                       encoding="utf-8")
+        handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+        q = queue.SimpleQueue()
+        listener = logging.handlers.QueueListener(q, handler)
+        logger = logging.getLogger(f"pt100.comm.{id(self)}")
+        logger.setLevel(logging.INFO)
+        logger.propagate = False
+        logger.addHandler(logging.handlers.QueueHandler(q))
+        listener.start()
+        self._spill = (logger, listener)
+
+    def stop_spill(self):
+        if not self._spill:
+            return
+        self.flush()
+        logger, listener = self._spill
+        self._spill = None
+        for h in list(logger.handlers):
+            logger.removeHandler(h)
+        listener.stop()
+        for h in listener.handlers:
+            h.close()
@@ -0,0 +1,217 @@
+"""
+Wczytywanie zapisanych logów do przeglądania na wykresie (bez Qt).
+
+load_log() czyta CSV (także .csv.gz) porcjami przez mmap, parsuje każdą
+porcję wektorowo i buduje dla każdego czujnika posortowane tablice NumPy
+(czas, temperatura). Pliki .ptb czytane są przez BinLogReader. Wynik
+(LogArchive) ma ten sam interfejs co HistoryStore, więc LivePlot i
+decymacja działają na nim bez zmian.
+"""
+import csv
+import gzip
+import io
+import mmap
+import os
+
+import numpy as np
+
+CHUNK_BYTES = 8 * 1024 * 1024
+
+
+class LoadCancelled(Exception):
+    pass
+
+
+class StaticSeries:
+    """Niezmienna seria czujnika – interfejs zgodny z RingBuffer (window/version/generation)."""
+    version = 0
+    generation = 0
+
+    def __init__(self, ts, values):
+        self.ts = ts
+        self.values = values
+
+    def __len__(self):
+        return len(self.ts)
+
+    def window(self, t_from=None, t_to=None):
+        lo = 0 if t_from is None else int(np.searchsorted(self.ts, t_from, side="left"))
+        hi = len(self.ts) if t_to is None else int(np.searchsorted(self.ts, t_to, side="right"))
+        return self.ts[lo:hi], self.values[lo:hi]
+
+    def last(self):
+        if not len(self.ts):
+            return None
+        return float(self.ts[-1]), float(self.values[-1])
+
+
+class LogArchive:
+    """Zawartość pliku logu: klucz czujnika -> StaticSeries, plus nazwy."""
+
+    def __init__(self, path: str, series: dict, names: dict):
+        self.path = path
+        self._series = series
+        self.names = names
+        starts = [s.ts[0] for s in series.values() if len(s)]
+        ends = [s.ts[-1] for s in series.values() if len(s)]
+        self.t_min = float(min(starts)) if starts else 0.0
+        self.t_max = float(max(ends)) if ends else 0.0
+
+    def __contains__(self, key):
+        return key in self._series
+
+    def __iter__(self):
+        return iter(self._series)
+
+    def keys(self):
+        return list(self._series)
+
+    def get(self, key):
+        return self._series.get(key)
+
+    def window(self, key, t_from=None, t_to=None):
+        s = self._series.get(key)
+        if s is None:
+            empty = np.empty(0)
+            return empty, empty
+        return s.window(t_from, t_to)
+
+    def samples(self) -> int:
+        return sum(len(s) for s in self._series.values())
+
+
+def _iter_chunks(path: str, progress=None, cancel=None):
+    """Kolejne porcje tekstu zakończone pełną linią."""
+    size = os.path.getsize(path)
+    if path.endswith(".gz"):
+        with open(path, "rb") as raw, gzip.open(raw, "rb") as f:
+            rest = b""
+            while True:
+                if cancel and cancel():
+                    raise LoadCancelled()
+                block = f.read(CHUNK_BYTES)
+                if not block:
+                    break
+                block = rest + block
+                end = block.rfind(b"\n") + 1
+                rest = block[end:]
+                if progress:
+                    progress(raw.tell() / size if size else 1.0)
+                yield block[:end].decode("utf-8", errors="replace")
+            if rest:
+                yield rest.decode("utf-8", errors="replace")
+        return
+    if size == 0:
+        return
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = 0
+        while pos < size:
+            if cancel and cancel():
+                raise LoadCancelled()
+            end = mm.find(b"\n", min(pos + CHUNK_BYTES, size - 1))
+            end = size if end < 0 else end + 1
+            yield mm[pos:end].decode("utf-8", errors="replace")
+            if hasattr(mm, "madvise") and hasattr(mmap, "MADV_DONTNEED"):
+                # przeczytane strony nie liczą się już do pamięci procesu (duże logi)
+                done = end // mmap.PAGESIZE * mmap.PAGESIZE
+                if done:
+                    mm.madvise(mmap.MADV_DONTNEED, 0, done)
+            pos = end
+            if progress:
+                progress(pos / size)
+
+
+def _parse_chunk(text: str):
+    """Porcja CSV -> (ids, epoch_ms, temp, names) jako tablice NumPy."""
+    # kolumny: timestamp_iso, epoch_ms, id, name, temp_c, source
+    text = text.replace("\r", "")
+    if "timestamp_iso" in text:
+        text = "\n".join(l for l in text.split("\n") if not l.startswith("timestamp_iso"))
+    flat = text.strip("\n").replace("\n", ",").split(",") if '"' not in text else None
+    if flat is not None and len(flat) % 6 == 0:
+        # szybka ścieżka: bez cudzysłowów każdy wiersz ma dokładnie 6 pól
+        if flat == [""]:
+            return None
+        ms_txt, ids, names, temps_col = flat[1::6], flat[2::6], flat[3::6], flat[4::6]
+    else:
+        rows = [r for r in csv.reader(io.StringIO(text)) if len(r) >= 6]
+        if not rows:
+            return None
+        cols = list(zip(*rows))
+        ms_txt, ids, names, temps_col = cols[1], cols[2], cols[3], cols[4]
+    temps_txt = [t or "nan" for t in temps_col]
+    try:
+        ms = np.array(ms_txt).astype(np.int64)
+        temps = np.array(temps_txt).astype(np.float64)
+    except ValueError:
+        # pojedyncze uszkodzone wiersze – wolniejsza ścieżka
+        ok = []
+        for i, (m, t) in enumerate(zip(ms_txt, temps_txt)):
+            try:
+                int(m); float(t); ok.append(i)
+            except ValueError:
+                pass
+        ids = [ids[i] for i in ok]; names = [names[i] for i in ok]
+        ms = np.array([int(ms_txt[i]) for i in ok], dtype=np.int64)
+        temps = np.array([float(temps_txt[i]) for i in ok], dtype=np.float64)
+    return np.array(ids), ms, temps, names
+
+
+def iter_csv(path: str, progress=None, cancel=None):
+    """Kolejne porcje logu CSV jako (ids, epoch_ms, temp, names); pusty temp_c -> NaN."""
+    for text in _iter_chunks(path, progress, cancel):
+        parsed = _parse_chunk(text)
+        if parsed is not None:
+            yield parsed
+
+
+def _load_csv(path: str, progress=None, cancel=None) -> LogArchive:
+    parts = {}      # klucz -> [(ts, temp), ...]
+    names = {}
+    for ids, ms, temps, row_names in iter_csv(path, progress, cancel):
+        keys, inv = np.unique(ids, return_inverse=True)
+        order = np.argsort(inv, kind="stable")
+        bounds = np.searchsorted(inv[order], np.arange(len(keys) + 1))
+        for k, key in enumerate(keys):
+            sel = order[bounds[k]:bounds[k + 1]]
+            parts.setdefault(str(key), []).append((ms[sel], temps[sel]))
+            name = row_names[sel[-1]]
+            if name:
+                names[str(key)] = name
+    series = {}
+    for key, chunks in parts.items():
+        ms = np.concatenate([c[0] for c in chunks])
+        temps = np.concatenate([c[1] for c in chunks])
+        if len(ms) > 1 and np.any(ms[1:] < ms[:-1]):
+            o = np.argsort(ms, kind="stable")
+            ms, temps = ms[o], temps[o]
+        series[key] = StaticSeries(ms / 1000.0, temps)
+    return LogArchive(path, series, names)
+
+
+def _load_ptb(path: str, progress=None, cancel=None) -> LogArchive:
+    from pt100_binlog import BinLogReader
+    r = BinLogReader(path)
+    names = r.sensors()
+    series = {}
+    for i, key in enumerate(names):
+        if cancel and cancel():
+            raise LoadCancelled()
+        ts, temps = r.series(key)
+        if len(ts) > 1 and np.any(ts[1:] < ts[:-1]):
+            o = np.argsort(ts, kind="stable")
+            ts, temps = ts[o], temps[o]
+        series[key] = StaticSeries(ts, temps.astype(np.float64))
+        if progress:
+            progress((i + 1) / len(names))
+    return LogArchive(path, series, {k: v for k, v in names.items() if v})
+
+
+def load_log(path: str, progress=None, cancel=None) -> LogArchive:
+    """
+    Wczytuje log CSV/.csv.gz/.ptb. progress(frac) i cancel() są opcjonalne
+    i wołane z wątku, w którym działa wczytywanie.
+    """
+    if path.lower().endswith(".ptb"):
+        return _load_ptb(path, progress, cancel)
+    return _load_csv(path, progress, cancel)
@@ -0,0 +1,384 @@
+"""
+Liczniki i histogramy opóźnień toru danych (bez zależności od Qt).
+
+Moduły rejestrują metryki w globalnym METRICS i aktualizują je raz na
+paczkę/odczyt, nie na linię – koszt to kilka operacji pod blokadą.
+Metryki z etykietami (np. port) są słownikami etykiety -> wartość.
+
+Odczyt:
+  - METRICS.render_text()  – format tekstowy Prometheusa,
+  - METRICS.snapshot()     – słownik (JSON),
+  - MetricsServer          – HTTP na localhost: /metrics (Prometheus),
+                             /metrics.json,
+  - JsonDumper             – okresowy zapis snapshot() do pliku.
+"""
+import bisect
+import json
+import os
+import threading
+import time
+
+# sekundy: od ułamka ms (parsowanie paczki) do sekund (timeouty komend)
+DEFAULT_BUCKETS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+                   0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+JSON_DUMP_INTERVAL_S = 10.0
+
+
+def _label_str(names, values) -> str:
+    if not names:
+        return ""
+    body = ",".join('%s="%s"' % (n, str(v).replace("\\", "\\\\").replace('"', '\\"'))
+                    for n, v in zip(names, values))
+    return "{" + body + "}"
+
+
+class _Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, kw) -> tuple:
+        return tuple(kw.get(n, "") for n in self.labels)
+
+    def clear(self):
+        with self._lock:
+            self._values.clear()
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def inc(self, n=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def value(self, **labels):
+        return self._values.get(self._key(labels), 0)
+
+    def items(self):
+        with self._lock:
+            return list(self._values.items())
+
+
+class Gauge(_Metric):
+    """Wartość ustawiana albo liczona przy odczycie (set_function)."""
+    kind = "gauge"
+
+    def __init__(self, name, help, labels=()):
+        super().__init__(name, help, labels)
+        self._fn = None
+
+    def set(self, v, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = v
+
+    def set_function(self, fn):
+        """fn() -> liczba albo {krotka etykiet: liczba}."""
+        self._fn = fn
+
+    def items(self):
+        if self._fn is not None:
+            try:
+                v = self._fn()
+            except Exception:
+                return []
+            return list(v.items()) if isinstance(v, dict) else [((), v)]
+        with self._lock:
+            return list(self._values.items())
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, help, labels)
+        self.buckets = tuple(buckets)
+
+    def observe(self, v: float, **labels):
+        key = self._key(labels)
+        i = bisect.bisect_left(self.buckets, v)
+        with self._lock:
+            st = self._values.get(key)
+            if st is None:
+                st = self._values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            st[0][i] += 1
+            st[1] += v
+            st[2] += 1
+
+    def time(self, **labels):
+        """with h.time(port=p): ... – mierzy czas bloku."""
+        return _Timer(self, labels)
+
+    def items(self):
+        with self._lock:
+            return [(k, (list(c), s, n)) for k, (c, s, n) in self._values.items()]
+
+    def quantile(self, q: float, **labels):
+        """Przybliżony kwantyl z kubełków (górna granica kubełka); None bez danych."""
+        with self._lock:
+            st = self._values.get(self._key(labels))
+            if not st or not st[2]:
+                return None
+            counts, n = list(st[0]), st[2]
+        rank, acc = q * n, 0
+        for i, c in enumerate(counts):
+            acc += c
+            if acc >= rank:
+                return self.buckets[i] if i < len(self.buckets) else float("inf")
+        return float("inf")
+
+
+class _Timer:
+    __slots__ = ("h", "labels", "t")
+
+    def __init__(self, h, labels):
+        self.h, self.labels = h, labels
+
+    def __enter__(self):
+        self.t = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.h.observe(time.perf_counter() - self.t, **self.labels)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def _add(self, cls, name, help, labels, **kw):
+        with self._lock:
+            m = self._metrics.get(name)
+            if m is None:
+                m = self._metrics[name] = cls(name, help, labels, **kw)
+            return m
+
+    def counter(self, name, help, labels=()) -> Counter:
+        return self._add(Counter, name, help, labels)
+
+    def gauge(self, name, help, labels=()) -> Gauge:
+        return self._add(Gauge, name, help, labels)
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS) -> Histogram:
+        return self._add(Histogram, name, help, labels, buckets=buckets)
+
+    def get(self, name):
+        return self._metrics.get(name)
+
+    def metrics(self):
+        with self._lock:
+            return list(self._metrics.values())
+
+    def render_text(self) -> str:
+        """Format tekstowy Prometheusa (text/plain; version=0.0.4)."""
+        out = []
+        for m in self.metrics():
+            out.append(f"# HELP {m.name} {m.help}")
+            out.append(f"# TYPE {m.name} {m.kind}")
+            for key, v in m.items():
+                if m.kind != "histogram":
+                    out.append(f"{m.name}{_label_str(m.labels, key)} {v}")
+                    continue
+                counts, total, n = v
+                acc = 0
+                for le, c in zip(m.buckets + (float("inf"),), counts):
+                    acc += c
+                    le_s = "+Inf" if le == float("inf") else repr(le)
+                    out.append(f"{m.name}_bucket{_label_str(m.labels + ('le',), key + (le_s,))} {acc}")
+                out.append(f"{m.name}_sum{_label_str(m.labels, key)} {total}")
+                out.append(f"{m.name}_count{_label_str(m.labels, key)} {n}")
+        return "\n".join(out) + "\n"
+
+    def snapshot(self) -> dict:
+        """{nazwa: [{"labels": {...}, "value": v}|{..., "count", "sum", "p50", "p95", "p99"}]}"""
+        snap = {"time": time.time()}
+        for m in self.metrics():
+            rows = []
+            for key, v in m.items():
+                labels = dict(zip(m.labels, key))
+                if m.kind == "histogram":
+                    counts, total, n = v
+                    qs = {f"p{int(q * 100)}": m.quantile(q, **labels) for q in (0.5, 0.95, 0.99)}
+                    # JSON nie ma nieskończoności – jak "le" w Prometheusie
+                    qs = {k: "+Inf" if v == float("inf") else v for k, v in qs.items()}
+                    rows.append({"labels": labels, "count": n, "sum": total, **qs})
+                else:
+                    rows.append({"labels": labels, "value": v})
+            snap[m.name] = rows
+        return snap
+
+
+METRICS = Registry()
+
+
+class Window:
+    """
+    Różnice między kolejnymi tick(): tempo liczników [1/s] i kwantyle
+    histogramów z ostatniego okna – do panelu stanu („co dzieje się teraz”).
+    """
+
+    def __init__(self, registry: Registry = METRICS):
+        self.registry = registry
+        self.dt = 0.0
+        self._t = None
+        self._cur = self._prev = {}
+
+    def tick(self):
+        now = time.monotonic()
+        self.dt = now - self._t if self._t is not None else 0.0
+        self._t = now
+        self._prev = self._cur
+        self._cur = {m.name: (m, dict(m.items())) for m in self.registry.metrics()
+                     if m.kind in ("counter", "histogram")}
+
+    def _delta(self, name, key):
+        m, cur = self._cur.get(name, (None, {}))
+        prev = self._prev.get(name, (None, {}))[1]
+        return m, cur.get(key), prev.get(key)
+
+    def rate(self, name, **labels) -> float:
+        m = self.registry.get(name)
+        if m is None or not self.dt:
+            return 0.0
+        _, cur, prev = self._delta(name, m._key(labels))
+        return ((cur or 0) - (prev or 0)) / self.dt
+
+    def total_rate(self, name) -> dict:
+        """Tempo dla każdej kombinacji etykiet: {krotka: 1/s}."""
+        if not self.dt or name not in self._cur:
+            return {}
+        prev = self._prev.get(name, (None, {}))[1]
+        return {k: (v - prev.get(k, 0)) / self.dt for k, v in self._cur[name][1].items()}
+
+    def quantile(self, name, q: float, **labels):
+        """Kwantyl z obserwacji od poprzedniego tick(); None, gdy ich nie było."""
+        m = self.registry.get(name)
+        if m is None:
+            return None
+        _, cur, prev = self._delta(name, m._key(labels))
+        if cur is None:
+            return None
+        counts = [c - p for c, p in zip(cur[0], prev[0])] if prev else cur[0]
+        n = sum(counts)
+        if not n:
+            return None
+        acc = 0
+        for i, c in enumerate(counts):
+            acc += c
+            if acc >= q * n:
+                return m.buckets[i] if i < len(m.buckets) else float("inf")
+        return float("inf")
+
+
+def _ms(v) -> str:
+    if v is None:
+        return "-"
+    return ">10 s" if v == float("inf") else f"{v * 1000:g} ms"
+
+
+def format_status(win: Window) -> str:
+    """Jedna linia stanu toru danych z okna `win` (GUI: panel, headless: --stats)."""
+    reg = win.registry
+
+    def total(name):
+        m = reg.get(name)
+        return sum(v for _, v in m.items()) if m else 0
+
+    parts = []
+    rx = win.total_rate("pt100_rx_bytes_total")
+    for (port,), r in sorted(win.total_rate("pt100_records_total").items()):
+        parts.append(f"{port}: {r:.0f} rec/s {rx.get((port,), 0.0) / 1024:.1f} kB/s")
+    parts.append(f"parse err {total('pt100_parse_errors_total')}, io err {total('pt100_io_errors_total')}, "
+                 f"cmd timeouts {total('pt100_command_timeouts_total')}")
+    # kwantyle to górne granice kubełków histogramu
+    q = [("ingest", "pt100_ingest_delay_seconds"), ("batch", "pt100_batch_seconds"),
+         ("lag", "pt100_gui_lag_seconds"), ("plot", "pt100_plot_frame_seconds"),
+         ("csv", "pt100_csv_write_seconds")]
+    parts.append("p95 " + ", ".join(f"{label} {_ms(win.quantile(name, 0.95))}"
+                                    for label, name in q if reg.get(name) is not None))
+    if reg.get("pt100_csv_queue") is not None:
+        parts.append(f"csv queue {total('pt100_csv_queue')}")
+    if reg.get("pt100_history_bytes") is not None:
+        parts.append(f"history {total('pt100_history_bytes') / 1e6:.1f} MB")
+    return " | ".join(parts)
+
+
+# ---------- eksport ----------
+
+class MetricsServer:
+    """HTTP na localhost w wątku tła: /metrics (Prometheus) i /metrics.json."""
+
+    def __init__(self, registry: Registry = METRICS, port: int = 9101, host: str = "127.0.0.1"):
+        # http.server (z email, html…) tylko wtedy, gdy endpoint jest włączony
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        registry_ = registry
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path in ("/", "/metrics"):
+                    body, ctype = registry_.render_text(), "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body, ctype = json.dumps(registry_.snapshot()), "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                data = body.encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", ctype)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def log_message(self, *args):
+                pass
+
+        self.httpd = ThreadingHTTPServer((host, port), Handler)
+        self.httpd.daemon_threads = True
+        self.port = self.httpd.server_address[1]
+        self._thread = threading.Thread(target=self.httpd.serve_forever, name="metrics_http", daemon=True)
+        self._thread.start()
+
+    def close(self):
+        self.httpd.shutdown()
+        self.httpd.server_close()
+
+
+class JsonDumper:
+    """Co `interval` s zapisuje snapshot() do pliku (atomowo: plik tymczasowy + rename)."""
+
+    def __init__(self, path: str, interval: float = JSON_DUMP_INTERVAL_S, registry: Registry = METRICS):
+        self.path = path
+        self.interval = interval
+        self.registry = registry
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._loop, name="metrics_json", daemon=True)
+        self._thread.start()
+
+    def dump(self):
+        tmp = self.path + ".tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(self.registry.snapshot(), f)
+        os.replace(tmp, self.path)
+
+    def _loop(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.dump()
+            except OSError:
+                pass
+
+    def close(self):
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.dump()
+        except OSError:
+            pass
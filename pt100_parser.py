@@ -0,0 +1,174 @@
+"""
+Szybki parser linii firmware (wątek czytający).
+
+Prawie cały ruch to kilka stałych kształtów z LineHandler.cpp/main.cpp:
+"Interval: N", auto-raport {"id":N,"name":"..","t":T}, odpowiedź na READ
+(to samo z "ok":true na początku) i {"ok":true} / {"ok":false,"err":".."}.
+Dla nich parse_line() używa prekompilowanych wyrażeń dopasowanych do
+całej linii – bez json.loads, słownika pośredniego i (przy "Interval:")
+bez wyjątku. Wszystko, co nie pasuje dokładnie (inna kolejność pól,
+escape w nazwie, "nan", nowe klucze), idzie przez pełny parser
+pt100_protocol.parse_line, więc wynik jest zawsze taki sam jak tam.
+LIST też idzie przez json.loads – słowniki elementów buduje on w C
+szybciej niż dopasowanie wyrażeń (patrz mikro-benchmark).
+
+parse_block() parsuje całą porcję bajtów z portu jednym dekodowaniem,
+parse_stream() – porcję z ramkami binarnymi (MODE fmt=bin).
+
+    python pt100_parser.py              # mikro-benchmark: json vs szybka ścieżka
+    python pt100_parser.py -n 200000
+"""
+import re
+
+from pt100_protocol import (FRAME_SIZE, FRAME_SYNC, Other, Reply, Sample,
+                            decode_frame, parse_line as parse_line_json)
+
+# fragmenty wyrażeń – tylko postać, którą drukuje firmware (liczby bez zer
+# wiodących, t zawsze z częścią ułamkową: Serial.print(t, 2))
+_INT = r"(?:0|[1-9]\d*)"
+_NUM = r"-?(?:0|[1-9]\d*)\.\d+"
+_STR = r'[^"\\\x00-\x1f]*'
+
+_REPORT = re.compile(
+    rf'\{{(?:"ok":(true),)?"id":({_INT}),"name":"({_STR})","t":({_NUM})'
+    rf'(?:,"e":{_NUM})?\}}'     # "e" – znacznik czasu symulatora (--stamp)
+).fullmatch
+# {"ok":true,"fmt":"bin"} (MODE) to też zwykły Reply bez err
+_REPLY = re.compile(rf'\{{"ok":(true|false)(?:,"err":"({_STR})"|,"fmt":"[a-z]+")?\}}').fullmatch
+
+
+def parse_line(line: str, ts: float, dev: str = ""):
+    """Jak pt100_protocol.parse_line, ale ze szybką ścieżką dla znanych kształtów."""
+    line = line.strip()
+    if not line:
+        return None
+    # najwyżej jedno wyrażenie na linię – wybór po kluczu na początku linii
+    key = line[2:4]
+    if key == "id" or (key == "ok" and line.startswith(',"id":', 10)):
+        m = _REPORT(line)
+        if m:
+            ok, sid, name, t = m.groups()
+            return Sample(ts, sid, name, None, float(t), "read" if ok else "interval", line, dev)
+    elif key == "ok":
+        m = _REPLY(line)
+        if m:
+            return Reply(ts, m.group(1) == "true", m.group(2), line, dev)
+    elif line.startswith("Interval:"):
+        return Other(ts, None, line, dev)   # json.loads i tak by go odrzucił
+    return parse_line_json(line, ts, dev)
+
+
+def parse_lines(lines, ts: float, dev: str = "") -> list:
+    """Lista linii -> rekordy (puste linie pominięte)."""
+    out = []
+    append = out.append
+    for line in lines:
+        rec = parse_line(line, ts, dev)
+        if rec is not None:
+            append(rec)
+    return out
+
+
+def parse_block(data, ts: float, dev: str = "") -> list:
+    """Bajty pełnych linii (bez ostatniego '\\n') -> rekordy; jedno dekodowanie na porcję."""
+    return parse_lines(data.decode(errors="replace").split("\n"), ts, dev)
+
+
+def parse_stream(buf, ts: float, dev: str = ""):
+    """
+    Mieszany strumień (linie tekstu + ramki binarne) -> (rekordy, zużyte bajty).
+
+    Ramka zaczyna się bajtem FRAME_SYNC na granicy rekordu – na początku
+    bufora, po '\n' albo po poprzedniej ramce (firmware nie przerywa linii
+    ramką). Wewnątrz linii 0xA5 to zwykły bajt UTF-8 (np. 'ť' = C5 A5).
+    Ramka z błędną sumą zostaje pominięta bajt po bajcie; dopiero wtedy
+    śmieci przed kolejnym FRAME_SYNC są odrzucane (także na końcu bufora).
+    Niepełny ostatni rekord zostaje w buforze.
+    """
+    out = []
+    pos, n = 0, len(buf)
+    sync = bytes([FRAME_SYNC])
+    resync = False          # po uszkodzonej ramce – granica rekordu nieznana
+    while pos < n:
+        if buf[pos] == FRAME_SYNC:
+            if n - pos < FRAME_SIZE:
+                break
+            rec = decode_frame(buf[pos:pos + FRAME_SIZE], ts, dev)
+            if rec is None:
+                pos += 1
+                resync = True
+                continue
+            out.append(rec)
+            pos += FRAME_SIZE
+            resync = False
+            continue
+        end = buf.find(b"\n", pos)
+        if resync:
+            s = buf.find(sync, pos, end if end >= 0 else n)
+            if s >= 0:
+                pos = s     # śmieci (np. resztka uszkodzonej ramki) przed ramką
+                continue
+            if end < 0:
+                pos = n     # ...także bez końca linii – kolejna porcja zaczyna od granicy
+                break
+        if end < 0:
+            break
+        rec = parse_line(buf[pos:end].decode(errors="replace"), ts, dev)
+        if rec is not None:
+            out.append(rec)
+        pos = end + 1
+        resync = False
+    return out, pos
+
+
+# ---------- mikro-benchmark ----------
+
+SAMPLES = {
+    "interval": "Interval: 1000\r",
+    "report": '{"id":3,"name":"Kociol","t":21.53}\r',
+    "read": '{"ok":true,"id":3,"name":"Kociol","t":-4.07}\r',
+    "ok": '{"ok":true}\r',
+    "err": '{"ok":false,"err":"no_such_id"}\r',
+    "list8": '{"s":[' + ",".join(f'{{"id":{i},"name":"S{i}","pin":{14 + i % 6},"active":1}}'
+                                 for i in range(8)) + ']}\r',
+    "mode": '{"ok":true,"fmt":"bin"}\r',
+    "fallback": '{"hello":"ready"}\r',
+}
+
+
+def _bench(n: int):
+    import time
+
+    def per_line(fn, lines, reps):
+        t = time.perf_counter()
+        for _ in range(reps):
+            fn(lines)
+        return (time.perf_counter() - t) / (reps * len(lines)) * 1e9
+
+    def old_batch(lines):
+        # dotychczasowa ścieżka czytnika: dekodowanie i json.loads linia po linii
+        return [r for r in (parse_line_json(l.decode(errors="replace"), 0.0, "p") for l in lines)
+                if r is not None]
+
+    def new_batch(lines):
+        return parse_block(b"\n".join(lines), 0.0, "p")
+
+    print(f"{'shape':<10}{'json ns':>10}{'fast ns':>10}{'speedup':>9}")
+    for name, line in SAMPLES.items():
+        raw = line.encode()
+        assert parse_line(line, 0.0, "p") == parse_line_json(line, 0.0, "p"), name
+        lines = [raw] * 100
+        reps = max(1, n // 100)
+        a, b = per_line(old_batch, lines, reps), per_line(new_batch, lines, reps)
+        print(f"{name:<10}{a:>10.0f}{b:>10.0f}{a / b:>8.1f}x")
+    # typowy strumień auto-raportów: "Interval: N" + raport na przemian
+    mixed = [SAMPLES["interval"].encode(), SAMPLES["report"].encode()] * 50
+    a, b = per_line(old_batch, mixed, max(1, n // 100)), per_line(new_batch, mixed, max(1, n // 100))
+    print(f"{'mixed':<10}{a:>10.0f}{b:>10.0f}{a / b:>8.1f}x")
+
+
+if __name__ == "__main__":
+    import argparse
+    ap = argparse.ArgumentParser(description="PT100 – mikro-benchmark parsera linii")
+    ap.add_argument("-n", type=int, default=100000, help="linii na kształt")
+    _bench(ap.parse_args().n)
@@ -0,0 +1,395 @@
+"""
+Wykres na żywo: trwałe artysty Line2D + blitting warstwy danych.
+
+Dane przechodzą przez decymację min/max (pt100_decimate), więc do
+matplotlib trafiają ~2 punkty na piksel niezależnie od okna. Oś X to
+liczby (dni matplotlib wyliczane wprost z epoch), więc nie ma konwersji
+na datetime przy każdej klatce. Pełne przerysowanie (osie,
+siatka, etykiety) następuje tylko przy zmianie limitów; pozostałe klatki
+to restore_region + draw_artist + blit, i to tylko gdy przyszły nowe próbki.
+
+OverviewPlot pokazuje wiele czujników na jednym płótnie – nakładane
+przebiegi albo małe wykresy ze wspólną osią czasu – według tych samych
+zasad: decymacja i set_data tylko dla czujników z nowymi próbkami.
+"""
+import math
+import datetime
+
+import numpy as np
+import matplotlib
+import matplotlib.dates as mdates
+from matplotlib.ticker import MaxNLocator, NullLocator
+from matplotlib.backends.backend_qt5agg import FigureCanvasQTAgg as FigureCanvas
+from matplotlib.colors import to_rgba
+from matplotlib.figure import Figure
+from matplotlib.transforms import Bbox
+
+from pt100_decimate import Decimator
+
+# epoch [s] -> liczba dni matplotlib
+_EPOCH_DAYS = mdates.date2num(datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc))
+_LOCAL_TZ = datetime.datetime.now().astimezone().tzinfo
+
+X_STEP_FRACTION = 0.1   # o ile okna przesuwa się oś X przy przewinięciu
+Y_PAD_FRACTION = 0.1
+Y_SHRINK_BELOW = 0.5    # zawęź oś Y, gdy dane zajmują mniej niż tyle jej zakresu
+OVERVIEW_MAX_TRACES = 100
+OVERLAY_LEGEND_MAX = 12     # legenda tylko przy niewielu przebiegach
+GRID_ASPECT = 2.5           # kolumn na wiersz małych wykresów (obszar wykresu jest szeroki)
+
+
+def epoch_to_num(ts):
+    return np.asarray(ts, dtype=np.float64) / 86400.0 + _EPOCH_DAYS
+
+
+def _time_axis(ax, maxticks=None):
+    # lokatory/formatery ustawiane raz, a nie przy każdej klatce
+    kw = {} if maxticks is None else {"minticks": 1, "maxticks": maxticks}
+    ax.xaxis.set_major_locator(mdates.AutoDateLocator(tz=_LOCAL_TZ, **kw))
+    ax.xaxis.set_major_formatter(mdates.DateFormatter('%H:%M:%S', tz=_LOCAL_TZ))
+    ax.tick_params(axis="x", labelrotation=20)
+
+
+def _data_range(ys):
+    """(min, max) skończonych wartości albo None."""
+    if not len(ys):
+        return None
+    ymin, ymax = float(np.nanmin(ys)), float(np.nanmax(ys))
+    if not (math.isfinite(ymin) and math.isfinite(ymax)):
+        return None
+    return ymin, ymax
+
+
+def _y_limits(rng, current):
+    """Zakres osi Y dla danych `rng`; bieżący zostaje, póki dane go wypełniają."""
+    if rng is None:
+        return current
+    ymin, ymax = rng
+    if current is not None:
+        lo, hi = current
+        if lo <= ymin and ymax <= hi and (ymax - ymin) >= (hi - lo) * Y_SHRINK_BELOW:
+            return current
+    pad = (ymax - ymin) * Y_PAD_FRACTION if ymax != ymin else 0.5
+    return ymin - pad, ymax + pad
+
+
+class LivePlot:
+    def __init__(self):
+        self.fig = Figure(figsize=(5, 3))
+        self.canvas = FigureCanvas(self.fig)
+        self.ax = self.fig.add_subplot(111)
+        self.ax.set_xlabel("time [HH:MM:SS]")
+        self.ax.set_ylabel("temp [°C]")
+        self.ax.grid(True, alpha=0.3)
+        _time_axis(self.ax)
+        # Zwiększ margines na dole, aby podpisy czasu nie nachodziły na log
+        self.fig.subplots_adjust(bottom=0.22)
+
+        self.line, = self.ax.plot([], [], linewidth=1.5, animated=True)
+        self._bg = None
+        self._source = None  # HistoryStore albo LogArchive
+        self._sid = None
+        self._version = None
+        self._xlim = None   # w sekundach epoch
+        self._ylim = None
+        self.decimator = Decimator()
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    # ---------- blitting ----------
+
+    def _on_draw(self, event):
+        # po pełnym rysowaniu zapamiętaj tło (bez linii) i dorysuj linię
+        self._bg = self.canvas.copy_from_bbox(self.ax.bbox)
+        self.ax.draw_artist(self.line)
+
+    def _blit(self):
+        self.canvas.restore_region(self._bg)
+        self.ax.draw_artist(self.line)
+        self.canvas.blit(self.ax.bbox)
+
+    # ---------- limity ----------
+
+    @staticmethod
+    def _x_limits(now: float, window_s: float):
+        # prawa krawędź skacze co X_STEP_FRACTION okna -> rzadkie pełne przerysowania
+        step = max(1.0, window_s * X_STEP_FRACTION)
+        right = math.ceil(now / step) * step
+        return right - window_s - step, right
+
+    def _y_limits(self, ys):
+        return _y_limits(_data_range(ys), self._ylim)
+
+    # ---------- API ----------
+
+    def update(self, sid, hist, window_s: float, now: float) -> bool:
+        """
+        Odświeża wykres dla czujnika `sid`. Zwraca True, jeśli coś narysowano.
+        Bez nowych próbek i bez zmiany limitów nie robi nic. `hist` to
+        HistoryStore (na żywo) albo LogArchive (log z pliku); `now` to prawa
+        krawędź widoku.
+        """
+        buf = hist.get(sid) if sid is not None else None
+        version = buf.version if buf is not None else None
+        xlim = self._x_limits(now, window_s)
+        if (hist is self._source and sid == self._sid and version == self._version
+                and xlim == self._xlim and self._bg is not None):
+            return False
+
+        full = sid != self._sid or self._bg is None
+        if hist is not self._source:
+            self._source = hist
+            self.decimator.invalidate()
+            full = True
+        if buf is None:
+            ts = ys = np.empty(0)
+        else:
+            # ~1 punkt min/max na piksel szerokości osi
+            pixels = int(self.ax.bbox.width) or 1000
+            ts, ys = self.decimator.window(sid, buf, xlim[0], xlim[1] - xlim[0], pixels, xlim[1])
+        self.line.set_data(epoch_to_num(ts), np.array(ys))
+
+        if xlim != self._xlim:
+            self._xlim = xlim
+            self.ax.set_xlim(float(epoch_to_num(xlim[0])), float(epoch_to_num(xlim[1])))
+            full = True
+        ylim = self._y_limits(ys)
+        if ylim is not None and ylim != self._ylim:
+            self._ylim = ylim
+            self.ax.set_ylim(*ylim)
+            full = True
+
+        self._sid = sid
+        self._version = version
+        if full:
+            self.canvas.draw_idle()   # _on_draw odświeży tło i dorysuje linię
+        else:
+            self._blit()
+        return True
+
+
+class OverviewPlot:
+    """
+    Wiele czujników na jednym płótnie: przebiegi nałożone na jedne osie
+    ("overlay") albo małe wykresy ze wspólną osią czasu ("grid"). Artysty
+    są trwałe, a decymacja i set_data dotyczą wyłącznie czujników ze
+    zmienioną historią.
+
+    Overlay: klatka bez zmiany limitów to jedno restore_region +
+    draw_artist wszystkich linii + blit. Grid: pełne rysowanie dziesiątek
+    osi trwa setki ms (głównie tekst podziałek), więc odbywa się tylko po
+    przebudowie i zmianie rozmiaru. Osie nie mają etykiet Y (zakres jest
+    w podpisie) ani pionowej siatki, a podziałkę czasu ma tylko ostatni
+    wiersz – wnętrze osi nie zależy więc od osi X. Zmiana limitu Y
+    przerysowuje same te osie, przesunięcie osi X tylko pas podziałki pod
+    ostatnim wierszem; pozostałe klatki to blit osi czujników z nowymi
+    próbkami.
+    """
+
+    def __init__(self, mode: str = "overlay"):
+        self.fig = Figure(figsize=(5, 3))
+        self.canvas = FigureCanvas(self.fig)
+        self.mode = mode
+        self.decimator = Decimator()
+        self._built = None          # (tryb, klucze, etykiety) zbudowanych osi
+        self._axes = []
+        self._lines = {}            # klucz -> Line2D
+        self._ax_of = {}            # klucz -> osie
+        self._line_of = {}          # osie -> Line2D (grid)
+        self._range_of = {}         # osie -> Text z zakresem osi Y (grid)
+        self._time_axes = []        # osie grid z podziałką czasu (ostatni wiersz)
+        self._versions = {}         # klucz -> wersja narysowanej historii
+        self._ranges = {}           # klucz -> (min, max) narysowanych danych
+        self._ylim = {}             # osie -> limity Y
+        self._bg = {}               # osie -> tło bez linii
+        self._source = None
+        self._xlim = None
+        self.canvas.mpl_connect("draw_event", self._on_draw)
+
+    # ---------- budowa ----------
+
+    def _build(self, keys, labels):
+        self.fig.clear()
+        self._axes, self._lines, self._ax_of = [], {}, {}
+        self._line_of, self._range_of, self._time_axes = {}, {}, []
+        self._versions.clear(); self._ranges.clear(); self._ylim.clear(); self._bg.clear()
+        self._xlim = None
+        n = len(keys)
+        if self.mode == "grid" and n:
+            cols = max(1, min(n, math.ceil(math.sqrt(n * GRID_ASPECT))))
+            rows = math.ceil(n / cols)
+            flat = list(self.fig.subplots(rows, cols, squeeze=False).flat)
+            for ax in flat[n:]:
+                ax.remove()
+            for i, (key, ax) in enumerate(zip(keys, flat)):
+                if i >= (rows - 1) * cols:
+                    _time_axis(ax, maxticks=3)
+                    ax.tick_params(axis="x", labelsize=6)
+                    self._time_axes.append(ax)
+                else:
+                    ax.xaxis.set_major_locator(NullLocator())
+                ax.yaxis.set_major_locator(MaxNLocator(3))
+                ax.tick_params(axis="y", direction="in", labelleft=False)
+                ax.grid(True, axis="y", alpha=0.3)
+                ax.text(0.01, 0.97, labels.get(key, key), transform=ax.transAxes,
+                        fontsize=7, va="top", ha="left", clip_on=True)
+                self._range_of[ax] = ax.text(0.01, 0.03, "", transform=ax.transAxes, fontsize=6,
+                                             color="0.4", va="bottom", ha="left", clip_on=True)
+                self._lines[key], = ax.plot([], [], linewidth=1.0, animated=True)
+                self._line_of[ax] = self._lines[key]
+                self._ax_of[key] = ax
+                self._axes.append(ax)
+            self.fig.subplots_adjust(left=0.01, right=0.99, top=0.98, bottom=0.12, hspace=0.15, wspace=0.05)
+        else:
+            ax = self.fig.add_subplot(111)
+            ax.set_xlabel("time [HH:MM:SS]")
+            ax.set_ylabel("temp [°C]")
+            ax.grid(True, alpha=0.3)
+            _time_axis(ax)
+            cmap = matplotlib.colormaps["tab10" if n <= 10 else "turbo"]
+            for i, key in enumerate(keys):
+                color = cmap(i) if n <= 10 else cmap(i / max(1, n - 1))
+                self._lines[key], = ax.plot([], [], linewidth=1.0, color=color, animated=True,
+                                            label=labels.get(key, key))
+                self._ax_of[key] = ax
+            if 0 < n <= OVERLAY_LEGEND_MAX:
+                ax.legend(loc="upper left", fontsize=7, ncol=min(n, 4))
+            self._axes = [ax]
+            self.fig.subplots_adjust(bottom=0.22)
+        self._built = (self.mode, keys, labels)
+
+    # ---------- blitting ----------
+
+    def _on_draw(self, event):
+        for ax in self._axes:
+            self._bg[ax] = self.canvas.copy_from_bbox(ax.bbox)
+        for line in self._lines.values():
+            line.axes.draw_artist(line)
+
+    def _blit(self, keys):
+        if self.mode == "grid":
+            for key in keys:
+                ax = self._ax_of[key]
+                self.canvas.restore_region(self._bg[ax])
+                ax.draw_artist(self._lines[key])
+                self.canvas.blit(ax.bbox)
+            return
+        # overlay: linie nachodzą na siebie – jedno przejście przez wszystkie
+        ax = self._axes[0]
+        self.canvas.restore_region(self._bg[ax])
+        for line in self._lines.values():
+            ax.draw_artist(line)
+        self.canvas.blit(ax.bbox)
+
+    def _clear(self, x0, y0, x1, y1):
+        """Zamalowuje prostokąt (piksele, początek u dołu) kolorem tła figury."""
+        buf = np.asarray(self.canvas.buffer_rgba())
+        h, w = buf.shape[:2]
+        x0, y0 = max(0, int(x0)), max(0, int(y0))
+        x1, y1 = min(w, math.ceil(x1)), min(h, math.ceil(y1))
+        buf[h - y1:h - y0, x0:x1] = np.round(np.array(to_rgba(self.fig.get_facecolor())) * 255)
+        return Bbox.from_extents(x0, y0, x1, y1)
+
+    def _redraw_axes(self, ax):
+        """Przerysowuje jedne osie grid (bez podziałki czasu pod nimi)."""
+        box = self._clear(*ax.bbox.padded(1).extents)
+        ax.xaxis.set_visible(False)
+        try:
+            ax.draw(self.canvas.get_renderer())
+        finally:
+            ax.xaxis.set_visible(True)
+        self._bg[ax] = self.canvas.copy_from_bbox(ax.bbox)
+        ax.draw_artist(self._line_of[ax])
+        self.canvas.blit(box)
+
+    def _redraw_time_axis(self):
+        """Przerysowuje pas podziałki czasu pod ostatnim wierszem grid."""
+        box = self._clear(0, 0, self.fig.bbox.width, min(ax.bbox.y0 for ax in self._time_axes) - 1)
+        renderer = self.canvas.get_renderer()
+        for ax in self._time_axes:
+            ax.xaxis.draw(renderer)
+        self.canvas.blit(box)
+
+    def _set_ylim(self, ax, ylim):
+        self._ylim[ax] = ylim
+        ax.set_ylim(*ylim)
+        if ax in self._range_of:
+            self._range_of[ax].set_text(f"{ylim[0]:.1f}…{ylim[1]:.1f} °C")
+
+    # ---------- API ----------
+
+    def update(self, keys, hist, window_s: float, now: float, labels=None) -> bool:
+        """
+        Odświeża przebiegi czujników `keys` (najwyżej OVERVIEW_MAX_TRACES).
+        Zwraca True, jeśli coś narysowano; `hist` i `now` jak w LivePlot.update.
+        """
+        keys = list(keys)[:OVERVIEW_MAX_TRACES]
+        labels = labels or {}
+        full = False
+        if self._built != (self.mode, keys, labels):
+            self._build(keys, labels)
+            full = True
+        if hist is not self._source:
+            self._source = hist
+            self.decimator.invalidate()
+            self._versions.clear()
+            full = True
+        if not keys:
+            if full:
+                self.canvas.draw_idle()
+            return full
+        full = full or not self._bg
+        grid = self.mode == "grid"
+        moved = False
+        xlim = LivePlot._x_limits(now, window_s)
+        if xlim != self._xlim:
+            self._xlim = xlim
+            for ax in self._axes:
+                ax.set_xlim(float(epoch_to_num(xlim[0])), float(epoch_to_num(xlim[1])))
+            self._versions.clear()      # okno przesunięte – przelicz wszystkie przebiegi
+            moved = True
+
+        changed = []
+        for key in keys:
+            buf = hist.get(key)
+            version = buf.version if buf is not None else None
+            if key in self._versions and self._versions[key] == version:
+                continue
+            self._versions[key] = version
+            if buf is None:
+                ts = ys = np.empty(0)
+            else:
+                # ~1 punkt min/max na piksel szerokości osi
+                pixels = int(self._ax_of[key].bbox.width) or 500
+                ts, ys = self.decimator.window(key, buf, xlim[0], xlim[1] - xlim[0], pixels, xlim[1])
+            self._lines[key].set_data(epoch_to_num(ts), np.asarray(ys))
+            self._ranges[key] = _data_range(ys)
+            changed.append(key)
+        if not changed and not full and not moved:
+            return False
+
+        rescaled = []
+        if grid:
+            for key in changed:
+                ax = self._ax_of[key]
+                ylim = _y_limits(self._ranges[key], self._ylim.get(ax))
+                if ylim is not None and ylim != self._ylim.get(ax):
+                    self._set_ylim(ax, ylim)
+                    rescaled.append(ax)
+        elif changed:
+            ranges = [r for r in self._ranges.values() if r is not None]
+            ax = self._axes[0]
+            rng = (min(r[0] for r in ranges), max(r[1] for r in ranges)) if ranges else None
+            ylim = _y_limits(rng, self._ylim.get(ax))
+            if ylim is not None and ylim != self._ylim.get(ax):
+                self._set_ylim(ax, ylim)
+                rescaled.append(ax)
+
+        if full or (not grid and (moved or rescaled)):
+            self.canvas.draw_idle()     # _on_draw odświeży tła i dorysuje linie
+            return True
+        for ax in rescaled:
+            self._redraw_axes(ax)
+        if moved:
+            self._redraw_time_axis()
+        self._blit([k for k in changed if self._ax_of[k] not in rescaled])
+        return True
@@ -0,0 +1,251 @@
+"""
+Harmonogram odpytywania czujników (READ) po stronie hosta, bez Qt.
+
+Każdy czujnik ma okres docelowy (domyślny albo własny; okres domyślny 0 =
+odpytywane są tylko czujniki z własnym okresem). Czasy odczytów
+leżą na stałej siatce (wielokrotności okresu + przesunięcie), a
+przesunięcia czujników jednego portu są rozłożone równo w okresie – READ
+nie idą paczką, a próbki kolejnych cykli są w równych odstępach.
+
+Okres efektywny = okres docelowy x mnożniki:
+  - łącze: zajętość portu liczona z baud (bajty odpowiedzi + czas ADC
+    ReadTemp + auto-raporty widziane w strumieniu); gdy zapotrzebowanie
+    przekracza LINK_TARGET_UTIL, okresy wszystkich czujników portu rosną,
+  - błędy: timeout (CommandTimeout) albo ok:false podwaja okres czujnika (do MAX_BACKOFF),
+    poprawna odpowiedź go przywraca,
+  - adaptive (opcjonalnie): czujnik, którego temperatura szybko się zmienia,
+    jest czytany częściej, stabilny – rzadziej.
+tick(now) wysyła READ, które są już należne; wołany co ~50–100 ms.
+Czujniki portu bez połączenia (ready_of(port) == False) czekają; po
+ponownym połączeniu (rekord Link) ich backoff wraca do 1.
+"""
+import math
+import threading
+import time
+
+from pt100_protocol import Link, Reply, Sample, split_key, wire_bytes
+
+DEFAULT_PERIOD_S = 5.0
+MIN_PERIOD_S = 0.1
+MAX_PERIOD_S = 3600.0
+LINK_TARGET_UTIL = 0.7      # jaką część łącza/czasu płytki może zająć odpytywanie + auto-raporty
+READ_REPLY_BYTES = 45       # {"ok":true,"id":N,"name":"...","t":xx.xx}\r\n – do pierwszego pomiaru
+ADC_S = 0.007               # ReadTemp: 63 x analogRead
+MAX_BACKOFF = 32
+MAX_PENDING = 8             # komend w kolejce portu, powyżej których READ czekają
+FAST_DELTA_C = 0.2          # adaptive: docelowa zmiana temperatury między odczytami
+ADAPT_RANGE = (0.25, 4.0)   # adaptive: granice mnożnika okresu
+RATE_EWMA_S = 5.0           # stała czasowa pomiaru ruchu na łączu
+
+
+class _Sensor:
+    __slots__ = ("key", "port", "sid", "period", "offset", "next_due", "future",
+                 "backoff", "mult", "last", "slope")
+
+    def __init__(self, key: str, period):
+        self.key = key
+        self.port, self.sid = split_key(key)
+        self.period = period        # None = okres domyślny
+        self.offset = 0.0
+        self.next_due = None
+        self.future = None
+        self.backoff = 1
+        self.mult = 1.0             # adaptive
+        self.last = None            # (ts, t)
+        self.slope = None           # |dT/dt| [°C/s], EWMA
+
+
+class _Link:
+    __slots__ = ("rx_bps", "other_bps", "reply_bytes", "stretch", "_rx", "_other", "_t")
+
+    def __init__(self, now):
+        self.rx_bps = 0.0           # wszystkie bajty od urządzenia [B/s]
+        self.other_bps = 0.0        # bez odpowiedzi na nasze READ (auto-raporty itd.)
+        self.reply_bytes = READ_REPLY_BYTES
+        self.stretch = 1.0
+        self._rx = self._other = 0
+        self._t = now
+
+
+class PollScheduler:
+    def __init__(self, command, baud_of=None, period: float = DEFAULT_PERIOD_S,
+                 adaptive: bool = False, pending_of=None, ready_of=None):
+        self.command = command      # command(line, port, callback=...) -> Future
+        self.baud_of = baud_of or (lambda port: 9600)
+        self.pending_of = pending_of or (lambda port: 0)
+        self.ready_of = ready_of or (lambda port: True)
+        self.period = period
+        self.adaptive = adaptive
+        self.enabled = False
+        self._sensors = {}
+        self._links = {}
+        self._lock = threading.Lock()
+        self.reads_sent = 0
+        self.errors = 0
+
+    # ---------- konfiguracja ----------
+
+    def set_sensors(self, keys):
+        """Lista odpytywanych czujników (np. po LIST); własne okresy zostają."""
+        with self._lock:
+            keys = list(keys)
+            self._sensors = {k: self._sensors.get(k) or _Sensor(k, None) for k in keys}
+            self._respread()
+
+    def set_period(self, key=None, period=None):
+        """Okres domyślny (key=None) albo własny okres czujnika (period=None -> domyślny)."""
+        with self._lock:
+            if key is None:
+                self.period = max(MIN_PERIOD_S, float(period)) if period else 0.0
+            else:
+                s = self._sensors.get(key) or self._sensors.setdefault(key, _Sensor(key, None))
+                s.period = None if period is None else max(MIN_PERIOD_S, float(period))
+            self._respread()
+
+    def set_enabled(self, on: bool):
+        with self._lock:
+            self.enabled = on
+            for s in self._sensors.values():
+                s.next_due = None
+
+    def _respread(self):
+        by_port = {}
+        for s in self._sensors.values():
+            by_port.setdefault(s.port, []).append(s)
+        for sensors in by_port.values():
+            sensors.sort(key=lambda s: s.key)
+            for i, s in enumerate(sensors):
+                s.offset = i / len(sensors)     # ułamek okresu
+                s.next_due = None
+
+    # ---------- harmonogram ----------
+
+    def _wanted_period(self, s: _Sensor):
+        """Okres bez ograniczenia łączem; None = czujnik nieodpytywany."""
+        base = s.period or self.period
+        if not base:
+            return None
+        return max(MIN_PERIOD_S, base * s.backoff * (s.mult if self.adaptive else 1.0))
+
+    def effective_period(self, s: _Sensor):
+        p = self._wanted_period(s)
+        if p is None:
+            return None
+        link = self._links.get(s.port)
+        return min(MAX_PERIOD_S, p * (link.stretch if link else 1.0))
+
+    @staticmethod
+    def _grid_next(now: float, period: float, offset: float) -> float:
+        off = offset * period
+        return math.floor((now - off) / period + 1) * period + off
+
+    def tick(self, now=None):
+        now = time.time() if now is None else now
+        due = []
+        with self._lock:
+            self._update_links(now)
+            if not self.enabled:
+                return
+            for s in self._sensors.values():
+                period = self.effective_period(s)
+                if period is None:
+                    continue
+                if s.next_due is None or s.next_due - now > period:
+                    # pierwszy raz albo okres się skrócił
+                    s.next_due = self._grid_next(now, period, s.offset)
+                if now < s.next_due:
+                    continue
+                if s.future is not None and not s.future.done():
+                    continue    # poprzedni READ jeszcze bez odpowiedzi
+                if self.pending_of(s.port) >= MAX_PENDING or not self.ready_of(s.port):
+                    continue
+                s.next_due = self._grid_next(now, period, s.offset)
+                due.append(s)
+        for s in due:
+            s.future = self.command(f"READ id={s.sid}", s.port,
+                                    callback=lambda f, s=s: self._on_done(s, f))
+            self.reads_sent += 1
+
+    def _on_done(self, s: _Sensor, fut):
+        exc = fut.exception()
+        rec = None if exc else fut.result()
+        with self._lock:
+            if exc is not None or (isinstance(rec, Reply) and not rec.ok):
+                self.errors += 1
+                s.backoff = min(MAX_BACKOFF, s.backoff * 2)
+            else:
+                s.backoff = 1
+                link = self._links.get(s.port)
+                if link and isinstance(rec, Sample):
+                    link.reply_bytes = 0.9 * link.reply_bytes + 0.1 * wire_bytes(rec)
+
+    # ---------- obserwacja strumienia ----------
+
+    def on_records(self, records):
+        """Cały strumień rekordów: ruch na łączu i zmiany temperatur (adaptive)."""
+        with self._lock:
+            for rec in records:
+                if isinstance(rec, Link):
+                    if rec.up:
+                        for s in self._sensors.values():
+                            if s.port == rec.dev:
+                                s.backoff, s.next_due = 1, None
+                    continue
+                link = self._links.get(rec.dev)
+                if link is None:
+                    link = self._links[rec.dev] = _Link(time.time())
+                n = wire_bytes(rec)
+                link._rx += n
+                is_read = isinstance(rec, Sample) and rec.source == "read"
+                if not is_read:
+                    link._other += n
+                if isinstance(rec, Sample):
+                    s = self._sensors.get(rec.key)
+                    if s is not None:
+                        self._observe(s, rec.ts, rec.t)
+
+    def _observe(self, s: _Sensor, ts: float, t):
+        try:
+            t = float(t)
+        except (TypeError, ValueError):
+            return
+        if s.last is not None and ts > s.last[0]:
+            slope = abs(t - s.last[1]) / (ts - s.last[0])
+            s.slope = slope if s.slope is None else 0.7 * s.slope + 0.3 * slope
+            # oczekiwana zmiana między odczytami ~FAST_DELTA_C
+            base = s.period or self.period or DEFAULT_PERIOD_S
+            m = FAST_DELTA_C / (s.slope * base) if s.slope > 0 else ADAPT_RANGE[1]
+            s.mult = min(ADAPT_RANGE[1], max(ADAPT_RANGE[0], m))
+        s.last = (ts, t)
+
+    def _update_links(self, now: float):
+        by_port = {}
+        for s in self._sensors.values():
+            by_port.setdefault(s.port, []).append(s)
+        for port, link in self._links.items():
+            dt = now - link._t
+            if dt <= 0:
+                continue
+            a = min(1.0, dt / RATE_EWMA_S)
+            link.rx_bps += a * (link._rx / dt - link.rx_bps)
+            link.other_bps += a * (link._other / dt - link.other_bps)
+            link._rx = link._other = 0
+            link._t = now
+            # zajętość płytki: czas nadawania + ADC dla READ, czas nadawania dla reszty
+            byte_s = 10.0 / max(1, self.baud_of(port))
+            other = link.other_bps * byte_s
+            read_cost = link.reply_bytes * byte_s + ADC_S
+            wanted = 0.0
+            if self.enabled:
+                for s in by_port.get(port, []):
+                    p = self._wanted_period(s)
+                    if p is not None:
+                        wanted += read_cost / p
+            room = max(0.05, LINK_TARGET_UTIL - other)
+            link.stretch = max(1.0, wanted / room)
+
+    def status(self) -> dict:
+        """port -> (zajętość łącza 0..1, mnożnik okresów z powodu łącza)."""
+        with self._lock:
+            return {port: (link.rx_bps * 10.0 / max(1, self.baud_of(port)), link.stretch)
+                    for port, link in self._links.items()}
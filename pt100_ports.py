@@ -0,0 +1,93 @@
+"""
+Wykrywanie portów szeregowych w wątku tła (bez zależności od Qt).
+
+comports() potrafi trwać od kilkudziesięciu ms do sekund (Windows:
+SetupAPI, Linux: sysfs przy wielu urządzeniach), dlatego nie jest
+wołany w wątku GUI. PortWatcher skanuje co `interval` sekund i woła
+on_change(lista PortInfo) tylko wtedy, gdy zestaw portów się zmienił –
+podłączenie i odłączenie przejściówki USB widać bez „Refresh Ports”.
+refresh() wymusza natychmiastowy skan.
+
+Numer seryjny USB (PortInfo.serial_number) pozwala odnaleźć to samo
+urządzenie, gdy po resecie dostanie inną nazwę portu (find_serial).
+"""
+import threading
+from typing import NamedTuple, Optional
+
+SCAN_INTERVAL_S = 2.0
+
+
+class PortInfo(NamedTuple):
+    device: str
+    description: str = ""
+    serial_number: Optional[str] = None
+    vid: Optional[int] = None
+    pid: Optional[int] = None
+
+
+def scan() -> list:
+    """Aktualna lista portów, posortowana po nazwie."""
+    import serial.tools.list_ports     # tu, a nie przy starcie programu
+    ports = [PortInfo(p.device, p.description or "", p.serial_number, p.vid, p.pid)
+             for p in serial.tools.list_ports.comports()]
+    return sorted(ports, key=lambda p: p.device)
+
+
+def find_serial(serial_number, ports=None):
+    """Nazwa portu urządzenia o danym numerze seryjnym USB albo None (ports=None – nowy skan)."""
+    if not serial_number:
+        return None
+    for p in scan() if ports is None else ports:
+        if p.serial_number == serial_number:
+            return p.device
+    return None
+
+
+class PortWatcher:
+    def __init__(self, on_change=None, interval: float = SCAN_INTERVAL_S, on_error=None):
+        self.on_change = on_change or (lambda ports: None)  # wołane z wątku skanowania
+        self.on_error = on_error or (lambda msg: None)
+        self.interval = interval
+        self.ports = []
+        self._wake = threading.Event()
+        self._force = True          # pierwszy skan zawsze zgłaszany
+        self._stop = False
+        self._thread = None
+
+    def start(self):
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._loop, name="port_watch", daemon=True)
+            self._thread.start()
+
+    def refresh(self):
+        """Skan od razu (np. przycisk Refresh); on_change zostanie wywołane nawet bez zmian."""
+        self._force = True
+        self._wake.set()
+
+    def close(self):
+        self._stop = True
+        self._wake.set()
+
+    def find_serial(self, serial_number: str):
+        """Jak find_serial(), ale na ostatnim skanie watchera."""
+        return find_serial(serial_number, self.ports)
+
+    def info(self, device: str):
+        for p in self.ports:
+            if p.device == device:
+                return p
+        return None
+
+    def _loop(self):
+        while not self._stop:
+            try:
+                ports = scan()
+            except Exception as e:
+                self.on_error(f"ERR ports: {e}")
+                ports = self.ports
+            force, self._force = self._force, False
+            if force or ports != self.ports:
+                self.ports = ports
+                self.on_change(ports)
+            self._wake.wait(self.interval)
+            self._wake.clear()
@@ -0,0 +1,176 @@
+"""
+Protokół urządzenia: rekordy z linii tekstu wysyłanych przez firmware.
+
+Linie są parsowane w wątku czytającym, a każdy rekord niesie czas
+odbioru po stronie hosta (ts), więc opóźnienia wątku GUI nie przesuwają
+znaczników czasu próbek, oraz nazwę urządzenia (dev, zwykle port), bo
+id czujników są unikalne tylko w obrębie jednej płytki.
+
+Po `MODE fmt=bin` firmware wysyła auto-raporty jako 7-bajtowe ramki
+binarne (FRAME_SYNC, id, float32 LE, CRC-8) zamiast "Interval: N" + JSON;
+odpowiedzi na komendy zostają liniami JSON.
+
+parse_line() to pełny parser JSON – wzorzec i ścieżka zapasowa dla
+szybkiego parsera w pt100_parser, którego używa wątek czytający.
+"""
+import json
+import struct
+from typing import Any, List, NamedTuple, Optional
+
+
+FRAME_SYNC = 0xA5
+FRAME_SIZE = 7
+FRAME_TAG = "frame"         # początek pola raw rekordów z ramek binarnych
+_FRAME = struct.Struct("<xBfB")
+
+
+def _crc8_table():
+    table = []
+    for b in range(256):
+        crc = b
+        for _ in range(8):
+            crc = ((crc << 1) ^ 0x07) & 0xFF if crc & 0x80 else (crc << 1) & 0xFF
+        table.append(crc)
+    return bytes(table)
+
+
+_CRC8 = _crc8_table()
+
+
+def crc8(data) -> int:
+    """CRC-8, wielomian 0x07, start 0 – jak crc8() w Sensors.cpp."""
+    crc = 0
+    for b in data:
+        crc = _CRC8[crc ^ b]
+    return crc
+
+
+def encode_frame(sid: int, t: float) -> bytes:
+    """Ramka binarna auto-raportu (symulator, testy)."""
+    body = struct.pack("<Bf", int(sid) & 0xFF, t)
+    return bytes([FRAME_SYNC]) + body + bytes([crc8(body)])
+
+
+def ts_ms(ts: float) -> int:
+    """Czas epoki [s] -> ms w logach CSV i .ptb (obcięty, jak w dotychczasowym CSV)."""
+    return int(ts * 1000)
+
+
+def sensor_key(dev: str, sid) -> str:
+    """Klucz czujnika w aplikacji: "port:id" (albo samo id bez urządzenia)."""
+    return f"{dev}:{sid}" if dev else str(sid)
+
+
+def split_key(key: str):
+    """Odwrotność sensor_key: "COM3:1" -> ("COM3", "1"), "1" -> ("", "1")."""
+    dev, sep, sid = str(key).rpartition(":")
+    return (dev, sid) if sep else ("", sid)
+
+
+def key_sort(key: str):
+    """Sortowanie kluczy: po urządzeniu, potem numerycznie po id."""
+    dev, sid = split_key(key)
+    return (dev, 0, int(sid), "") if sid.isdigit() else (dev, 1, 0, sid)
+
+
+class Sample(NamedTuple):
+    """Pomiar: odpowiedź na READ lub auto-raport (interval)."""
+    ts: float
+    sid: str
+    name: Optional[str]
+    pin: Any
+    t: Any
+    source: str         # "read" | "interval"
+    raw: str
+    dev: str = ""
+
+    @property
+    def key(self) -> str:
+        return sensor_key(self.dev, self.sid)
+
+
+class SensorList(NamedTuple):
+    """Odpowiedź na LIST: {"s":[...]}."""
+    ts: float
+    sensors: list
+    raw: str
+    dev: str = ""
+
+
+class Reply(NamedTuple):
+    """Odpowiedź na komendę: {"ok":true} / {"ok":false,"err":"..."}."""
+    ts: float
+    ok: bool
+    err: Optional[str]
+    raw: str
+    dev: str = ""
+
+
+class Other(NamedTuple):
+    """Wszystko inne (tekst diagnostyczny, nieznany JSON)."""
+    ts: float
+    obj: Any            # None gdy linia nie jest JSON-em
+    raw: str
+    dev: str = ""
+
+
+class Link(NamedTuple):
+    """Zmiana stanu łącza (pt100_serial): up=False – utrata połączenia, up=True – ponowne połączenie."""
+    ts: float
+    up: bool
+    raw: str
+    dev: str = ""
+
+
+def parse_line(line: str, ts: float, dev: str = ""):
+    """Zamienia jedną linię na rekord. Zwraca None dla pustej linii."""
+    line = line.strip()
+    if not line:
+        return None
+    try:
+        obj = json.loads(line)
+    except Exception:
+        return Other(ts, None, line, dev)
+    if not isinstance(obj, dict):
+        return Other(ts, obj, line, dev)
+
+    # LIST
+    s = obj.get("s")
+    if isinstance(s, list):
+        return SensorList(ts, s, line, dev)
+
+    # READ / auto-raport
+    if "id" in obj and "t" in obj:
+        return Sample(ts, str(obj.get("id")), obj.get("name"), obj.get("pin"), obj.get("t"),
+                      "read" if obj.get("ok") else "interval", line, dev)
+
+    if "ok" in obj:
+        return Reply(ts, bool(obj.get("ok")), obj.get("err"), line, dev)
+    return Other(ts, obj, line, dev)
+
+
+def decode_frame(frame, ts: float, dev: str = ""):
+    """Ramka FRAME_SIZE bajtów -> Sample ("interval", bez nazwy); None przy złej sumie."""
+    sid, t, crc = _FRAME.unpack(frame)
+    if crc8(frame[1:6]) != crc:
+        return None
+    t = round(t, 2)     # jak Serial.print(t, 2) w trybie JSON
+    return Sample(ts, str(sid), None, None, t, "interval", f"{FRAME_TAG} id={sid} t={t}", dev)
+
+
+def wire_bytes(rec) -> int:
+    """Ile bajtów rekord zajął na łączu."""
+    if isinstance(rec, Link):
+        return 0
+    if isinstance(rec, Sample) and rec.raw.startswith(FRAME_TAG):
+        return FRAME_SIZE
+    return len(rec.raw) + 2
+
+
+def parse_lines(lines: List[str], ts: float, dev: str = "") -> list:
+    out = []
+    for line in lines:
+        rec = parse_line(line, ts, dev)
+        if rec is not None:
+            out.append(rec)
+    return out
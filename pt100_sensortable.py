@@ -0,0 +1,191 @@
+"""
+Model tabeli czujników (Qt model/view).
+
+SensorTableModel pokazuje rejestr czujników aplikacji (słownik
+klucz -> {dev,id,name,pin,active,last_t,updated_ts}) bez przebudowy
+tabeli: kolejność wierszy (key_sort) jest utrzymywana przyrostowo przez
+wstawianie/usuwanie pojedynczych wierszy, a po paczce pomiarów
+dataChanged dostają tylko wiersze i kolumny, których tekst się zmienił.
+Kolumna "updated" ma osobne, tanie odświeżanie (refresh_ages). Zaznaczenie
+i przewinięcie widoku zostają nietknięte. Kolumny statystyk i alarmów
+czyta z StatsEngine (pt100_stats), jeśli go podano.
+"""
+import bisect
+import time
+
+try:
+    from PySide6.QtCore import QAbstractTableModel, QModelIndex, Qt
+    from PySide6.QtGui import QColor
+except ImportError:
+    from PyQt6.QtCore import QAbstractTableModel, QModelIndex, Qt
+    from PyQt6.QtGui import QColor
+
+from pt100_protocol import key_sort
+
+COLUMNS = ["id", "name", "pin", "active", "last temp [°C]",
+           "min", "max", "mean", "σ", "EWMA", "°C/min", "alarm", "updated"]
+ALARM_COL = 11
+AGE_COL = 12
+
+_DISPLAY = Qt.ItemDataRole.DisplayRole
+_ALIGN = Qt.ItemDataRole.TextAlignmentRole
+_FOREGROUND = Qt.ItemDataRole.ForegroundRole
+_CENTER = Qt.AlignmentFlag.AlignCenter
+_ALARM_COLOR = QColor(200, 0, 0)
+
+
+def _num(v, fmt="{:.2f}") -> str:
+    return "-" if v is None else fmt.format(v)
+
+
+def _age_text(data: dict, now: float) -> str:
+    if data.get("last_t") is None:
+        return "-"
+    age = now - (data.get("updated_ts") or now)
+    return "now" if age < 0.5 else f"{int(age)}s ago"
+
+
+def _row_texts(key: str, data: dict, now: float, stats=None) -> list:
+    t = data.get("last_t")
+    if t is None:
+        temp = "-"
+    else:
+        try:
+            temp = f"{float(t):.2f}"
+        except Exception:
+            temp = str(t)
+    st = stats.get(key) if stats is not None else None
+    if st is not None and len(st):
+        cols = [_num(st.min), _num(st.max), _num(st.mean), _num(st.std, "{:.3f}"),
+                _num(st.ewma), _num(st.slope, "{:+.2f}")]
+    else:
+        cols = ["-"] * 6
+    alarm = ", ".join(stats.alarms(key)) if stats is not None else ""
+    return [key, str(data.get("name", "")), str(data.get("pin", "")),
+            "1" if data.get("active") else "0", temp, *cols, alarm, _age_text(data, now)]
+
+
+class SensorTableModel(QAbstractTableModel):
+    def __init__(self, sensors=None, parent=None, stats=None):
+        super().__init__(parent)
+        self.sensors = sensors if sensors is not None else {}
+        self.stats = stats      # StatsEngine albo None
+        self._keys = []         # klucze w kolejności wierszy
+        self._order = []        # key_sort(klucz) dla bisect, równoległe do _keys
+        self._texts = []        # wyrenderowane teksty wierszy (len(COLUMNS) kolumn)
+        self._dirty = set()
+        self.sync()
+
+    # ---------- interfejs modelu ----------
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._keys)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def data(self, index, role=_DISPLAY):
+        if not index.isValid():
+            return None
+        if role == _DISPLAY:
+            return self._texts[index.row()][index.column()]
+        if role == _ALIGN:
+            return _CENTER
+        if role == _FOREGROUND and self._texts[index.row()][ALARM_COL]:
+            return _ALARM_COLOR
+        return None
+
+    def headerData(self, section, orientation, role=_DISPLAY):
+        if role == _DISPLAY and orientation == Qt.Orientation.Horizontal:
+            return COLUMNS[section]
+        return super().headerData(section, orientation, role)
+
+    # ---------- dostęp po kluczu ----------
+
+    def key_at(self, row: int):
+        return self._keys[row] if 0 <= row < len(self._keys) else None
+
+    def row_of(self, key: str) -> int:
+        order = key_sort(key)
+        i = bisect.bisect_left(self._order, order)
+        # różne klucze mogą mieć ten sam porządek ("1" i "01")
+        while i < len(self._keys) and self._order[i] == order:
+            if self._keys[i] == key:
+                return i
+            i += 1
+        return -1
+
+    # ---------- aktualizacje ----------
+
+    def set_sensors(self, sensors: dict):
+        """Nowy słownik rejestru (np. po LIST) – zmiany wierszy liczone różnicowo."""
+        self.sensors = sensors
+        self._dirty.update(sensors)
+        self.sync()
+        self.refresh()
+
+    def mark(self, key: str):
+        """Czujnik zmienił dane – odświeżony przy najbliższym refresh()."""
+        self._dirty.add(key)
+
+    def sync(self, now=None):
+        """Dopasowuje wiersze do kluczy rejestru: usuwa zniknięte, wstawia nowe."""
+        now = time.time() if now is None else now
+        for row in range(len(self._keys) - 1, -1, -1):
+            if self._keys[row] not in self.sensors:
+                self.beginRemoveRows(QModelIndex(), row, row)
+                del self._keys[row], self._order[row], self._texts[row]
+                self.endRemoveRows()
+        if len(self._keys) == len(self.sensors):
+            return
+        present = set(self._keys)
+        for key, data in self.sensors.items():
+            if key in present:
+                continue
+            order = key_sort(key)
+            row = bisect.bisect_right(self._order, order)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self._keys.insert(row, key)
+            self._order.insert(row, order)
+            self._texts.insert(row, _row_texts(key, data, now, self.stats))
+            self.endInsertRows()
+            self._dirty.discard(key)
+
+    def refresh(self, now=None):
+        """dataChanged tylko dla zmienionych komórek czujników oznaczonych przez mark()."""
+        if not self._dirty:
+            return
+        now = time.time() if now is None else now
+        if len(self._keys) != len(self.sensors):
+            self.sync(now)
+        dirty, self._dirty = self._dirty, set()
+        for key in dirty:
+            row = self.row_of(key)
+            data = self.sensors.get(key)
+            if row < 0 or data is None:
+                continue
+            new = _row_texts(key, data, now, self.stats)
+            old = self._texts[row]
+            changed = [c for c in range(len(new)) if new[c] != old[c]]
+            if changed:
+                self._texts[row] = new
+                if new[ALARM_COL] != old[ALARM_COL]:
+                    changed = [0, len(new) - 1]     # kolor całego wiersza
+                self.dataChanged.emit(self.index(row, changed[0]), self.index(row, changed[-1]))
+
+    def refresh_ages(self, now=None):
+        """Tylko kolumna "updated": jedno dataChanged na zakres zmienionych wierszy."""
+        now = time.time() if now is None else now
+        first = last = -1
+        for row, key in enumerate(self._keys):
+            data = self.sensors.get(key)
+            if data is None:
+                continue
+            txt = _age_text(data, now)
+            if txt != self._texts[row][AGE_COL]:
+                self._texts[row][AGE_COL] = txt
+                if first < 0:
+                    first = row
+                last = row
+        if first >= 0:
+            self.dataChanged.emit(self.index(first, AGE_COL), self.index(last, AGE_COL))
@@ -0,0 +1,379 @@
+"""
+Łącze szeregowe bez zależności od Qt.
+
+SerialReader otwiera port, czyta w osobnym wątku do bytearray, dzieli
+wszystkie pełne linie z każdego odczytu, parsuje je na rekordy
+(pt100_parser) i oddaje paczkami przez callback – nie częściej niż co
+`batch_interval` sekund. Dzięki temu seria auto-raportów to kilka
+wywołań w GUI, a nie tysiące sygnałów.
+
+Ramki binarne (pt100_protocol.FRAME_SYNC) są szukane dopiero po
+potwierdzeniu MODE fmt=bin przez firmware i tylko na granicy rekordu –
+do {"ok":true,"fmt":"json"} (albo ponownego otwarcia portu) bajt 0xA5
+jest zwykłym bajtem tekstu (UTF-8).
+
+DeviceManager trzyma wiele otwartych portów naraz (osobny SerialReader
+na każdy) i scala ich rekordy w jeden strumień uporządkowany po czasie.
+Komendy z oczekiwaniem na odpowiedź idą przez jego CommandQueue
+(pt100_commands). Port może pracować z dowolnym baud (musi zgadzać się
+z LH_BAUD firmware).
+
+Utrata połączenia (reset płytki, odłączony kabel) nie kończy pracy:
+DeviceManager wstawia do strumienia rekord Link(up=False) – odbiorcy
+zaznaczają przerwę w historii i logach – i próbuje otworzyć port ponownie
+co RECONNECT_MIN_S..RECONNECT_MAX_S s (backoff wykładniczy). Gdy znany
+jest numer seryjny USB, szuka urządzenia także pod nową nazwą portu;
+rekordy zachowują pierwotną nazwę (klucze czujników się nie zmieniają).
+Po połączeniu idzie Link(up=True) i LIST, który odświeża listę czujników.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+import serial
+
+from pt100_commands import CommandQueue
+from pt100_metrics import METRICS
+from pt100_parser import parse_block, parse_stream
+from pt100_ports import find_serial
+from pt100_protocol import Link, Other, Reply
+
+BAUD = 9600
+BAUD_RATES = [9600, 19200, 38400, 57600, 115200, 230400, 250000, 500000, 1000000]
+READ_TIMEOUT_S = 0.1
+BATCH_INTERVAL_S = 0.05     # maks. ~20 paczek/s do odbiorcy
+REORDER_DELAY_S = 0.1       # ile DeviceManager czeka na spóźnione rekordy innych portów
+MAX_LINE_BYTES = 4096       # zabezpieczenie przed śmieciami bez '\n'
+RECONNECT_MIN_S = 0.5       # pierwsza próba ponownego połączenia...
+RECONNECT_MAX_S = 30.0      # ...i najdłuższa przerwa między próbami
+# potwierdzenia MODE z firmware: {"ok":true,"fmt":"bin"} / {"ok":true,"fmt":"json"}
+_BIN_ACK = b'"fmt":"bin"'
+_JSON_ACK = b'"fmt":"json"'
+
+_RX_BYTES = METRICS.counter("pt100_rx_bytes_total", "Bajty odebrane z portu", ("port",))
+_RECORDS = METRICS.counter("pt100_records_total", "Rekordy sparsowane z portu", ("port",))
+_PARSE_ERRORS = METRICS.counter("pt100_parse_errors_total",
+                                "Linie nierozpoznane (nie JSON, nie 'Interval:') i odrzucone śmieci", ("port",))
+_PARSE_S = METRICS.histogram("pt100_parse_seconds", "Parsowanie jednego odczytu z portu", ("port",))
+_IO_ERRORS = METRICS.counter("pt100_io_errors_total", "Wyjątki odczytu/zapisu portu", ("port", "op"))
+_INGEST_S = METRICS.histogram("pt100_ingest_delay_seconds",
+                              "Od odbioru najstarszego rekordu paczki do przekazania jej odbiorcy")
+_RECONNECTS = METRICS.counter("pt100_reconnects_total", "Ponowne połączenia po utracie łącza", ("port",))
+_BATCH_RECORDS = METRICS.histogram("pt100_batch_records", "Rekordów w paczce przekazanej odbiorcy",
+                                   buckets=(1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 5000))
+
+
+def _noop(*args):
+    pass
+
+
+class SerialReader:
+    def __init__(self, on_batch=None, on_status=None, on_connected=None,
+                 batch_interval: float = BATCH_INTERVAL_S, on_lost=None):
+        self.on_batch = on_batch or _noop          # on_batch(list[rekord])
+        self.on_status = on_status or _noop        # on_status(str)
+        self.on_connected = on_connected or _noop  # on_connected(bool)
+        self.on_lost = on_lost or _noop            # on_lost() – port padł sam (nie close())
+        self.batch_interval = batch_interval
+        self.ser = None
+        self.port = None
+        self.dev = ""             # nazwa urządzenia wpisywana w rekordy
+        self._stop = False
+        self._thread = None
+        self._write_lock = threading.Lock()
+        self.binary = False       # firmware potwierdził MODE fmt=bin – w strumieniu mogą być ramki
+
+    def is_open(self) -> bool:
+        return bool(self.ser and self.ser.is_open)
+
+    def open(self, port: str, baud: int = BAUD, dev=None) -> bool:
+        """dev – nazwa w rekordach, gdy inna niż port (urządzenie pod nową nazwą po resecie)."""
+        self.close()
+        try:
+            ser = serial.Serial()
+            ser.port, ser.baudrate, ser.timeout = port, baud, READ_TIMEOUT_S
+            ser.dsrdtr = ser.rtscts = False
+            # <- ważne: DTR/RTS ustawione przed open(), inaczej Uno się resetuje;
+            # pyserial ignoruje je dla urządzeń bez linii modemowych (pty)
+            ser.dtr = False
+            ser.rts = False
+            ser.open()
+            self.ser = ser
+            self.port = port
+            self.dev = dev or port
+            self.binary = False     # po otwarciu (reset płytki) firmware wysyła JSON
+            self._stop = False
+            self._thread = threading.Thread(target=self._reader_loop, args=(self.ser,), daemon=True)
+            self._thread.start()
+            self.on_connected(True)
+            self.on_status(f"Connected: {port} @ {baud}")
+            return True
+        except Exception as e:
+            self.ser = None
+            self.on_connected(False)
+            self.on_status(f"ERR open: {e}")
+            return False
+
+    def close(self):
+        self._stop = True
+        if not self.ser:
+            return
+        try: self.ser.close()
+        except: pass
+        self.ser = None
+        self.on_connected(False)
+        self.on_status("Disconnected")
+
+    def send_line(self, line: str) -> bool:
+        if not self.is_open():
+            self.on_status("Not connected")
+            return False
+        data = (line.strip() + "\n").encode("utf-8")
+        try:
+            with self._write_lock:
+                self.ser.write(data)
+            return True
+        except Exception as e:
+            _IO_ERRORS.inc(port=self.dev, op="write")
+            self.on_status(f"ERR write: {e}")
+            return False
+
+    def _parse(self, buf: bytearray, rx_ts: float) -> list:
+        """Pełne rekordy z początku `buf` (zużyte bajty są usuwane)."""
+        if not self.binary:
+            end = buf.rfind(b"\n")
+            if end < 0:
+                return []
+            ack = buf.find(_BIN_ACK, 0, end)
+            if ack < 0:
+                recs = parse_block(buf[:end], rx_ts, self.dev)
+                del buf[:end + 1]
+                return recs
+            # linie do potwierdzenia włącznie jako tekst, dalej mogą już być ramki
+            stop = buf.find(b"\n", ack)
+            recs = parse_block(buf[:stop], rx_ts, self.dev)
+            del buf[:stop + 1]
+            self.binary = True
+        else:
+            recs = []
+        # ramki binarne (MODE fmt=bin) przeplatane liniami JSON
+        more, used = parse_stream(buf, rx_ts, self.dev)
+        if any(rec.__class__ is Reply and _JSON_ACK in rec.raw.encode() for rec in more):
+            self.binary = False
+        del buf[:used]
+        return recs + more
+
+    def _reader_loop(self, ser):
+        buf = bytearray()
+        pending = []
+        last_flush = time.monotonic()
+        while not self._stop and ser.is_open:
+            try:
+                chunk = ser.read(ser.in_waiting or 1)
+            except Exception as e:
+                if self._stop:
+                    break       # close() w trakcie read() – to nie błąd łącza
+                _IO_ERRORS.inc(port=self.dev, op="read")
+                self.on_status(f"ERR read: {e}")
+                try: ser.close()
+                except: pass
+                break
+            if chunk:
+                rx_ts = time.time()
+                t0 = time.perf_counter()
+                n0 = len(pending)
+                buf += chunk
+                pending += self._parse(buf, rx_ts)
+                if len(buf) > MAX_LINE_BYTES:
+                    buf.clear()
+                    _PARSE_ERRORS.inc(port=self.dev)
+                _PARSE_S.observe(time.perf_counter() - t0, port=self.dev)
+                _RX_BYTES.inc(len(chunk), port=self.dev)
+                if len(pending) > n0:
+                    _RECORDS.inc(len(pending) - n0, port=self.dev)
+                    bad = sum(1 for rec in itertools.islice(pending, n0, None)
+                              if rec.__class__ is Other and rec.obj is None and not rec.raw.startswith("Interval:"))
+                    if bad:
+                        _PARSE_ERRORS.inc(bad, port=self.dev)
+            now = time.monotonic()
+            if pending and now - last_flush >= self.batch_interval:
+                self.on_batch(pending)
+                pending = []
+                last_flush = now
+        if pending:
+            self.on_batch(pending)
+        lost = not self._stop
+        if ser is self.ser:
+            if lost:
+                self.ser = None
+            self.on_connected(False)
+        if lost:
+            self.on_lost()
+
+
+class DeviceManager:
+    """
+    Wiele portów naraz. Rekordy wszystkich urządzeń trafiają do jednego
+    callbacku on_batch, scalone po czasie odbioru: każdy rekord czeka
+    `reorder_delay` s, żeby paczki z wolniejszych wątków zdążyły dojść.
+    Przy jednym porcie opóźnienie nie jest stosowane.
+    """
+
+    def __init__(self, on_batch=None, on_status=None, on_connected=None,
+                 batch_interval: float = BATCH_INTERVAL_S, reorder_delay: float = REORDER_DELAY_S,
+                 reconnect: bool = True):
+        self.on_batch = on_batch or _noop          # on_batch(list[rekord])
+        self.on_status = on_status or _noop        # on_status(str)
+        self.on_connected = on_connected or _noop  # on_connected(port, bool)
+        self.batch_interval = batch_interval
+        self.reorder_delay = reorder_delay
+        self.reconnect = reconnect
+        self.readers = {}           # port -> SerialReader
+        self._serials = {}          # port -> numer seryjny USB (szukanie po ponownym wyliczeniu)
+        self._reconnecting = {}     # port -> Event zatrzymujący próby
+        self._heap = []             # (ts, seq, rekord)
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+        self._merger = None
+        self.commands = CommandQueue(self.send_line)
+
+    # ---------- porty ----------
+
+    def ports(self):
+        return [p for p, r in self.readers.items() if r.is_open()]
+
+    def reconnecting(self):
+        """Porty, które straciły połączenie i czekają na ponowne otwarcie."""
+        return [p for p in self._reconnecting if p in self.readers]
+
+    def is_open(self, port=None) -> bool:
+        if port is None:
+            return bool(self.ports())
+        r = self.readers.get(port)
+        return bool(r and r.is_open())
+
+    def baudrate(self, port: str) -> int:
+        ser = getattr(self.readers.get(port), "ser", None)
+        return ser.baudrate if ser else BAUD
+
+    def open(self, port: str, baud: int = BAUD, serial_number=None) -> bool:
+        """serial_number – numer seryjny USB (pt100_ports), by odnaleźć płytkę pod inną nazwą."""
+        self.close(port)
+        reader = SerialReader(on_batch=self._push,
+                              on_status=lambda msg, p=port: self.on_status(f"[{p}] {msg}"),
+                              on_connected=lambda ok, p=port: self.on_connected(p, ok),
+                              batch_interval=self.batch_interval)
+        reader.on_lost = lambda p=port, r=reader, b=baud: self._on_lost(p, r, b)
+        self.readers[port] = reader
+        self._serials[port] = serial_number
+        self._ensure_merger()
+        return reader.open(port, baud)
+
+    def close(self, port=None):
+        """Zamyka wskazany port albo wszystkie (port=None); przerywa też ponowne łączenie."""
+        ports = list(self.readers) if port is None else [port]
+        for p in ports:
+            stop = self._reconnecting.pop(p, None)
+            if stop:
+                stop.set()
+            reader = self.readers.pop(p, None)
+            if reader:
+                reader.close()
+            self.commands.cancel(p)
+
+    def send_line(self, line: str, port=None) -> bool:
+        """Wysyła komendę do jednego portu albo do wszystkich (port=None)."""
+        if port is not None:
+            reader = self.readers.get(port)
+            if reader is None:
+                self.on_status(f"[{port}] Not connected")
+                return False
+            if port in self._reconnecting:
+                return False    # stan łącza już zgłoszony
+            return reader.send_line(line)
+        ok = False
+        for reader in [r for p, r in list(self.readers.items()) if p not in self._reconnecting]:
+            ok = reader.send_line(line) or ok
+        return ok
+
+    def command(self, line: str, port: str, timeout=None, retries=None, callback=None):
+        """Komenda z dopasowaną odpowiedzią – zwraca Future (pt100_commands)."""
+        return self.commands.submit(line, port, timeout=timeout, retries=retries, callback=callback)
+
+    # ---------- utrata łącza ----------
+
+    def _on_lost(self, port: str, reader: SerialReader, baud: int):
+        # wołane z wątku czytającego, po oddaniu jego ostatniej paczki
+        if self.readers.get(port) is not reader:
+            return
+        self._push([Link(time.time(), False, "# link lost", port)])
+        self.commands.cancel(port, ConnectionError(f"{port}: link lost"))
+        if not self.reconnect:
+            return
+        stop = self._reconnecting[port] = threading.Event()
+        threading.Thread(target=self._reconnect_loop, args=(port, reader, baud, stop),
+                         name=f"reconnect {port}", daemon=True).start()
+
+    def _reconnect_loop(self, port, reader, baud, stop):
+        t_lost = time.time()
+        delay = RECONNECT_MIN_S
+        serial_number = self._serials.get(port)
+        while not stop.wait(delay):
+            delay = min(RECONNECT_MAX_S, delay * 2)
+            path = port
+            if serial_number:
+                try:
+                    path = find_serial(serial_number)
+                except Exception:
+                    path = None
+                if path is None:
+                    self.on_status(f"[{port}] waiting for device S/N {serial_number}, next try in {delay:g} s")
+                    continue    # urządzenie jeszcze nie wróciło na USB
+            if not reader.open(path, baud, dev=port):
+                self.on_status(f"[{port}] reconnect failed, next try in {delay:g} s")
+                continue
+            if stop.is_set() or self.readers.get(port) is not reader:
+                reader.close()  # port zamknięty przez użytkownika w trakcie próby
+                return
+            self._reconnecting.pop(port, None)
+            _RECONNECTS.inc(port=port)
+            where = f" as {path}" if path != port else ""
+            self._push([Link(time.time(), True, f"# link restored{where} after {time.time() - t_lost:.1f} s", port)])
+            # płytka mogła się zresetować – odśwież listę czujników
+            self.commands.submit("LIST", port)
+            return
+
+    # ---------- scalanie strumieni ----------
+
+    def _push(self, batch):
+        with self._cond:
+            for rec in batch:
+                heapq.heappush(self._heap, (rec.ts, next(self._seq), rec))
+            self._cond.notify()
+
+    def _ensure_merger(self):
+        if self._merger is None or not self._merger.is_alive():
+            self._merger = threading.Thread(target=self._merge_loop, daemon=True)
+            self._merger.start()
+
+    def _merge_loop(self):
+        while True:
+            with self._cond:
+                while not self._heap:
+                    self._cond.wait()
+                delay = self.reorder_delay if len(self.readers) > 1 else 0.0
+                horizon = time.time() - delay
+                out = []
+                while self._heap and self._heap[0][0] <= horizon:
+                    out.append(heapq.heappop(self._heap)[2])
+                if not out:
+                    # najstarszy rekord jeszcze „dojrzewa”
+                    self._cond.wait(max(0.0, self._heap[0][0] - horizon))
+                    continue
+            _INGEST_S.observe(time.time() - out[0].ts)
+            _BATCH_RECORDS.observe(len(out))
+            # najpierw odpowiedzi na komendy, potem odbiorca
+            self.commands.on_records(out)
+            self.on_batch(out)
+            time.sleep(self.batch_interval)
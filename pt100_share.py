@@ -0,0 +1,623 @@
+"""
+Udostępnianie strumienia rekordów lokalnym klientom (bez zależności od Qt).
+
+Port szeregowy może otworzyć tylko jeden proces. ShareServer publikuje
+scalony strumień DeviceManagera (te same rekordy, które dostaje GUI albo
+tryb headless) wielu klientom – przez zwykłe TCP (linie JSON, np.
+`nc 127.0.0.1 8765`) albo WebSocket na tym samym porcie (rozpoznanie po
+nagłówku HTTP). Rekord to jeden obiekt JSON z polem "type" (sample,
+list, reply, other, link) i polami rekordu z pt100_protocol; serwer
+wysyła też "hello", "ports" (lista portów po każdej zmianie), "result"
+i "dropped".
+
+Każdy klient ma ograniczoną kolejkę wysyłki i własny wątek piszący –
+wolny klient nie spowalnia akwizycji ani pozostałych klientów. Po
+przepełnieniu polityka "drop" odrzuca najstarsze wiadomości, a "coalesce"
+zostawia tylko najnowszy pomiar każdego czujnika (LIST, odpowiedzi
+i zmiany łącza zostają). Klient dostaje wtedy {"type":"dropped","n":N}.
+
+Komenda od klienta to linia tekstu (do jedynego portu albo do wszystkich)
+albo {"cmd":"READ id=1","port":"COM3","id":7}. Idzie przez CommandQueue
+serwera, więc jest szeregowana z komendami GUI i innych klientów
+i dopasowana do odpowiedzi; wynik wraca tylko do nadawcy jako
+{"type":"result","id":7,"ok":true,"record":{...}}.
+
+RemoteManager to klient z interfejsem DeviceManagera: GUI (--remote)
+albo inny program pracuje na udostępnionym strumieniu zamiast na porcie.
+"""
+import collections
+import itertools
+import json
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import Future
+
+from pt100_commands import CommandTimeout
+from pt100_metrics import METRICS
+from pt100_protocol import Link, Other, Reply, Sample, SensorList
+from pt100_serial import BAUD, RECONNECT_MAX_S, RECONNECT_MIN_S
+
+SHARE_PORT = 8765
+QUEUE_SIZE = 2000           # wiadomości w kolejce jednego klienta
+POLICIES = ("coalesce", "drop")
+SNIFF_TIMEOUT_S = 0.3       # tyle czekamy na nagłówek WebSocket, potem klient to zwykłe TCP
+CONNECT_TIMEOUT_S = 2.0
+MAX_MESSAGE_BYTES = 64 * 1024
+PROTOCOL_VERSION = 1
+
+_WS_GUID = b"258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_TYPES = {"sample": Sample, "list": SensorList, "reply": Reply, "other": Other, "link": Link}
+_NAMES = {cls: name for name, cls in _TYPES.items()}
+
+_CLIENTS = METRICS.gauge("pt100_share_clients", "Podłączeni klienci ShareServer")
+_MESSAGES = METRICS.counter("pt100_share_messages_total", "Wiadomości wysłane klientom")
+_DROPPED = METRICS.counter("pt100_share_dropped_total", "Wiadomości odrzucone dla wolnych klientów", ("policy",))
+_COMMANDS = METRICS.counter("pt100_share_commands_total", "Komendy od klientów")
+
+
+def _noop(*args):
+    pass
+
+
+def encode_record(rec) -> dict:
+    d = rec._asdict()
+    d["type"] = _NAMES[type(rec)]
+    return d
+
+
+def decode_record(obj):
+    """dict z encode_record() -> rekord; None dla nieznanego typu."""
+    cls = _TYPES.get(obj.get("type")) if isinstance(obj, dict) else None
+    if cls is None:
+        return None
+    try:
+        return cls(**{f: obj[f] for f in cls._fields if f in obj})
+    except TypeError:
+        return None
+
+
+def _dumps(obj) -> bytes:
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def parse_address(text: str, default_port: int = SHARE_PORT):
+    """"host:port", "port" albo "host" -> (host, port)."""
+    host, sep, port = text.rpartition(":")
+    if not sep:
+        return (text, default_port) if not text.isdigit() else ("127.0.0.1", int(text))
+    return host or "127.0.0.1", int(port)
+
+
+# ---------- WebSocket (RFC 6455, tylko to, czego potrzebuje serwer) ----------
+
+def _ws_accept(key: str) -> str:
+    import base64, hashlib      # tylko dla klientów WebSocket (start okna)
+    return base64.b64encode(hashlib.sha1(key.encode("ascii") + _WS_GUID).digest()).decode("ascii")
+
+
+def _ws_frame(payload: bytes, opcode: int = 1) -> bytes:
+    n = len(payload)
+    if n < 126:
+        head = struct.pack("!BB", 0x80 | opcode, n)
+    elif n < 65536:
+        head = struct.pack("!BBH", 0x80 | opcode, 126, n)
+    else:
+        head = struct.pack("!BBQ", 0x80 | opcode, 127, n)
+    return head + payload
+
+
+def _read_exact(f, n: int) -> bytes:
+    data = f.read(n)
+    if len(data) < n:
+        raise EOFError()
+    return data
+
+
+def _ws_read(f):
+    """Jedna wiadomość (opcode, payload); ramki ciągłe są sklejane."""
+    data = b""
+    opcode = None
+    while True:
+        b0, b1 = _read_exact(f, 2)
+        n = b1 & 0x7F
+        if n == 126:
+            n = struct.unpack("!H", _read_exact(f, 2))[0]
+        elif n == 127:
+            n = struct.unpack("!Q", _read_exact(f, 8))[0]
+        if len(data) + n > MAX_MESSAGE_BYTES:
+            raise ValueError("message too long")
+        mask = _read_exact(f, 4) if b1 & 0x80 else None
+        payload = _read_exact(f, n)
+        if mask:
+            payload = bytes(b ^ mask[i & 3] for i, b in enumerate(payload))
+        op = b0 & 0x0F
+        if op >= 8:
+            return op, payload      # ramki sterujące nie są dzielone
+        if op:
+            opcode = op
+        data += payload
+        if b0 & 0x80:
+            return opcode, data
+
+
+# ---------- serwer ----------
+
+class _Client:
+    def __init__(self, server, sock, addr):
+        self.server = server
+        self.sock = sock
+        self.name = f"{addr[0]}:{addr[1]}"
+        self.ws = False
+        self.queue = collections.deque()    # (klucz czujnika albo None, wiadomość)
+        self.dropped = 0
+        self.closed = False
+        self._cond = threading.Condition()
+        self._send_lock = threading.Lock()
+
+    def push(self, items):
+        with self._cond:
+            if self.closed:
+                return
+            self.queue.extend(items)
+            if len(self.queue) > self.server.queue_size:
+                n = len(self.queue)
+                if self.server.policy == "coalesce":
+                    self._coalesce()
+                while len(self.queue) > self.server.queue_size:
+                    self.queue.popleft()
+                lost = n - len(self.queue)
+                self.dropped += lost
+                _DROPPED.inc(lost, policy=self.server.policy)
+            self._cond.notify()
+
+    def _coalesce(self):
+        # najnowszy pomiar każdego czujnika na swoim miejscu, reszta wiadomości bez zmian
+        seen = set()
+        keep = []
+        for key, msg in reversed(self.queue):
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            keep.append((key, msg))
+        keep.reverse()
+        self.queue = collections.deque(keep)
+
+    def send(self, data: bytes):
+        with self._send_lock:
+            self.sock.sendall(data)
+
+    def close(self):
+        with self._cond:
+            if self.closed:
+                return
+            self.closed = True
+            self._cond.notify()
+        try: self.sock.shutdown(socket.SHUT_RDWR)
+        except OSError: pass
+        try: self.sock.close()
+        except OSError: pass
+
+    def handshake(self, f) -> bool:
+        """Rozpoznaje WebSocket (nagłówek GET w ciągu SNIFF_TIMEOUT_S); False – zły nagłówek."""
+        self.sock.settimeout(SNIFF_TIMEOUT_S)
+        try:
+            head = self.sock.recv(4, socket.MSG_PEEK)
+        except socket.timeout:
+            head = b""
+        finally:
+            self.sock.settimeout(None)
+        if head != b"GET ":
+            return True
+        key = None
+        while True:
+            line = f.readline(MAX_MESSAGE_BYTES).strip()
+            if not line:
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "sec-websocket-key":
+                key = value.strip()
+        if key is None:
+            self.send(b"HTTP/1.1 400 Bad Request\r\nContent-Length: 0\r\n\r\n")
+            return False
+        self.send(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                   f"Sec-WebSocket-Accept: {_ws_accept(key)}\r\n\r\n").encode("ascii"))
+        self.ws = True
+        return True
+
+    def writer_loop(self):
+        try:
+            while True:
+                with self._cond:
+                    while not self.queue and not self.closed:
+                        self._cond.wait()
+                    if self.closed:
+                        return
+                    msgs = [m for _, m in self.queue]
+                    self.queue.clear()
+                    dropped, self.dropped = self.dropped, 0
+                if dropped:
+                    msgs.insert(0, _dumps({"type": "dropped", "n": dropped}))
+                if self.ws:
+                    self.send(b"".join(_ws_frame(m) for m in msgs))
+                else:
+                    self.send(b"\n".join(msgs) + b"\n")
+                _MESSAGES.inc(len(msgs))
+        except OSError:
+            pass
+        finally:
+            self.server._remove(self)
+
+    def reader_loop(self, f):
+        try:
+            if self.ws:
+                while True:
+                    op, payload = _ws_read(f)
+                    if op == 8:         # close
+                        break
+                    if op == 9:         # ping
+                        self.send(_ws_frame(payload, 10))
+                    elif op == 1:
+                        self.server._command(self, payload.decode("utf-8", errors="replace"))
+            else:
+                while True:
+                    line = f.readline(MAX_MESSAGE_BYTES)
+                    if not line:
+                        break
+                    self.server._command(self, line.decode("utf-8", errors="replace"))
+        except (OSError, EOFError, ValueError):
+            pass
+        finally:
+            self.server._remove(self)
+
+
+class ShareServer:
+    """
+    Publikuje rekordy `devices` (DeviceManager albo RemoteManager) klientom
+    na host:port. publish() woła właściciel strumienia (on_batch), a
+    ports_changed() – po każdej zmianie stanu portu (on_connected).
+    """
+
+    def __init__(self, devices, port: int = SHARE_PORT, host: str = "127.0.0.1",
+                 queue_size: int = QUEUE_SIZE, policy: str = "coalesce", on_status=None):
+        if policy not in POLICIES:
+            raise ValueError(f"policy must be one of {', '.join(POLICIES)}")
+        self.devices = devices
+        self.queue_size = max(1, queue_size)
+        self.policy = policy
+        self.on_status = on_status or _noop
+        self.clients = []
+        self._lock = threading.Lock()
+        self._sock = socket.create_server((host, port))
+        self.host, self.port = self._sock.getsockname()[:2]
+        _CLIENTS.set_function(lambda: len(self.clients))
+        threading.Thread(target=self._accept_loop, name="share", daemon=True).start()
+
+    def publish(self, records):
+        """Paczka rekordów do wszystkich klientów (kodowana raz, nie blokuje)."""
+        clients = self.clients
+        if not clients:
+            return
+        items = [(rec.key if isinstance(rec, Sample) else None, _dumps(encode_record(rec))) for rec in records]
+        for c in clients:
+            c.push(items)
+
+    def ports_changed(self):
+        msg = [(None, self._ports_msg())]
+        for c in self.clients:
+            c.push(msg)
+
+    def close(self):
+        try: self._sock.close()
+        except OSError: pass
+        with self._lock:
+            clients, self.clients = self.clients, []
+        for c in clients:
+            c.close()
+
+    # ---------- wewnętrzne ----------
+
+    def _ports_msg(self, kind="ports") -> bytes:
+        d = self.devices
+        return _dumps({"type": kind, "version": PROTOCOL_VERSION,
+                       "ports": [{"port": p, "baud": d.baudrate(p)} for p in d.ports()],
+                       "reconnecting": d.reconnecting(), "policy": self.policy})
+
+    def _accept_loop(self):
+        while True:
+            try:
+                sock, addr = self._sock.accept()
+            except OSError:
+                return
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            threading.Thread(target=self._serve, args=(_Client(self, sock, addr),),
+                             name="share client", daemon=True).start()
+
+    def _serve(self, client):
+        f = client.sock.makefile("rb")
+        try:
+            if not client.handshake(f):
+                client.close()
+                return
+        except (OSError, ValueError):
+            client.close()
+            return
+        client.push([(None, self._ports_msg("hello"))])
+        with self._lock:
+            self.clients = self.clients + [client]     # publish() czyta listę bez blokady
+        self.on_status(f"share: client {client.name} connected ({'WebSocket' if client.ws else 'TCP'})")
+        threading.Thread(target=client.writer_loop, name="share writer", daemon=True).start()
+        client.reader_loop(f)
+
+    def _remove(self, client):
+        with self._lock:
+            if client not in self.clients:
+                return
+            self.clients = [c for c in self.clients if c is not client]
+        client.close()
+        self.on_status(f"share: client {client.name} disconnected")
+
+    def _command(self, client, text: str):
+        text = text.strip()
+        if not text:
+            return
+        req_id = port = None
+        line = text
+        if text.startswith("{"):
+            try:
+                obj = json.loads(text)
+                line, port, req_id = str(obj.get("cmd", "")).strip(), obj.get("port"), obj.get("id")
+            except (ValueError, AttributeError):
+                client.push([(None, _dumps({"type": "result", "id": None, "ok": False, "error": "bad request"}))])
+                return
+        _COMMANDS.inc()
+        ports = self.devices.ports()
+        if port is None and len(ports) == 1:
+            port = ports[0]
+        if port is None:
+            # bez wskazanego portu przy kilku płytkach – jak LIST z GUI, do wszystkich, bez odpowiedzi
+            ok = self.devices.send_line(line)
+            client.push([(None, _dumps({"type": "result", "id": req_id, "ok": ok, "record": None}))])
+            return
+        self.devices.command(line, port, callback=lambda f: self._result(client, req_id, f))
+
+    @staticmethod
+    def _result(client, req_id, fut):
+        exc = fut.exception()
+        if exc is None:
+            msg = {"type": "result", "id": req_id, "ok": True, "record": encode_record(fut.result())}
+        else:
+            msg = {"type": "result", "id": req_id, "ok": False, "error": str(exc),
+                   "timeout": isinstance(exc, CommandTimeout)}
+        client.push([(None, _dumps(msg))])
+
+
+# ---------- klient ----------
+
+class _RemoteCommands:
+    """Komendy wysłane do serwera, czekające na wynik (pending() dla PollScheduler)."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._futures = {}          # id -> (port, Future)
+
+    def add(self, req_id, port, fut):
+        with self._lock:
+            self._futures[req_id] = (port, fut)
+
+    def pending(self, port=None) -> int:
+        with self._lock:
+            return sum(1 for p, _ in self._futures.values() if port is None or p == port)
+
+    def resolve(self, msg):
+        with self._lock:
+            entry = self._futures.pop(msg.get("id"), None)
+        if entry is None or entry[1].done():
+            return
+        fut = entry[1]
+        if msg.get("ok"):
+            fut.set_result(decode_record(msg.get("record") or {}))
+        elif msg.get("timeout"):
+            fut.set_exception(CommandTimeout(msg.get("error", "")))
+        else:
+            fut.set_exception(ConnectionError(msg.get("error", "")))
+
+    def fail(self, req_id, exc):
+        """Kończy jedną komendę wyjątkiem (np. nie dało się jej wysłać)."""
+        with self._lock:
+            entry = self._futures.pop(req_id, None)
+        if entry is not None and not entry[1].done():
+            entry[1].set_exception(exc)
+
+    def cancel(self, port=None, exc=None):
+        with self._lock:
+            ids = [i for i, (p, _) in self._futures.items() if port is None or p == port]
+            dropped = [self._futures.pop(i)[1] for i in ids]
+        for fut in dropped:
+            if not fut.done():
+                fut.set_exception(exc or ConnectionError("remote: connection closed"))
+
+
+class RemoteManager:
+    """
+    Klient ShareServer z interfejsem DeviceManagera. Porty otwiera serwer –
+    open() łączy się z serwerem, close() rozłącza. Po utracie połączenia
+    z serwerem: Link(up=False) dla jego portów, ponowne łączenie
+    z backoffem, potem Link(up=True) i LIST.
+    """
+
+    def __init__(self, address: str, on_batch=None, on_status=None, on_connected=None,
+                 reconnect: bool = True):
+        self.host, self.port = parse_address(address)
+        self.address = f"{self.host}:{self.port}"
+        self.on_batch = on_batch or _noop          # on_batch(list[rekord])
+        self.on_status = on_status or _noop        # on_status(str)
+        self.on_connected = on_connected or _noop  # on_connected(port, bool)
+        self.reconnect = reconnect
+        self.commands = _RemoteCommands()
+        self._ports = {}            # port -> baud
+        self._remote_reconnecting = []
+        self._lost = []             # porty sprzed utraty połączenia z serwerem
+        self._sock = None
+        self._thread = None
+        self._stop = threading.Event()
+        self._ids = itertools.count(1)
+        self._send_lock = threading.Lock()
+
+    # ---------- interfejs DeviceManager ----------
+
+    def open(self, port=None, baud=None, serial_number=None) -> bool:
+        """Łączy z serwerem w tle; porty pojawią się przez on_connected."""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._loop, name="remote", daemon=True)
+            self._thread.start()
+        return True
+
+    def close(self, port=None):
+        """Rozłącza z serwerem (pojedynczych portów serwera nie da się zamknąć zdalnie)."""
+        self._stop.set()
+        sock = self._sock
+        if sock:
+            try: sock.shutdown(socket.SHUT_RDWR)
+            except OSError: pass
+        if self._thread and self._thread is not threading.current_thread():
+            self._thread.join(timeout=CONNECT_TIMEOUT_S)
+
+    def ports(self):
+        return list(self._ports)
+
+    def is_open(self, port=None) -> bool:
+        return bool(self._ports) if port is None else port in self._ports
+
+    def reconnecting(self):
+        return list(dict.fromkeys(self._remote_reconnecting + self._lost))
+
+    def baudrate(self, port: str) -> int:
+        return self._ports.get(port) or BAUD
+
+    def send_line(self, line: str, port=None) -> bool:
+        return self._send({"cmd": line, "port": port})
+
+    def command(self, line: str, port: str, timeout=None, retries=None, callback=None):
+        """Komenda wykonywana przez CommandQueue serwera; timeout i ponowienia – po stronie serwera."""
+        fut = Future()
+        if callback:
+            fut.add_done_callback(callback)
+        req_id = next(self._ids)
+        self.commands.add(req_id, port, fut)
+        if not self._send({"cmd": line, "port": port, "id": req_id}):
+            self.commands.fail(req_id, ConnectionError(f"{port}: not connected to {self.address}"))
+        return fut
+
+    # ---------- wewnętrzne ----------
+
+    def _send(self, obj) -> bool:
+        sock = self._sock
+        if sock is None:
+            return False
+        try:
+            with self._send_lock:
+                sock.sendall(_dumps(obj) + b"\n")
+            return True
+        except OSError as e:
+            self.on_status(f"ERR remote write: {e}")
+            return False
+
+    def _loop(self):
+        delay = RECONNECT_MIN_S
+        t_lost = None
+        while not self._stop.is_set():
+            try:
+                sock = socket.create_connection((self.host, self.port), timeout=CONNECT_TIMEOUT_S)
+                sock.settimeout(None)
+                sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+            except OSError as e:
+                self.on_status(f"ERR remote {self.address}: {e}")
+                if not self.reconnect:
+                    return
+                self._stop.wait(delay)
+                delay = min(RECONNECT_MAX_S, delay * 2)
+                continue
+            delay = RECONNECT_MIN_S
+            self._sock = sock
+            self.on_status(f"Connected: {self.address} (remote)")
+            self._read(sock, t_lost)
+            self._sock = None
+            try: sock.close()
+            except OSError: pass
+            ports = list(self._ports)
+            self._ports.clear()
+            self._remote_reconnecting = []
+            lost = not self._stop.is_set()
+            self.commands.cancel(None, ConnectionError(f"{self.address}: connection lost" if lost else "closed"))
+            if lost:
+                t_lost = time.time()
+                self._lost = ports
+                self.on_batch([Link(t_lost, False, "# link lost (remote)", p) for p in ports])
+            for p in ports:
+                self.on_connected(p, False)
+            if not lost or not self.reconnect:
+                break
+            self.on_status(f"remote {self.address}: connection lost, reconnecting")
+        self._lost = []
+
+    def _read(self, sock, t_lost):
+        buf = b""
+        while True:
+            try:
+                data = sock.recv(65536)
+            except OSError:
+                return
+            if not data:
+                return
+            lines = (buf + data).split(b"\n")
+            buf = lines.pop()
+            if len(buf) > MAX_MESSAGE_BYTES:
+                # wiadomość bez końca linii – odrzuć (reszta nie sparsuje się jako JSON)
+                self.on_status(f"remote {self.address}: message over {MAX_MESSAGE_BYTES} bytes dropped")
+                buf = b""
+            batch = []
+            for line in lines:
+                try:
+                    obj = json.loads(line)
+                except ValueError:
+                    continue
+                kind = obj.get("type") if isinstance(obj, dict) else None
+                if kind in _TYPES:
+                    rec = decode_record(obj)
+                    if rec is not None:
+                        batch.append(rec)
+                elif kind in ("hello", "ports"):
+                    if batch:
+                        self.on_batch(batch)
+                        batch = []
+                    self._set_ports(obj, t_lost)
+                elif kind == "result":
+                    self.commands.resolve(obj)
+                elif kind == "dropped":
+                    self.on_status(f"remote: {obj.get('n')} messages dropped by server (client too slow)")
+            if batch:
+                self.on_batch(batch)
+
+    def _set_ports(self, obj, t_lost):
+        ports = {p["port"]: p.get("baud") or BAUD for p in obj.get("ports", []) if "port" in p}
+        self._remote_reconnecting = list(obj.get("reconnecting", []))
+        old, self._ports = self._ports, ports
+        for p in old:
+            if p not in ports:
+                self.on_connected(p, False)
+        for p in ports:
+            if p not in old:
+                self.on_connected(p, True)
+        restored = [p for p in self._lost if p in ports]
+        if restored:
+            self._lost = [p for p in self._lost if p not in ports]
+            now = time.time()
+            self.on_batch([Link(now, True, f"# link restored (remote) after {now - t_lost:.1f} s", p)
+                           for p in restored])
+            for p in restored:
+                # w czasie przerwy lista czujników mogła się zmienić
+                self.command("LIST", p)
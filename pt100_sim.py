@@ -0,0 +1,374 @@
+"""
+Symulator firmware PT100 na pseudoterminalu (Linux/macOS).
+
+Otwiera pty i odpowiada jak płytka z PT100/src: LIST, READ, NEW, SET,
+DEL z tymi samymi odpowiedziami JSON co LineHandler.cpp, auto-raporty
+"Interval: N" + {"id":..,"name":..,"t":..} dla czujników z interval > 0
+(main.cpp) – albo 7-bajtowe ramki binarne po MODE fmt=bin – i temperatury liczone jak SensorPT100::ReadTemp z ADC
+(kalibracja t1/q1/t2/q2). Przepustowość łącza jest ograniczana do
+baud/10 bajtów/s, a odczyt ADC trwa adc_ms, więc symulator nasyca się
+tam, gdzie prawdziwe Uno. Usterki: gubienie linii, uszkodzone linie,
+przestoje.
+
+    python pt100_sim.py --sensors 8 --interval 500
+    python pt100_sim.py --sensors 32 --max-sensors 32 --interval 100 --baud 115200 --link /tmp/ttyPT100
+
+Ścieżka pty jest wypisywana w pierwszej linii stdout ("pty: /dev/pts/N"),
+statystyki (JSON) w ostatniej – po SIGINT/SIGTERM albo --duration.
+"""
+import argparse
+import json
+import math
+import os
+import random
+import select
+import signal
+import sys
+import time
+import tty
+
+from pt100_protocol import encode_frame
+
+BAUD = 9600
+MAX_SENSORS = 8             # SensorManager::MAX_SENSORS
+LH_BUF_SIZE = 160           # LineHandler.h
+MAX_NAME = 20               # MAX_Name - 1
+A0 = 14                     # numer pinu A0 na Uno
+ADC_MS = 7.0                # ReadTemp: 63 x analogRead (~112 us)
+
+
+class SimSensor:
+    def __init__(self, sid: int, pin: int, name: str, active: bool = True,
+                 t1: float = 0.0, q1: int = 0, t2: float = 100.0, q2: int = 1023, interval: int = 0):
+        self.id, self.pin, self.name, self.active = sid, pin, name, active
+        self.t1, self.q1, self.t2, self.q2 = t1, q1, t2, q2
+        if self.q1 == self.q2:
+            self.q2 = self.q1 + 1
+        self.interval = interval
+        self.last_report = 0
+        self.base = 20.0 + (sid % 16) * 0.5     # "prawdziwa" temperatura
+        self.phase = random.random() * 2 * math.pi
+
+
+def _parse_pin(v: str) -> int:
+    if v[:1] in ("A", "a"):
+        return A0 + _atoi(v[1:])
+    return _atoi(v)
+
+
+def _atoi(v: str) -> int:
+    """atoi(): początkowe cyfry, 0 gdy ich brak."""
+    v = v.strip()
+    n = 0
+    while n < len(v) and (v[n].isdigit() or (n == 0 and v[n] in "+-")):
+        n += 1
+    try:
+        return int(v[:n])
+    except ValueError:
+        return 0
+
+
+def _atof(v: str) -> float:
+    try:
+        return float(v)
+    except ValueError:
+        return 0.0
+
+
+def _kv(tokens):
+    for tok in tokens:
+        k, sep, v = tok.partition("=")
+        if sep:
+            yield k.lower(), v
+
+
+class FirmwareSim:
+    """
+    Stan i logika firmware. handle_line() zwraca linie odpowiedzi (bez pty),
+    run() obsługuje pty: komendy, auto-raporty, ograniczenie łącza, usterki.
+    """
+
+    def __init__(self, sensors: int = 0, interval_ms: int = 1000, baud: int = BAUD,
+                 noise: float = 0.05, adc_ms: float = ADC_MS, max_sensors: int = MAX_SENSORS,
+                 drop: float = 0.0, corrupt: float = 0.0, stall_every: float = 0.0,
+                 stall_ms: float = 0.0, stamp: bool = False, seed=None):
+        self.rng = random.Random(seed)
+        self.baud = baud
+        self.noise = noise
+        self.adc_s = adc_ms / 1000.0
+        self.max_sensors = max_sensors
+        self.drop, self.corrupt = drop, corrupt
+        self.stall_every, self.stall_s = stall_every, stall_ms / 1000.0
+        self.stamp = stamp          # dodaje "e": czas wysłania (epoch) – do pomiaru opóźnień
+        self.slots = [None] * max_sensors
+        self.bin_frames = False     # MODE fmt=bin
+        self.t0 = time.monotonic()
+        self.stats = {"lines_out": 0, "samples_out": 0, "dropped": 0, "corrupted": 0,
+                      "overflow": 0, "commands": 0, "bytes_out": 0}
+        for i in range(min(sensors, max_sensors)):
+            self.slots[i] = SimSensor(i, A0 + i % 6, f"S{i}", True, interval=interval_ms)
+        self.master = self.slave = None
+        self._rx = bytearray()
+        self._link_free = 0.0
+        self._next_stall = time.monotonic() + stall_every if stall_every > 0 else None
+        self._stop = False
+
+    def millis(self) -> int:
+        return int((time.monotonic() - self.t0) * 1000) & 0xFFFFFFFF
+
+    # ---------- SensorManager ----------
+
+    def find(self, sid: int):
+        for s in self.slots:
+            if s is not None and s.id == sid:
+                return s
+        return None
+
+    def read_temp(self, s: SimSensor) -> float:
+        now = time.monotonic() - self.t0
+        true_t = s.base + 0.5 * math.sin(2 * math.pi * now / 600.0 + s.phase) + self.rng.gauss(0.0, self.noise)
+        adc = s.q1 + (true_t - s.t1) * (s.q2 - s.q1) / ((s.t2 - s.t1) or 1e-9)
+        adc = max(0, min(1023, int(adc)))
+        return s.t1 + (adc - s.q1) * (s.t2 - s.t1) / (s.q2 - s.q1)
+
+    def _sample_line(self, s: SimSensor, t: float, ok: bool) -> str:
+        head = '{"ok":true,"id":' if ok else '{"id":'
+        tail = f',"e":{time.time():.6f}}}' if self.stamp else "}"
+        return f'{head}{s.id},"name":"{s.name}","t":{t:.2f}{tail}'
+
+    # ---------- LineHandler ----------
+
+    def handle_line(self, line: str) -> list:
+        line = line.replace("\r", "")
+        tokens = line.split()
+        if not tokens:
+            return []
+        self.stats["commands"] += 1
+        cmd, args = tokens[0].upper(), dict(_kv(tokens[1:]))
+
+        if cmd == "NEW":
+            if "id" not in args or "pin" not in args:
+                return ['{"ok":false,"err":"need id&pin"}']
+            sid = _atoi(args["id"]) & 0xFF
+            q1, q2 = _atoi(args.get("q1", "0")), _atoi(args.get("q2", "1023"))
+            s = SimSensor(sid, _parse_pin(args["pin"]) & 0xFF, (args.get("name") or "PT100")[:MAX_NAME],
+                          _atoi(args.get("active", "0")) != 0,
+                          _atof(args.get("t1", "0")), q1, _atof(args.get("t2", "100")), q2,
+                          _atoi(args.get("interval", "0")))
+            if self.find(sid) is not None or None not in self.slots:
+                return ['{"ok":false,"err":"exists_or_full"}']
+            self.slots[self.slots.index(None)] = s
+            return ['{"ok":true}']
+
+        if cmd == "DEL":
+            sid = _atoi(args["id"]) if "id" in args else -1
+            for i, s in enumerate(self.slots):
+                if s is not None and sid >= 0 and s.id == (sid & 0xFF):
+                    self.slots[i] = None
+                    return ['{"ok":true}']
+            return ['{"ok":false,"err":"no_such_id"}']
+
+        if cmd == "SET":
+            s = self.find(_atoi(args.get("id", "-1")) & 0xFF)
+            if s is None:
+                return ['{"ok":false,"err":"no_such_id"}']
+            if "active" in args: s.active = _atoi(args["active"]) != 0
+            if "pin" in args: s.pin = _parse_pin(args["pin"]) & 0xFF
+            if "name" in args: s.name = args["name"][:MAX_NAME]
+            if "t1" in args: s.t1 = _atof(args["t1"])
+            if "q1" in args: s.q1 = _atoi(args["q1"])
+            if "t2" in args: s.t2 = _atof(args["t2"])
+            if "q2" in args: s.q2 = _atoi(args["q2"])
+            if s.q1 == s.q2: s.q2 = s.q1 + 1
+            if "interval" in args:
+                s.interval = _atoi(args["interval"])
+                s.last_report = (self.millis() - s.interval) if s.interval else self.millis()
+            return ['{"ok":true}']
+
+        if cmd == "READ":
+            s = self.find(_atoi(args.get("id", "-1")) & 0xFF)
+            if s is None:
+                return ['{"ok":false,"err":"no_such_id"}']
+            self._adc_delay()
+            return [self._sample_line(s, self.read_temp(s), ok=True)]
+
+        if cmd == "MODE":
+            fmt = args.get("fmt", "").lower()
+            if fmt not in ("bin", "json"):
+                return ['{"ok":false,"err":"bad_fmt"}']
+            self.bin_frames = fmt == "bin"
+            return [f'{{"ok":true,"fmt":"{fmt}"}}']
+
+        if cmd == "LIST":
+            items = ",".join(f'{{"id":{s.id},"name":"{s.name}","pin":{s.pin},"active":{1 if s.active else 0}}}'
+                             for s in self.slots if s is not None)
+            return ['{"s":[' + items + ']}']
+
+        return ['{"ok":false,"err":"unknown_cmd"}']
+
+    def feed(self, data: bytes) -> list:
+        """Bajty z hosta -> odpowiedzi (bufor linii jak LineHandler_tick)."""
+        out = []
+        for c in data:
+            if c in (10, 13):
+                if self._rx:
+                    out += self.handle_line(self._rx.decode("ascii", errors="replace"))
+                    self._rx.clear()
+            elif len(self._rx) < LH_BUF_SIZE - 1:
+                self._rx.append(c)
+            else:
+                self._rx.clear()
+                out.append('{"ok":false,"err":"line_overflow"}')
+        return out
+
+    def due_reports(self) -> list:
+        """Auto-raporty (shouldReport) w kolejności slotów."""
+        out = []
+        for s in self.slots:
+            if s is None or not s.active or s.interval == 0:
+                continue
+            now = self.millis()
+            if (now - s.last_report) & 0xFFFFFFFF >= s.interval:
+                s.last_report = now
+                self._adc_delay()
+                if self.bin_frames:
+                    out.append(encode_frame(s.id, self.read_temp(s)))
+                    continue
+                out.append(f"Interval: {s.interval}")
+                out.append(self._sample_line(s, self.read_temp(s), ok=False))
+        return out
+
+    def next_due_s(self) -> float:
+        now = self.millis()
+        waits = [max(0, s.interval - ((now - s.last_report) & 0xFFFFFFFF))
+                 for s in self.slots if s is not None and s.active and s.interval]
+        return min(waits) / 1000.0 if waits else 0.5
+
+    def _adc_delay(self):
+        if self.adc_s > 0 and self.master is not None:
+            time.sleep(self.adc_s)
+
+    # ---------- pty ----------
+
+    def open(self, link=None) -> str:
+        self.master, self.slave = os.openpty()
+        tty.setraw(self.slave)      # bez echa i zamiany \n
+        # pełny bufor (host nie czyta) = utracone dane, jak w mostku USB Uno
+        os.set_blocking(self.master, False)
+        path = os.ttyname(self.slave)
+        if link:
+            try:
+                os.remove(link)
+            except FileNotFoundError:
+                pass
+            os.symlink(path, link)
+        return path
+
+    def write_lines(self, lines):
+        """Linie tekstu (str) albo gotowe ramki binarne (bytes)."""
+        for line in lines:
+            if isinstance(line, bytes):
+                data, is_sample = line, True
+            else:
+                data = (line + "\r\n").encode("ascii", errors="replace")
+                is_sample = '"t":' in line
+            if self.drop and self.rng.random() < self.drop:
+                self.stats["dropped"] += 1
+                continue
+            if self.corrupt and self.rng.random() < self.corrupt:
+                cut = self.rng.randrange(1, len(data) - 2)
+                data = data[:cut] + bytes([self.rng.randrange(0x21, 0x7F)]) + data[cut + (1 if isinstance(line, bytes) else 2):]
+                self.stats["corrupted"] += 1
+                is_sample = False
+            if self.baud:
+                # łącze: 10 bitów na bajt, Serial.print blokuje przy pełnym buforze
+                now = time.monotonic()
+                self._link_free = max(self._link_free, now) + len(data) * 10.0 / self.baud
+                if self._link_free > now:
+                    time.sleep(self._link_free - now)
+            try:
+                os.write(self.master, data)
+            except BlockingIOError:
+                self.stats["overflow"] += 1
+                continue
+            self.stats["lines_out"] += 1
+            self.stats["bytes_out"] += len(data)
+            if is_sample:
+                self.stats["samples_out"] += 1
+
+    def stop(self, *_):
+        self._stop = True
+
+    def run(self, duration: float = 0.0):
+        t_end = time.monotonic() + duration if duration > 0 else None
+        self.write_lines(['{"hello":"ready"}'])
+        while not self._stop:
+            now = time.monotonic()
+            if t_end is not None and now >= t_end:
+                break
+            if self._next_stall is not None and now >= self._next_stall:
+                time.sleep(self.stall_s)
+                self._next_stall = time.monotonic() + self.stall_every
+            timeout = min(self.next_due_s(), 0.5)
+            try:
+                r, _, _ = select.select([self.master], [], [], timeout)
+            except InterruptedError:
+                continue
+            if r:
+                try:
+                    data = os.read(self.master, 4096)
+                except OSError:
+                    data = b""
+                if data:
+                    self.write_lines(self.feed(data))
+            self.write_lines(self.due_reports())
+
+    def close(self):
+        for fd in (self.master, self.slave):
+            if fd is not None:
+                try: os.close(fd)
+                except OSError: pass
+        self.master = self.slave = None
+
+
+def build_parser() -> argparse.ArgumentParser:
+    p = argparse.ArgumentParser(description="PT100 – symulator firmware na pty")
+    p.add_argument("--sensors", type=int, default=4, help="czujniki utworzone na starcie")
+    p.add_argument("--max-sensors", type=int, default=MAX_SENSORS, help="liczba slotów (firmware: 8)")
+    p.add_argument("--interval", type=int, default=1000, metavar="MS", help="interval auto-raportów (0 = wyłączone)")
+    p.add_argument("--baud", type=int, default=BAUD, help="ograniczenie łącza (0 = bez limitu)")
+    p.add_argument("--adc-ms", type=float, default=ADC_MS, help="czas odczytu ADC (ReadTemp)")
+    p.add_argument("--noise", type=float, default=0.05, metavar="C", help="szum temperatury (odch. std.)")
+    p.add_argument("--drop", type=float, default=0.0, metavar="P", help="prawdopodobieństwo zgubienia linii")
+    p.add_argument("--corrupt", type=float, default=0.0, metavar="P", help="prawdopodobieństwo uszkodzenia linii")
+    p.add_argument("--stall-every", type=float, default=0.0, metavar="S", help="przestój co S sekund")
+    p.add_argument("--stall-ms", type=float, default=200.0, help="długość przestoju")
+    p.add_argument("--stamp", action="store_true", help='dodaj "e" (czas wysłania) do pomiarów')
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--link", help="dowiązanie symboliczne do pty (stała ścieżka)")
+    p.add_argument("--duration", type=float, default=0.0, metavar="S", help="zakończ po S sekundach")
+    return p
+
+
+def main(argv=None) -> int:
+    a = build_parser().parse_args(argv)
+    sim = FirmwareSim(a.sensors, a.interval, a.baud, a.noise, a.adc_ms, a.max_sensors,
+                      a.drop, a.corrupt, a.stall_every, a.stall_ms, a.stamp, a.seed)
+    print(f"pty: {sim.open(a.link)}", flush=True)
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        signal.signal(sig, sim.stop)
+    try:
+        sim.run(a.duration)
+    finally:
+        # zamknięcie pty gubi nieodczytane dane – daj hostowi chwilę na odbiór
+        time.sleep(0.2)
+        sim.close()
+        if a.link:
+            try: os.remove(a.link)
+            except OSError: pass
+        print(json.dumps(sim.stats), flush=True)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,355 @@
+"""
+Statystyki kroczące i alarmy progowe czujników (bez zależności od Qt).
+
+RollingStats trzyma próbki z ostatnich `window_s` sekund i aktualizuje
+przy każdej próbce (koszt stały w zamortyzowaniu, bez przeglądania
+historii):
+  - min/max – kolejki monotoniczne,
+  - średnia i odchylenie standardowe – sumy wartości i kwadratów,
+  - nachylenie [°C/min] – regresja liniowa z sum t, t², v, t·v,
+  - EWMA ze stałą czasową `ewma_s` (niezależna od odstępów próbek).
+Sumy liczone są względem punktu odniesienia przesuwanego raz na okno,
+więc nie tracą precyzji przy długiej pracy.
+
+StatsEngine prowadzi statystyki wszystkich czujników i ocenia reguły
+AlarmRule przy każdej próbce – alarm włącza się na tej próbce, która
+przekroczyła próg, a gaśnie dopiero po powrocie poniżej progu o histerezę.
+Próbki NaN/inf są pomijane (nie wchodzą do statystyk ani nie oceniają reguł).
+check_stale(now) zgłasza czujniki, które przestały przysyłać pomiary.
+Zmiany stanu alarmów wychodzą jako AlarmEvent; AlarmLog zapisuje je do CSV.
+"""
+import csv
+import math
+import os
+import time
+from collections import deque
+from typing import NamedTuple, Optional
+
+STATS_WINDOW_S = 60.0       # okno min/max/średniej/σ/nachylenia
+EWMA_S = 10.0               # stała czasowa EWMA
+MAX_WINDOW_SAMPLES = 20000  # limit próbek w oknie na czujnik (szybkie ramki binarne)
+STALE_S = 10.0              # minimalny wiek ostatniej próbki dla alarmu "stale"...
+STALE_INTERVALS = 3.0       # ...i co najmniej tyle typowych odstępów między próbkami
+SLOPE_MIN_SPAN = 0.1        # nachylenie dopiero, gdy próbki obejmują taki ułamek okna
+RATE_HYST = 0.2             # histereza alarmu nachylenia jako ułamek progu
+
+ALARM_KINDS = ("hi", "lo", "rate", "stale")
+ALARM_HEADER = ["timestamp_iso", "epoch_ms", "id", "name", "alarm", "state", "value", "limit"]
+
+
+class AlarmRule(NamedTuple):
+    hi: Optional[float] = None      # alarm, gdy t >= hi
+    lo: Optional[float] = None      # alarm, gdy t <= lo
+    rate: Optional[float] = None    # alarm, gdy |nachylenie| >= rate [°C/min]
+    hyst: float = 0.5               # [°C] – hi gaśnie poniżej hi - hyst, lo powyżej lo + hyst
+    stale_s: Optional[float] = STALE_S
+
+
+class AlarmEvent(NamedTuple):
+    ts: float
+    key: str
+    kind: str           # "hi" | "lo" | "rate" | "stale"
+    active: bool        # True = alarm włączony, False = zgaszony
+    value: float        # temperatura, nachylenie albo wiek próbki [s]
+    limit: float
+
+
+def parse_rule(spec: str, base: AlarmRule = AlarmRule()) -> AlarmRule:
+    """"hi=80,lo=5,rate=2,hyst=0.5,stale=30" -> AlarmRule (puste/"-" wyłącza próg)."""
+    fields = {"hi": "hi", "lo": "lo", "rate": "rate", "hyst": "hyst", "stale": "stale_s"}
+    kw = {}
+    for part in spec.split(","):
+        name, sep, value = part.strip().partition("=")
+        if not name:
+            continue
+        if not sep or name not in fields:
+            raise ValueError(f"bad alarm field: {part.strip()!r}")
+        value = value.strip()
+        kw[fields[name]] = None if value in ("", "-") else float(value)
+    if kw.get("hyst") is None:
+        kw.pop("hyst", None)
+    return base._replace(**kw)
+
+
+class RollingStats:
+    __slots__ = ("window_s", "ewma_s", "max_samples", "_ts", "_v", "_minq", "_maxq", "_seq", "_head",
+                 "_t0", "_v0", "_st", "_stt", "_sv", "_svv", "_stv",
+                 "ewma", "interval", "last_ts", "last", "_gap")
+
+    def __init__(self, window_s: float = STATS_WINDOW_S, ewma_s: float = EWMA_S,
+                 max_samples: int = MAX_WINDOW_SAMPLES):
+        self.window_s = window_s
+        self.ewma_s = ewma_s
+        self.max_samples = max_samples
+        self._ts = deque()
+        self._v = deque()
+        self.interval = None        # typowy odstęp między próbkami [s], EWMA
+        self.last_ts = None         # czas ostatniej próbki (alarm "stale")
+        self.last = None
+        # (nr próbki, v) – numery, nie czasy: próbki jednej paczki mają ten sam ts
+        self._minq = deque()        # wartości rosnące
+        self._maxq = deque()        # wartości malejące
+        self.reset()
+
+    def reset(self):
+        """
+        Zapomina okno i EWMA (przerwa w danych, wyczyszczona historia), żeby
+        statystyki nie łączyły próbek sprzed i po przerwie. Czas ostatniej
+        próbki zostaje – alarm "stale" działa dalej.
+        """
+        self._ts.clear(); self._v.clear()
+        self._minq.clear(); self._maxq.clear()
+        self._seq = self._head = 0  # numer następnej i najstarszej próbki w oknie
+        self._t0 = self._v0 = None
+        self._st = self._stt = self._sv = self._svv = self._stv = 0.0
+        self.ewma = None
+        self._gap = True            # następny odstęp to przerwa, nie typowy odstęp
+
+    def __len__(self):
+        return len(self._ts)
+
+    def add(self, ts: float, v: float):
+        dt = ts - self.last_ts if self.last_ts is not None else 0.0
+        if self.ewma is None:
+            self.ewma = v
+        elif dt > 0:
+            a = 1.0 - math.exp(-dt / self.ewma_s) if self.ewma_s > 0 else 1.0
+            self.ewma += a * (v - self.ewma)
+        if dt > 0 and not self._gap:
+            self.interval = dt if self.interval is None else 0.8 * self.interval + 0.2 * dt
+        self._gap = False
+        self.last_ts, self.last = ts, v
+
+        if self._t0 is None:
+            self._t0, self._v0 = ts, v
+        self._ts.append(ts)
+        self._v.append(v)
+        x, y = ts - self._t0, v - self._v0
+        self._st += x; self._stt += x * x
+        self._sv += y; self._svv += y * y; self._stv += x * y
+        minq, maxq, seq = self._minq, self._maxq, self._seq
+        while minq and minq[-1][1] >= v:
+            minq.pop()
+        minq.append((seq, v))
+        while maxq and maxq[-1][1] <= v:
+            maxq.pop()
+        maxq.append((seq, v))
+        self._seq = seq + 1
+        self._expire(ts - self.window_s)
+
+    def _expire(self, t_from: float):
+        tss, vs = self._ts, self._v
+        while tss and (tss[0] < t_from or len(tss) > self.max_samples):
+            ts, v = tss.popleft(), vs.popleft()
+            x, y = ts - self._t0, v - self._v0
+            self._st -= x; self._stt -= x * x
+            self._sv -= y; self._svv -= y * y; self._stv -= x * y
+            if self._minq[0][0] == self._head:
+                self._minq.popleft()
+            if self._maxq[0][0] == self._head:
+                self._maxq.popleft()
+            self._head += 1
+        if tss and tss[0] - self._t0 > self.window_s:
+            self._rebase()
+
+    def _rebase(self):
+        # nowy punkt odniesienia = najstarsza próbka okna; sumy od nowa (raz na okno)
+        t0, v0 = self._ts[0], self._v[0]
+        self._t0, self._v0 = t0, v0
+        self._st = self._stt = self._sv = self._svv = self._stv = 0.0
+        for ts, v in zip(self._ts, self._v):
+            x, y = ts - t0, v - v0
+            self._st += x; self._stt += x * x
+            self._sv += y; self._svv += y * y; self._stv += x * y
+
+    # ---------- wyniki ----------
+
+    @property
+    def min(self):
+        return self._minq[0][1] if self._minq else None
+
+    @property
+    def max(self):
+        return self._maxq[0][1] if self._maxq else None
+
+    @property
+    def mean(self):
+        n = len(self._ts)
+        return self._v0 + self._sv / n if n else None
+
+    @property
+    def std(self):
+        n = len(self._ts)
+        if n < 2:
+            return None
+        var = (self._svv - self._sv * self._sv / n) / (n - 1)
+        return math.sqrt(var) if var > 0 else 0.0
+
+    @property
+    def slope(self):
+        """Nachylenie prostej regresji w oknie [°C/min]; None, gdy próbki obejmują za krótki czas."""
+        n = len(self._ts)
+        if n < 2 or self._ts[-1] - self._ts[0] < SLOPE_MIN_SPAN * self.window_s:
+            return None
+        den = n * self._stt - self._st * self._st
+        if den <= 1e-12:
+            return None
+        return (n * self._stv - self._st * self._sv) / den * 60.0
+
+
+class StatsEngine:
+    def __init__(self, window_s: float = STATS_WINDOW_S, ewma_s: float = EWMA_S,
+                 default_rule: AlarmRule = AlarmRule()):
+        self.window_s = window_s
+        self.ewma_s = ewma_s
+        self.default_rule = default_rule
+        self.rules = {}             # klucz -> AlarmRule (własna reguła czujnika)
+        self.stats = {}             # klucz -> RollingStats
+        self.active = {}            # klucz -> {rodzaj: AlarmEvent włączenia}
+
+    def rule(self, key: str) -> AlarmRule:
+        return self.rules.get(key, self.default_rule)
+
+    def set_rule(self, key, rule):
+        """Własna reguła czujnika (rule=None -> domyślna); key=None zmienia domyślną."""
+        if key is None:
+            self.default_rule = rule
+        elif rule is None:
+            self.rules.pop(key, None)
+        else:
+            self.rules[key] = rule
+
+    def get(self, key: str):
+        return self.stats.get(key)
+
+    def alarms(self, key: str) -> tuple:
+        """Aktywne alarmy czujnika w kolejności ALARM_KINDS."""
+        act = self.active.get(key)
+        return tuple(k for k in ALARM_KINDS if act and k in act)
+
+    def remove(self, key: str):
+        self.stats.pop(key, None)
+        self.active.pop(key, None)
+
+    def reset(self, key: str):
+        """Okno czujnika od nowa (przerwa w danych); alarmy zostają do następnej próbki."""
+        st = self.stats.get(key)
+        if st is not None:
+            st.reset()
+
+    def update(self, key: str, ts: float, t: float) -> list:
+        """Nowa próbka -> lista zmian stanu alarmów (zwykle pusta)."""
+        if not math.isfinite(t):
+            return []       # NaN/inf (np. przerwany czujnik) zepsułby sumy i kolejki min/max
+        st = self.stats.get(key)
+        if st is None:
+            st = self.stats[key] = RollingStats(self.window_s, self.ewma_s)
+        st.add(ts, t)
+        rule = self.rule(key)
+        act = self.active.get(key)
+        events = []
+        if act and "stale" in act:
+            events.append(self._set(key, "stale", False, ts, 0.0, act["stale"].limit))
+        # próg włączenia i próg zgaszenia (histereza)
+        self._check(events, key, "hi", ts, t, rule.hi,
+                    lambda v: v >= rule.hi, lambda v: v < rule.hi - rule.hyst)
+        self._check(events, key, "lo", ts, t, rule.lo,
+                    lambda v: v <= rule.lo, lambda v: v > rule.lo + rule.hyst)
+        slope = st.slope
+        if slope is not None or rule.rate is None:
+            self._check(events, key, "rate", ts, abs(slope or 0.0), rule.rate,
+                        lambda v: v >= rule.rate, lambda v: v < rule.rate * (1.0 - RATE_HYST))
+        return events
+
+    def _check(self, events, key, kind, ts, value, limit, on, off):
+        act = self.active.get(key)
+        was = bool(act) and kind in act
+        if limit is None:
+            if was:     # próg usunięty z reguły
+                events.append(self._set(key, kind, False, ts, value, act[kind].limit))
+        elif not was and on(value):
+            events.append(self._set(key, kind, True, ts, value, limit))
+        elif was and off(value):
+            events.append(self._set(key, kind, False, ts, value, limit))
+
+    def _set(self, key, kind, active, ts, value, limit) -> AlarmEvent:
+        ev = AlarmEvent(ts, key, kind, active, value, limit)
+        act = self.active.setdefault(key, {})
+        if active:
+            act[kind] = ev
+        else:
+            act.pop(kind, None)
+            if not act:
+                del self.active[key]
+        return ev
+
+    def check_stale(self, now=None) -> list:
+        """Czujniki bez próbki dłużej niż max(stale_s, STALE_INTERVALS x typowy odstęp)."""
+        now = time.time() if now is None else now
+        events = []
+        for key, st in self.stats.items():
+            rule = self.rule(key)
+            if rule.stale_s is None or st.last_ts is None:
+                continue
+            act = self.active.get(key)
+            if act and "stale" in act:
+                continue
+            limit = max(rule.stale_s, STALE_INTERVALS * (st.interval or 0.0))
+            age = now - st.last_ts
+            if age > limit:
+                events.append(self._set(key, "stale", True, now, age, limit))
+        return events
+
+
+def describe(ev: AlarmEvent) -> str:
+    """Tekst do logu/statusu, np. "ALARM hi COM3:1 81.20 >= 80" / "alarm hi cleared COM3:1"."""
+    if not ev.active:
+        return f"alarm {ev.kind} cleared {ev.key}"
+    if ev.kind == "stale":
+        return f"ALARM stale {ev.key}: no data for {ev.value:.0f} s"
+    if ev.kind == "rate":
+        return f"ALARM rate {ev.key} {ev.value:.2f} °C/min >= {ev.limit:g}"
+    op = ">=" if ev.kind == "hi" else "<="
+    return f"ALARM {ev.kind} {ev.key} {ev.value:.2f} {op} {ev.limit:g}"
+
+
+class AlarmLog:
+    """
+    Zdarzenia alarmów w osobnym CSV:
+    timestamp_iso, epoch_ms, id, name, alarm, state (on/off), value, limit
+    Zdarzeń jest mało, więc zapis i flush są od razu, w wątku wołającym.
+    """
+
+    def __init__(self, path=None):
+        self.path = None
+        self._file = None
+        self._writer = None
+        if path:
+            self.set_path(path)
+
+    def set_path(self, path: str):
+        self.close()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        new_file = not os.path.exists(path) or os.path.getsize(path) == 0
+        self._file = open(path, "a", newline="", encoding="utf-8")
+        self._writer = csv.writer(self._file)
+        self.path = path
+        if new_file:
+            self._writer.writerow(ALARM_HEADER)
+            self._file.flush()
+
+    def log(self, ev: AlarmEvent, name: str = ""):
+        if self._writer is None:
+            return
+        iso = time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(ev.ts))
+        self._writer.writerow([iso, int(ev.ts * 1000), ev.key, name or "", ev.kind,
+                               "on" if ev.active else "off", round(ev.value, 3), ev.limit])
+        self._file.flush()
+
+    def close(self):
+        if self._file:
+            try:
+                self._file.close()
+            except OSError:
+                pass
+        self._file = self._writer = None
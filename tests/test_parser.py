@@ -0,0 +1,38 @@
+from pt100_parser import parse_stream
+from pt100_protocol import Reply, Sample, encode_frame
+from pt100_serial import SerialReader
+
+LINE = '{"ok":true,"id":1,"name":"ťest","t":21.50}\n'.encode()    # 'ť' = C5 A5
+
+
+def test_parse_stream_keeps_a5_inside_line():
+    buf = bytearray(LINE + encode_frame(2, 22.0) + LINE)
+    recs, used = parse_stream(buf, 1.0, "COM3")
+    assert used == len(buf)
+    assert [r.__class__ for r in recs] == [Sample, Sample, Sample]
+    assert recs[0].name == "ťest" and recs[0].t == 21.5
+    assert recs[1].sid == "2" and recs[1].t == 22.0
+    assert recs[2].name == "ťest"
+
+
+def test_reader_text_mode_ignores_a5():
+    reader = SerialReader()
+    buf = bytearray(LINE[:20])
+    assert reader._parse(buf, 1.0) == []
+    buf += LINE[20:]
+    recs = reader._parse(buf, 1.0)
+    assert len(recs) == 1 and isinstance(recs[0], Sample)
+    assert recs[0].name == "ťest" and not buf and not reader.binary
+
+
+def test_reader_switches_mode_on_ack():
+    reader = SerialReader()
+    buf = bytearray(b'{"ok":true,"fmt":"bin"}\n' + encode_frame(1, 20.25) + LINE)
+    recs = reader._parse(buf, 1.0)
+    assert reader.binary and not buf
+    assert [r.__class__ for r in recs] == [Reply, Sample, Sample]
+    assert recs[1].t == 20.25 and recs[2].name == "ťest"
+
+    buf += b'{"ok":true,"fmt":"json"}\n' + encode_frame(3, 1.0)[:4]
+    reader._parse(buf, 2.0)
+    assert not reader.binary
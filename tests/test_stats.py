@@ -0,0 +1,12 @@
+from pt100_stats import StatsEngine, parse_rule
+
+
+def test_update_skips_non_finite():
+    eng = StatsEngine()
+    eng.set_rule("COM3:1", parse_rule("hi=22.5"))
+    events = []
+    for i, t in enumerate([20.0, 21.0, float("nan"), 22.0, 23.0, float("inf")]):
+        events += eng.update("COM3:1", 100.0 + i, t)
+    st = eng.get("COM3:1")
+    assert (st.min, st.max, st.mean) == (20.0, 23.0, 21.5)
+    assert [(ev.kind, ev.active) for ev in events] == [("hi", True)]